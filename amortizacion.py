@@ -0,0 +1,134 @@
+# Tablas de amortización de muchos préstamos a la vez
+#
+# Los cálculos se hacen en centavos enteros sobre matrices NumPy de
+# (préstamo × mes), con un préstamo por fila. Se manejan los dos sistemas
+# de la aplicación:
+#
+# - 'frances': cuota fija (la del pronóstico del administrador). El
+#   interés de cada mes depende del saldo ya redondeado del mes anterior,
+#   así que se itera sobre los meses (a lo sumo el plazo más largo) y cada
+#   paso opera sobre todos los préstamos a la vez.
+# - 'interes_simple': interés mensual fijo sobre el monto inicial más una
+#   cuota de capital igual cada mes (lo que guarda validar_prestamo). No
+#   depende del saldo y se calcula sin iterar.
+#
+# Reglas de redondeo: cada valor se redondea a centavos hacia arriba desde
+# la mitad (igual que DECIMAL(10, 2) en MySQL); la última cuota absorbe la
+# diferencia para que el capital sume exactamente el monto, y en cada mes
+# capital + interés = cuota.
+import numpy as np
+
+SISTEMAS = ('frances', 'interes_simple')
+
+# Margen para que 0.5 centavos representado como 0.4999... suba
+_EPSILON = 1e-6
+
+
+def redondear_centavos(valores):
+    """Redondea valores en centavos (no negativos) a enteros, desde la mitad hacia arriba"""
+    return np.floor(np.asarray(valores, dtype=float) + 0.5 + _EPSILON).astype(np.int64)
+
+
+def a_centavos(montos):
+    return redondear_centavos(np.asarray(montos, dtype=float) * 100)
+
+
+def _preparar(montos, tasas_anuales, plazos):
+    montos = np.atleast_1d(a_centavos(montos))
+    tasas = np.atleast_1d(np.asarray(tasas_anuales, dtype=float)) / 100 / 12
+    plazos = np.atleast_1d(np.asarray(plazos, dtype=np.int64))
+    plazos = np.where(plazos > 0, plazos, 0)
+    meses = int(plazos.max()) if plazos.size else 0
+    return montos, tasas, plazos, meses
+
+
+def tablas_frances(montos, tasas_anuales, plazos):
+    """
+    Tablas por el método francés. Retorna un diccionario con 'plazo'
+    (vector) y 'capital', 'interes', 'cuota', 'saldo' en centavos
+    (matrices préstamo × mes, en cero después del plazo de cada préstamo).
+    """
+    montos, tasas, plazos, meses = _preparar(montos, tasas_anuales, plazos)
+    n = len(montos)
+
+    # Cuota fija: P·r·(1+r)^n / ((1+r)^n − 1), o P/n sin interés
+    factor = np.power(1 + tasas, plazos)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cuota_fija = np.where(tasas > 0,
+                              montos * tasas * factor / (factor - 1),
+                              montos / np.maximum(plazos, 1))
+    cuota_fija = redondear_centavos(np.where(plazos > 0, cuota_fija, 0))
+
+    capital = np.zeros((n, meses), dtype=np.int64)
+    interes = np.zeros((n, meses), dtype=np.int64)
+    saldo = np.zeros((n, meses), dtype=np.int64)
+    restante = montos.copy()
+    for mes in range(meses):
+        activo = mes < plazos
+        interes_mes = np.where(activo, redondear_centavos(restante * tasas), 0)
+        # La última cuota paga todo el saldo; ninguna paga más que el saldo
+        capital_mes = np.where(mes == plazos - 1, restante,
+                               np.clip(cuota_fija - interes_mes, 0, restante))
+        capital_mes = np.where(activo, capital_mes, 0)
+        restante = restante - capital_mes
+        capital[:, mes] = capital_mes
+        interes[:, mes] = interes_mes
+        saldo[:, mes] = np.where(activo, restante, 0)
+
+    return {'plazo': plazos, 'capital': capital, 'interes': interes,
+            'cuota': capital + interes, 'saldo': saldo}
+
+
+def cuotas_interes_simple(montos, tasas_anuales, plazos):
+    """
+    (interes_mensual_fijo, cuota_capital_mensual) en centavos: el interés
+    anual sobre el monto inicial repartido en 12 meses y el monto dividido
+    por el plazo. Es la cuota de capital de todos los meses salvo el último.
+    """
+    montos, tasas, plazos, _ = _preparar(montos, tasas_anuales, plazos)
+    interes = redondear_centavos(montos * tasas)
+    capital = redondear_centavos(montos / np.maximum(plazos, 1))
+    return interes, capital
+
+
+def tablas_interes_simple(montos, tasas_anuales, plazos):
+    """Tablas con interés simple; mismo formato que tablas_frances()"""
+    interes_fijo, capital_fijo = cuotas_interes_simple(montos, tasas_anuales, plazos)
+    montos, _, plazos, meses = _preparar(montos, tasas_anuales, plazos)
+
+    mes = np.arange(meses)
+    activo = mes < plazos[:, None]
+    capital = np.where(activo, capital_fijo[:, None], 0)
+    # El último mes ajusta el capital para cerrar en cero (puede ser menor
+    # que la cuota regular si el redondeo de monto/plazo fue hacia arriba)
+    ultimo = mes == (plazos - 1)[:, None]
+    capital = np.where(ultimo, (montos - capital_fijo * (plazos - 1))[:, None], capital)
+    capital = np.maximum(capital, 0)
+    interes = np.where(activo, interes_fijo[:, None], 0)
+    saldo = np.where(activo, montos[:, None] - np.cumsum(capital, axis=1), 0)
+
+    return {'plazo': plazos, 'capital': capital, 'interes': interes,
+            'cuota': capital + interes, 'saldo': saldo}
+
+
+def calcular_tablas(sistema, montos, tasas_anuales, plazos):
+    if sistema not in SISTEMAS:
+        raise ValueError(f"Sistema de amortización desconocido: {sistema}")
+    calcular = tablas_frances if sistema == 'frances' else tablas_interes_simple
+    return calcular(montos, tasas_anuales, plazos)
+
+
+def filas_tabla(tabla, indice=0):
+    """
+    Tabla de un préstamo como lista de diccionarios en pesos, con las
+    claves de calcular_tabla_amortizacion()
+    """
+    plazo = int(tabla['plazo'][indice])
+    columnas = [tabla[clave][indice, :plazo].tolist() for clave in ('capital', 'interes', 'cuota', 'saldo')]
+    return [{
+        'mes': mes,
+        'abono_capital': capital / 100,
+        'interes': interes / 100,
+        'cuota_total': cuota / 100,
+        'saldo_restante': saldo / 100,
+    } for mes, (capital, interes, cuota, saldo) in enumerate(zip(*columnas), start=1)]
@@ -1,4 +1,4 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify
+from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify, stream_with_context
 import mysql.connector
 import os
 import certifi
@@ -11,6 +11,8 @@ from dotenv import load_dotenv
 from werkzeug.middleware.proxy_fix import ProxyFix
 import csv
 import io
+import json
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
 
 # Cargar variables de entorno desde el archivo .env
 load_dotenv()
@@ -70,83 +72,94 @@ db_config = {
     'database': os.getenv('DB_NAME', 'sparfonds')
 }
 
+# Pool de conexiones: la ruta de certificados TLS se resuelve una sola vez
+# y las conexiones (con su sesión TLS ya negociada) se reutilizan entre requests
+from db_pool import PoolConexiones
+from cache import CacheLRU, CacheTTL
+from carga_masiva import (TAMANO_LOTE, ErroresCarga, LoadDataNoDisponible, RequestConSpool,
+                          cargar_ahorros_staging, en_bloques, filas_validas, insertar_ahorros, insertar_pagos,
+                          insertar_usuarios, leer_csv, prestamos_aprobados, usuarios_por_email)
+from importaciones import (ArchivoYaImportado, buscar_importacion, clave_fila, finalizar_importacion,
+                           hash_contenido, registrar_importacion)
+from vista_previa import (TAMANO_PAGINA_REPORTE, clasificar_ahorros, clasificar_pagos, clasificar_usuarios,
+                          escribir_reporte, leer_reporte, recorrer_reporte, ruta_reporte)
+from amortizacion import calcular_tablas, cuotas_interes_simple, filas_tabla
+from flujo_caja import FlujoCaja, sumar_meses_clave
+from mora import TRAMOS, guardar_foto_mora, prestamos_en_mora, resumen_tramos, ultima_fecha_corte
+from cuotas import SISTEMA_PRESTAMOS, generar_cuotas, leer_cuotas, marcar_cuotas_pagadas, resumen_cuotas, sumar_meses
+from exportaciones import EXPORTACIONES, FORMATOS, codificar, generar_exportacion
+from conciliacion import (RESULTADOS_CONCILIACION, VENTANA_DIAS, ahorros_conciliados, conciliar, indexar_candidatos,
+                          leer_extracto, rango_fechas, validar_ahorros)
+from trabajos import (DIRECTORIO_CARGAS, actualizar_trabajo, crear_trabajo, ejecutor, guardar_archivo,
+                      marcar_vista_previa_confirmada, obtener_trabajo, trabajo_a_json)
+from saldos import aplicar_delta_saldo, aplicar_deltas_saldo, delta_ahorro, leer_saldo_usuario
+from migraciones import migrar, ULTIMA_VERSION
+from transacciones import (TAMANO_PAGINA, decodificar_cursor, obtener_pagina_transacciones,
+                           transaccion_a_json)
+
+# Cargas masivas: los archivos subidos grandes se guardan en disco mientras
+# se procesan y el tamaño máximo del request es configurable
+app.request_class = RequestConSpool
+app.config['MAX_CONTENT_LENGTH'] = int(os.getenv('MAX_CONTENT_LENGTH', str(100 * 1024 * 1024)))
+
+@app.errorhandler(413)
+def archivo_demasiado_grande(error):
+    limite_mb = app.config['MAX_CONTENT_LENGTH'] // (1024 * 1024)
+    flash(f'El archivo supera el tamaño máximo permitido ({limite_mb} MB)', 'danger')
+    # De vuelta al formulario de carga (por GET); cualquier otra ruta, al panel
+    vista = request.endpoint if request.endpoint in VISTAS_CARGA.values() else 'admin'
+    return redirect(url_for(vista))
+
+# Carga rápida de ahorros con LOAD DATA LOCAL INFILE (opcional). La conexión
+# sólo permite leer archivos del directorio de cargas
+CARGA_LOAD_DATA = os.getenv('CARGA_LOAD_DATA', 'false').lower() == 'true'
+opciones_conexion = {'ssl_ca': certifi.where()}
+if CARGA_LOAD_DATA:
+    os.makedirs(DIRECTORIO_CARGAS, exist_ok=True)
+    opciones_conexion['allow_local_infile_in_path'] = DIRECTORIO_CARGAS
+
+pool_db = PoolConexiones(
+    dict(db_config, **opciones_conexion),
+    tamano=int(os.getenv('DB_POOL_SIZE', '5')),
+    max_overflow=int(os.getenv('DB_POOL_MAX_OVERFLOW', '10')),
+    timeout=float(os.getenv('DB_POOL_TIMEOUT', '30')),
+    reciclar=int(os.getenv('DB_POOL_RECYCLE', '3600')),
+    verificar=os.getenv('DB_POOL_PRE_PING', 'true').lower() == 'true'
+)
+
 # Función para conectar a la base de datos
+# Retorna una conexión del pool; conn.close() la devuelve al pool
 def get_db_connection():
     try:
-        # Usar certifi para proporcionar una ruta a certificados confiables
-        ssl_ca = certifi.where()
-        config = db_config.copy()
-        config['ssl_ca'] = ssl_ca
-        conn = mysql.connector.connect(**config)
-        return conn
+        return pool_db.obtener()
     except mysql.connector.Error as err:
         print(f"Error de conexión a la base de datos: {err}")
         return None
 
-# Crear tablas si no existen
+# Conexión compartida durante el request: decoradores, vistas y funciones
+# auxiliares usan la misma conexión, que se devuelve al pool al terminar
+def get_db():
+    if 'db' not in g:
+        g.db = get_db_connection()
+    return g.db
+
+@app.teardown_appcontext
+def cerrar_db(exception):
+    conn = g.pop('db', None)
+    if conn is not None:
+        conn.close()
+
+# Crear o actualizar el esquema de la base de datos (ver migraciones.py)
 def setup_database():
     conn = get_db_connection()
     if conn:
-        cursor = conn.cursor()
-        
-        # Tabla de usuarios
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS usuarios (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            nombre VARCHAR(100) NOT NULL,
-            apellido VARCHAR(100) NOT NULL,
-            cedula VARCHAR(20) UNIQUE NOT NULL,
-            fecha_nacimiento DATE NOT NULL,
-            direccion VARCHAR(255) NOT NULL,
-            telefono VARCHAR(20) NOT NULL,
-            email VARCHAR(100) UNIQUE NOT NULL,
-            password VARCHAR(255) NOT NULL,
-            rol ENUM('admin', 'ahorrador') DEFAULT 'ahorrador',
-            fecha_registro DATETIME DEFAULT CURRENT_TIMESTAMP
-        )
-        ''')
-        
-        # Tabla de ahorros
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS ahorros (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            usuario_id INT NOT NULL,
-            monto DECIMAL(10, 2) NOT NULL,
-            fecha DATETIME DEFAULT CURRENT_TIMESTAMP,
-            validado BOOLEAN DEFAULT 0,
-            FOREIGN KEY (usuario_id) REFERENCES usuarios(id)
-        )
-        ''')
-        
-        # Tabla de préstamos
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS prestamos (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            usuario_id INT NOT NULL,
-            monto DECIMAL(10, 2) NOT NULL,
-            tasa_interes DECIMAL(5, 2) NOT NULL,
-            plazo_meses INT NOT NULL,
-            fecha_solicitud DATETIME DEFAULT CURRENT_TIMESTAMP,
-            estado ENUM('pendiente', 'aprobado', 'rechazado', 'pagado') DEFAULT 'pendiente',
-            FOREIGN KEY (usuario_id) REFERENCES usuarios(id)
-        )
-        ''')
-        
-        # Tabla de pagos de préstamos
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS pagos_prestamos (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            prestamo_id INT NOT NULL,
-            monto DECIMAL(10, 2) NOT NULL,
-            fecha DATETIME DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (prestamo_id) REFERENCES prestamos(id)
-        )
-        ''')
-        
-        conn.commit()
-        cursor.close()
-        conn.close()
-        print("Base de datos configurada correctamente.")
+        try:
+            aplicadas = migrar(conn)
+            print(f"Base de datos configurada correctamente (esquema v{ULTIMA_VERSION}, {aplicadas} migraciones aplicadas).")
+        except Exception as e:
+            print(f"No se pudo configurar la base de datos: {e}")
+        finally:
+            conn.close()
     else:
         print("No se pudo configurar la base de datos.")
 
@@ -178,22 +191,36 @@ def login_required(f):
 def hash_password(password):
     return hashlib.sha256(password.encode()).hexdigest()
 
-# Función para verificar si un usuario es administrador
-def es_admin():
-    if 'user_id' not in session:
-        return False
+# Caché de roles por id de usuario. cambiar_rol() invalida la entrada del
+# usuario afectado en este proceso; en los demás procesos del servidor el
+# cambio se ve cuando vence la entrada, a lo sumo ROL_CACHE_TTL segundos
+# después (un acierto no consulta la base)
+cache_roles = CacheTTL(ttl=int(os.getenv('ROL_CACHE_TTL', '30')))
+
+# Función para obtener el rol de un usuario (consulta la caché primero)
+def obtener_rol(usuario_id):
+    rol = cache_roles.obtener(usuario_id)
+    if rol is not None:
+        return rol
     
-    conn = get_db_connection()
+    conn = get_db()
     if conn:
         cursor = conn.cursor(dictionary=True)
-        cursor.execute("SELECT rol FROM usuarios WHERE id = %s", (session['user_id'],))
+        cursor.execute("SELECT rol FROM usuarios WHERE id = %s", (usuario_id,))
         usuario = cursor.fetchone()
         cursor.close()
-        conn.close()
         
-        if usuario and usuario['rol'] == 'admin':
-            return True
-    return False
+        if usuario:
+            cache_roles.guardar(usuario_id, usuario['rol'])
+            return usuario['rol']
+    return None
+
+# Función para verificar si un usuario es administrador
+def es_admin():
+    if 'user_id' not in session:
+        return False
+    
+    return obtener_rol(session['user_id']) == 'admin'
 
 # Decorador para proteger rutas que requieren ser administrador
 def admin_required(f):
@@ -247,7 +274,7 @@ def registro():
             hashed_password = hash_password(password)
 
             # Conectar a la base de datos
-            conn = get_db_connection()
+            conn = get_db()
             if conn:
                 try:
                     cursor = conn.cursor()
@@ -282,7 +309,6 @@ def registro():
                     return redirect(url_for('registro'))
                 finally:
                     cursor.close()
-                    conn.close()
             else:
                 flash('Error de conexión a la base de datos', 'error')
                 return redirect(url_for('registro'))
@@ -300,13 +326,12 @@ def login():
         email = request.form['email']
         password = hash_password(request.form['password'])
         
-        conn = get_db_connection()
+        conn = get_db()
         if conn:
             cursor = conn.cursor(dictionary=True)
             cursor.execute("SELECT * FROM usuarios WHERE email = %s AND password = %s", (email, password))
             usuario = cursor.fetchone()
             cursor.close()
-            conn.close()
             
             if usuario:
                 # Configurar sesión permanente para persistencia
@@ -314,6 +339,7 @@ def login():
                 session['user_id'] = usuario['id']
                 session['nombre'] = usuario['nombre']
                 session['rol'] = usuario['rol']
+                cache_roles.guardar(usuario['id'], usuario['rol'])
                 
                 # Log para debugging en producción
                 print(f"Usuario {usuario['email']} logueado exitosamente. Session ID: {session.get('user_id')}")
@@ -336,24 +362,20 @@ def dashboard():
         return redirect(url_for('login'))
     
     user_id = session['user_id']
-    conn = get_db_connection()
+    conn = get_db()
     if conn:
         cursor = conn.cursor(dictionary=True)
         
-        # Obtener total de ahorros validados
-        cursor.execute("SELECT SUM(monto) as total_ahorros FROM ahorros WHERE usuario_id = %s AND validado = 1", (user_id,))
-        total_ahorros = cursor.fetchone()['total_ahorros'] or 0
-        
-        # Obtener total de ahorros pendientes de validación
-        cursor.execute("SELECT SUM(monto) as total_pendiente FROM ahorros WHERE usuario_id = %s AND validado = 0", (user_id,))
-        total_pendiente = cursor.fetchone()['total_pendiente'] or 0
+        # Obtener totales de ahorros validados y pendientes de validación
+        saldo = leer_saldo_usuario(cursor, user_id)
+        total_ahorros = saldo['ahorros_validados']
+        total_pendiente = saldo['ahorros_pendientes']
         
         # Obtener préstamos activos
         cursor.execute("SELECT * FROM prestamos WHERE usuario_id = %s AND estado != 'pagado'", (user_id,))
         prestamos = cursor.fetchall()
         
         cursor.close()
-        conn.close()
         
         return render_template('dashboard.html', total_ahorros=total_ahorros, total_pendiente=total_pendiente, prestamos=prestamos)
     
@@ -364,7 +386,7 @@ def dashboard():
 @login_required
 @admin_required
 def admin():
-    conn = get_db_connection()
+    conn = get_db()
     if conn:
         cursor = conn.cursor(dictionary=True)
         
@@ -391,7 +413,6 @@ def admin():
         usuarios = cursor.fetchall()
         
         cursor.close()
-        conn.close()
         
         return render_template('admin.html', 
                               ahorros_pendientes=ahorros_pendientes, 
@@ -402,7 +423,7 @@ def admin():
 @login_required
 @admin_required
 def admin_ahorros():
-    conn = get_db_connection()
+    conn = get_db()
     if conn:
         cursor = conn.cursor(dictionary=True)
         
@@ -419,6 +440,7 @@ def admin_ahorros():
             # Insertar el nuevo ahorro
             cursor.execute("INSERT INTO ahorros (usuario_id, monto, fecha, validado) VALUES (%s, %s, %s, %s)", 
                           (usuario_id, monto, fecha, validado))
+            aplicar_deltas_saldo(cursor, {usuario_id: delta_ahorro(monto, validado)})
             conn.commit()
             
             flash('Ahorro registrado correctamente para el ahorrador.', 'success')
@@ -434,7 +456,6 @@ def admin_ahorros():
         ultimos_ahorros = cursor.fetchall()
         
         cursor.close()
-        conn.close()
         
         return render_template('admin_ahorros.html', usuarios=usuarios, ultimos_ahorros=ultimos_ahorros)
     
@@ -449,20 +470,28 @@ def validar_ahorro(ahorro_id, accion):
         flash('Acción no válida', 'danger')
         return redirect(url_for('admin'))
     
-    conn = get_db_connection()
+    conn = get_db()
     if conn:
-        cursor = conn.cursor()
+        cursor = conn.cursor(dictionary=True)
+        
+        # Bloquear el ahorro para calcular el delta de saldos sin carreras
+        cursor.execute("SELECT usuario_id, monto, validado FROM ahorros WHERE id = %s FOR UPDATE", (ahorro_id,))
+        ahorro = cursor.fetchone()
         
         if accion == 'aprobar':
             cursor.execute("UPDATE ahorros SET validado = 1 WHERE id = %s", (ahorro_id,))
+            if ahorro and not ahorro['validado']:
+                monto = float(ahorro['monto'])
+                aplicar_delta_saldo(cursor, ahorro['usuario_id'], ahorros_validados=monto, ahorros_pendientes=-monto)
             flash('Ahorro validado correctamente', 'success')
         else:
             cursor.execute("DELETE FROM ahorros WHERE id = %s", (ahorro_id,))
+            if ahorro:
+                aplicar_deltas_saldo(cursor, {ahorro['usuario_id']: delta_ahorro(ahorro['monto'], ahorro['validado'], signo=-1)})
             flash('Ahorro rechazado correctamente', 'success')
         
         conn.commit()
         cursor.close()
-        conn.close()
     
     return redirect(url_for('admin'))
 
@@ -474,7 +503,7 @@ def validar_prestamo(prestamo_id, accion):
         flash('Acción no válida', 'danger')
         return redirect(url_for('admin'))
     
-    conn = get_db_connection()
+    conn = get_db()
     if conn:
         cursor = conn.cursor()
         
@@ -485,15 +514,14 @@ def validar_prestamo(prestamo_id, accion):
                 plazo_meses = int(request.form['plazo_meses'])
                 
                 # Obtener el monto del préstamo para calcular interés simple anualizado
-                cursor.execute("SELECT monto FROM prestamos WHERE id = %s", (prestamo_id,))
-                monto_prestamo = cursor.fetchone()[0]
+                cursor.execute("SELECT monto, fecha_solicitud, estado FROM prestamos WHERE id = %s", (prestamo_id,))
+                monto_prestamo, fecha_solicitud, estado_anterior = cursor.fetchone()
                 
-                # Calcular interés mensual fijo: (monto * tasa_anual) / 12 meses
-                interes_anual = float(monto_prestamo) * (tasa_interes / 100)
-                interes_mensual_fijo = interes_anual / 12
-                
-                # Calcular cuota de capital mensual: monto / plazo
-                cuota_capital_mensual = float(monto_prestamo) / plazo_meses
+                # Interés mensual fijo: (monto * tasa_anual) / 12 meses
+                # Cuota de capital mensual: monto / plazo (ambos redondeados a centavos)
+                interes_centavos, capital_centavos = cuotas_interes_simple(monto_prestamo, tasa_interes, plazo_meses)
+                interes_mensual_fijo = int(interes_centavos[0]) / 100
+                cuota_capital_mensual = int(capital_centavos[0]) / 100
                 
                 # Actualizar préstamo con nuevo sistema de interés simple
                 cursor.execute("""
@@ -506,6 +534,12 @@ def validar_prestamo(prestamo_id, accion):
                     WHERE id = %s
                 """, (tasa_interes, plazo_meses, interes_mensual_fijo, cuota_capital_mensual, prestamo_id))
                 
+                # Guardar el plan de cuotas con sus fechas de vencimiento
+                generar_cuotas(cursor, [(prestamo_id, monto_prestamo, tasa_interes, plazo_meses, fecha_solicitud)])
+                cursor_cuotas = conn.cursor(dictionary=True)
+                cuotas_nuevas = leer_cuotas(cursor_cuotas, prestamo_id)
+                cursor_cuotas.close()
+                
                 flash(f'Préstamo aprobado con interés simple anualizado: {tasa_interes}% anual = ${interes_mensual_fijo:.2f} mensual fijo + ${cuota_capital_mensual:.2f} capital por {plazo_meses} meses', 'success')
             else:
                 # Si no es POST, redirigir al panel de administración
@@ -513,11 +547,20 @@ def validar_prestamo(prestamo_id, accion):
                 return redirect(url_for('admin'))
         else:
             cursor.execute("UPDATE prestamos SET estado = 'rechazado' WHERE id = %s", (prestamo_id,))
+            # Un préstamo rechazado después de aprobado ya no tiene cuotas
+            cursor.execute("DELETE FROM cuotas_prestamo WHERE prestamo_id = %s", (prestamo_id,))
+            cuotas_borradas = cursor.rowcount
             flash('Préstamo rechazado correctamente', 'success')
         
         conn.commit()
         cursor.close()
-        conn.close()
+        
+        # Actualizar el flujo de caja en memoria con el plan confirmado
+        if accion == 'aprobar' and estado_anterior not in ('aprobado', 'pagado'):
+            flujo_caja.sumar_cuotas(cuotas_nuevas)
+        elif accion == 'aprobar' or cuotas_borradas > 0:
+            # El plan anterior fue reemplazado o borrado
+            flujo_caja.invalidar()
     
     return redirect(url_for('admin'))
 
@@ -525,7 +568,7 @@ def validar_prestamo(prestamo_id, accion):
 @login_required
 @admin_required
 def cambiar_rol(usuario_id):
-    conn = get_db_connection()
+    conn = get_db()
     if conn:
         cursor = conn.cursor(dictionary=True)
         
@@ -537,10 +580,11 @@ def cambiar_rol(usuario_id):
             nuevo_rol = 'ahorrador' if usuario['rol'] == 'admin' else 'admin'
             cursor.execute("UPDATE usuarios SET rol = %s WHERE id = %s", (nuevo_rol, usuario_id))
             conn.commit()
+            # Revocar de inmediato los privilegios cacheados en este proceso
+            cache_roles.invalidar(usuario_id)
             flash(f'Rol de usuario actualizado a {nuevo_rol}', 'success')
         
         cursor.close()
-        conn.close()
     
     return redirect(url_for('admin'))
 
@@ -553,7 +597,7 @@ def ahorros():
     user_id = session['user_id']
     
     # Obtener historial de ahorros del usuario
-    conn = get_db_connection()
+    conn = get_db()
     if conn:
         cursor = conn.cursor(dictionary=True)
         
@@ -561,12 +605,10 @@ def ahorros():
         cursor.execute("SELECT *, CASE WHEN validado = 1 THEN 'Validado' ELSE 'Pendiente' END as estado FROM ahorros WHERE usuario_id = %s ORDER BY fecha DESC", (user_id,))
         historial_ahorros = cursor.fetchall()
         
-        # Calcular total de ahorros validados
-        cursor.execute("SELECT SUM(monto) as total_ahorros FROM ahorros WHERE usuario_id = %s AND validado = 1", (user_id,))
-        total_ahorros = cursor.fetchone()['total_ahorros'] or 0
+        # Obtener total de ahorros validados
+        total_ahorros = leer_saldo_usuario(cursor, user_id)['ahorros_validados']
         
         cursor.close()
-        conn.close()
         
         return render_template('ahorros.html', historial_ahorros=historial_ahorros, total_ahorros=total_ahorros)
     
@@ -582,56 +624,60 @@ def prestamos():
     if request.method == 'POST':
         monto = float(request.form['monto'])
         
-        conn = get_db_connection()
+        conn = get_db()
         if conn:
             cursor = conn.cursor()
             # Los préstamos se registran con estado 'pendiente' por defecto, esperando aprobación de un administrador
             # La tasa de interés y el plazo serán establecidos por el administrador al aprobar el préstamo
             # Incluimos valores por defecto temporales para tasa_interes y plazo_meses
-            cursor.execute("INSERT INTO prestamos (usuario_id, monto, estado, tasa_interes, plazo_meses) VALUES (%s, %s, %s, %s, %s)",
-                          (session['user_id'], monto, 'pendiente', 0.0, 0))
+            cursor.execute("INSERT INTO prestamos (usuario_id, monto, estado, tasa_interes, plazo_meses, saldo_pendiente) VALUES (%s, %s, %s, %s, %s, %s)",
+                          (session['user_id'], monto, 'pendiente', 0.0, 0, monto))
+            aplicar_delta_saldo(cursor, session['user_id'], total_prestamos=monto, prestamos_activos=1)
             conn.commit()
             cursor.close()
-            conn.close()
             
             flash('Solicitud de préstamo enviada correctamente. Pendiente de aprobación por un administrador.', 'success')
             return redirect(url_for('prestamos'))
     
     # Obtener historial de préstamos del usuario con saldo pendiente y pagos
-    conn = get_db_connection()
+    conn = get_db()
     if conn:
         cursor = conn.cursor(dictionary=True)
         cursor.execute("SELECT * FROM prestamos WHERE usuario_id = %s ORDER BY fecha_solicitud DESC", (session['user_id'],))
         historial_prestamos = cursor.fetchall()
         
-        # Para cada préstamo aprobado, calcular el saldo pendiente y obtener historial de pagos
+        # Obtener los pagos de todos los préstamos aprobados en una sola consulta
+        pagos_por_prestamo = {}
+        ids_aprobados = [p['id'] for p in historial_prestamos if p['estado'] == 'aprobado']
+        if ids_aprobados:
+            marcadores = ', '.join(['%s'] * len(ids_aprobados))
+            cursor.execute(f"SELECT * FROM pagos_prestamos WHERE prestamo_id IN ({marcadores}) ORDER BY fecha DESC",
+                           tuple(ids_aprobados))
+            for pago in cursor.fetchall():
+                pagos_por_prestamo.setdefault(pago['prestamo_id'], []).append(pago)
+        
+        # Resumen del plan de cuotas guardado al aprobar cada préstamo
+        cuotas_por_prestamo = resumen_cuotas(cursor, ids_aprobados) if ids_aprobados else {}
+        
+        # Para cada préstamo aprobado, calcular el saldo pendiente y asignar historial de pagos
         for prestamo in historial_prestamos:
             if prestamo['estado'] == 'aprobado':
-                # Obtener la suma de pagos realizados para este préstamo
-                cursor.execute("SELECT SUM(monto) as total_pagado FROM pagos_prestamos WHERE prestamo_id = %s", (prestamo['id'],))
-                resultado = cursor.fetchone()
-                total_pagado = resultado['total_pagado'] if resultado['total_pagado'] else 0
+                # Saldo pendiente mantenido en la fila del préstamo con cada pago
+                prestamo['saldo_pendiente'] = round(float(prestamo['saldo_pendiente']), 2)
                 
-                # Calcular saldo pendiente
-                prestamo['saldo_pendiente'] = round(float(prestamo['monto']) - float(total_pagado), 2)
-                
-                # Calcular información de cuotas con interés simple (acceso defensivo)
-                interes_mensual_fijo = prestamo.get('interes_mensual_fijo')
-                cuota_capital_mensual = prestamo.get('cuota_capital_mensual')
-                plazo_meses = prestamo.get('plazo_meses', 0)
-                if interes_mensual_fijo is not None and cuota_capital_mensual is not None and plazo_meses:
-                    prestamo['cuota_total_mensual'] = float(interes_mensual_fijo) + float(cuota_capital_mensual)
-                    prestamo['total_intereses'] = float(interes_mensual_fijo) * int(plazo_meses)
-                    prestamo['total_a_pagar'] = float(prestamo['monto']) + prestamo['total_intereses']
+                resumen = cuotas_por_prestamo.get(prestamo['id'])
+                if resumen and prestamo.get('interes_mensual_fijo') is not None and prestamo.get('cuota_capital_mensual') is not None:
+                    prestamo['cuota_total_mensual'] = float(resumen['cuota_total_mensual'])
+                    prestamo['total_intereses'] = float(resumen['total_intereses'])
+                    prestamo['total_a_pagar'] = float(resumen['total_a_pagar'])
+                    prestamo['proximo_vencimiento'] = resumen['proximo_vencimiento']
                 else:
-                    # Para préstamos antiguos sin el nuevo sistema o sin columnas
+                    # Para préstamos antiguos sin el nuevo sistema o sin plan de cuotas
                     prestamo['cuota_total_mensual'] = None
                     prestamo['total_intereses'] = None
                     prestamo['total_a_pagar'] = None
                 
-                # Obtener historial de pagos
-                cursor.execute("SELECT * FROM pagos_prestamos WHERE prestamo_id = %s ORDER BY fecha DESC", (prestamo['id'],))
-                prestamo['pagos'] = cursor.fetchall()
+                prestamo['pagos'] = pagos_por_prestamo.get(prestamo['id'], [])
             else:
                 prestamo['saldo_pendiente'] = prestamo['monto']
                 prestamo['pagos'] = []
@@ -640,13 +686,17 @@ def prestamos():
                 prestamo['total_a_pagar'] = None
         
         cursor.close()
-        conn.close()
         
         return render_template('prestamos.html', historial_prestamos=historial_prestamos)
     
     flash('Error al conectar con la base de datos', 'danger')
     return redirect(url_for('dashboard'))
 
+# Función para leer el cursor de paginación del historial (?despues=...)
+def cursor_historial_solicitado():
+    token = request.args.get('despues')
+    return decodificar_cursor(token) if token else None
+
 @app.route('/historial')
 @login_required
 def historial():
@@ -654,72 +704,83 @@ def historial():
         return redirect(url_for('login'))
     
     user_id = session['user_id']
-    conn = get_db_connection()
-    transacciones = []
+    conn = get_db()
     
     if conn:
         cursor = conn.cursor(dictionary=True)
         
-        # Obtener ahorros - Solo los del usuario logueado
-        cursor.execute("""
-            SELECT id, monto, fecha, 'ahorro' as tipo, 'Depósito de ahorro' as descripcion 
-            FROM ahorros 
-            WHERE usuario_id = %s
-        """, (user_id,))
-        ahorros = cursor.fetchall()
-        transacciones.extend(ahorros)
-        
-        # Obtener préstamos - Solo los del usuario logueado
-        cursor.execute("""
-            SELECT id, monto, fecha_solicitud as fecha, 'prestamo' as tipo, 
-                   CONCAT('Préstamo a ', plazo_meses, ' meses') as descripcion 
-            FROM prestamos 
-            WHERE usuario_id = %s
-        """, (user_id,))
-        prestamos = cursor.fetchall()
-        transacciones.extend(prestamos)
+        try:
+            despues_de = cursor_historial_solicitado()
+        except ValueError:
+            flash('El enlace de paginación no es válido', 'warning')
+            return redirect(url_for('historial'))
         
-        # Obtener pagos de préstamos - Solo los del usuario logueado
-        cursor.execute("""
-            SELECT pp.id, pp.monto, pp.fecha, 'pago' as tipo, 
-                   'Pago de préstamo' as descripcion 
-            FROM pagos_prestamos pp
-            JOIN prestamos p ON pp.prestamo_id = p.id
-            WHERE p.usuario_id = %s
-        """, (user_id,))
-        pagos = cursor.fetchall()
-        transacciones.extend(pagos)
-        
-        # Ordenar por fecha (más reciente primero)
-        transacciones.sort(key=lambda x: x['fecha'], reverse=True)
-        
-        # Obtener totales
-        cursor.execute("SELECT SUM(monto) as total_ahorros FROM ahorros WHERE usuario_id = %s", (user_id,))
-        total_ahorros = cursor.fetchone()['total_ahorros'] or 0
+        # Obtener una página de movimientos del usuario logueado, más recientes primero
+        transacciones, siguiente = obtener_pagina_transacciones(cursor, user_id, despues_de=despues_de)
         
-        cursor.execute("""
-            SELECT SUM(monto) as total_prestamos 
-            FROM prestamos 
-            WHERE usuario_id = %s AND estado != 'pagado'
-        """, (user_id,))
-        total_prestamos = cursor.fetchone()['total_prestamos'] or 0
+        # Obtener totales (independientes de la página mostrada)
+        saldo = leer_saldo_usuario(cursor, user_id)
+        total_ahorros = saldo['ahorros_validados'] + saldo['ahorros_pendientes']
+        total_prestamos = saldo['total_prestamos']
         
         cursor.close()
-        conn.close()
         
         return render_template('historial.html', 
                               transacciones=transacciones, 
+                              siguiente=siguiente,
                               total_ahorros=total_ahorros,
                               total_prestamos=total_prestamos)
     
     flash('Error al conectar con la base de datos', 'danger')
     return redirect(url_for('dashboard'))
 
+# API: Página siguiente del historial del usuario logueado
+@app.route('/api/historial')
+@login_required
+def api_historial():
+    return respuesta_pagina_historial(session['user_id'])
+
+# API: Página siguiente del historial de un ahorrador (administrador)
+@app.route('/api/admin/historial/<int:usuario_id>')
+@login_required
+@admin_required
+def api_admin_historial(usuario_id):
+    return respuesta_pagina_historial(usuario_id)
+
+def respuesta_pagina_historial(usuario_id):
+    """Respuesta JSON con una página del historial y el cursor de la siguiente"""
+    conn = get_db()
+    if not conn:
+        return jsonify({'error': 'Error de conexión a la base de datos'}), 500
+    
+    try:
+        despues_de = cursor_historial_solicitado()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    try:
+        limite = min(max(int(request.args.get('limite', TAMANO_PAGINA)), 1), 200)
+    except ValueError:
+        return jsonify({'error': 'El límite debe ser un número'}), 400
+    
+    cursor = conn.cursor(dictionary=True)
+    try:
+        transacciones, siguiente = obtener_pagina_transacciones(cursor, usuario_id, limite, despues_de)
+        return jsonify({
+            'transacciones': [transaccion_a_json(t) for t in transacciones],
+            'siguiente': siguiente
+        })
+    except Exception as e:
+        print(f"Error obteniendo historial: {e}")
+        return jsonify({'error': 'Error al obtener el historial'}), 500
+    finally:
+        cursor.close()
+
 @app.route('/admin/historial')
 @login_required
 @admin_required
 def admin_historial():
-    conn = get_db_connection()
+    conn = get_db()
     if conn:
         cursor = conn.cursor(dictionary=True)
         
@@ -731,6 +792,7 @@ def admin_historial():
         usuario_id = request.args.get('usuario_id')
         usuario_seleccionado = None
         transacciones = []
+        siguiente = None
         total_ahorros = 0
         total_prestamos = 0
         
@@ -740,57 +802,28 @@ def admin_historial():
             usuario_seleccionado = cursor.fetchone()
             
             if usuario_seleccionado:
-                # Obtener ahorros del usuario seleccionado
-                cursor.execute("""
-                    SELECT id, monto, fecha, 'ahorro' as tipo, 'Depósito de ahorro' as descripcion 
-                    FROM ahorros 
-                    WHERE usuario_id = %s
-                """, (usuario_id,))
-                ahorros = cursor.fetchall()
-                transacciones.extend(ahorros)
-                
-                # Obtener préstamos del usuario seleccionado
-                cursor.execute("""
-                    SELECT id, monto, fecha_solicitud as fecha, 'prestamo' as tipo, 
-                           CONCAT('Préstamo a ', plazo_meses, ' meses') as descripcion 
-                    FROM prestamos 
-                    WHERE usuario_id = %s
-                """, (usuario_id,))
-                prestamos = cursor.fetchall()
-                transacciones.extend(prestamos)
-                
-                # Obtener pagos de préstamos del usuario seleccionado
-                cursor.execute("""
-                    SELECT pp.id, pp.monto, pp.fecha, 'pago' as tipo, 
-                           'Pago de préstamo' as descripcion 
-                    FROM pagos_prestamos pp
-                    JOIN prestamos p ON pp.prestamo_id = p.id
-                    WHERE p.usuario_id = %s
-                """, (usuario_id,))
-                pagos = cursor.fetchall()
-                transacciones.extend(pagos)
+                try:
+                    despues_de = cursor_historial_solicitado()
+                except ValueError:
+                    flash('El enlace de paginación no es válido', 'warning')
+                    despues_de = None
                 
-                # Ordenar por fecha (más reciente primero)
-                transacciones.sort(key=lambda x: x['fecha'], reverse=True)
+                # Obtener una página de movimientos del usuario seleccionado
+                transacciones, siguiente = obtener_pagina_transacciones(
+                    cursor, usuario_seleccionado['id'], despues_de=despues_de)
                 
                 # Obtener totales
-                cursor.execute("SELECT SUM(monto) as total_ahorros FROM ahorros WHERE usuario_id = %s", (usuario_id,))
-                total_ahorros = cursor.fetchone()['total_ahorros'] or 0
-                
-                cursor.execute("""
-                    SELECT SUM(monto) as total_prestamos 
-                    FROM prestamos 
-                    WHERE usuario_id = %s AND estado != 'pagado'
-                """, (usuario_id,))
-                total_prestamos = cursor.fetchone()['total_prestamos'] or 0
+                saldo = leer_saldo_usuario(cursor, usuario_seleccionado['id'])
+                total_ahorros = saldo['ahorros_validados'] + saldo['ahorros_pendientes']
+                total_prestamos = saldo['total_prestamos']
         
         cursor.close()
-        conn.close()
         
         return render_template('admin_historial.html', 
                               usuarios=usuarios,
                               usuario_seleccionado=usuario_seleccionado,
                               transacciones=transacciones, 
+                              siguiente=siguiente,
                               total_ahorros=total_ahorros,
                               total_prestamos=total_prestamos)
     
@@ -806,7 +839,7 @@ def calculadora():
 @login_required
 def perfil():
     user_id = session['user_id']
-    conn = get_db_connection()
+    conn = get_db()
     
     if request.method == 'POST':
         try:
@@ -844,7 +877,6 @@ def perfil():
                         flash(f'Error al actualizar perfil: {err}', 'danger')
                 finally:
                     cursor.close()
-                    conn.close()
                 return redirect(url_for('perfil'))
         except Exception as e:
             flash(f'Error al procesar el formulario: {str(e)}', 'danger')
@@ -857,26 +889,16 @@ def perfil():
         cursor.execute("SELECT * FROM usuarios WHERE id = %s", (user_id,))
         usuario = cursor.fetchone()
         
-        # Obtener total de ahorros validados
-        cursor.execute("SELECT SUM(monto) as total_ahorros FROM ahorros WHERE usuario_id = %s AND validado = 1", (user_id,))
-        total_ahorros = cursor.fetchone()['total_ahorros'] or 0
-        
-        # Obtener total de préstamos activos
-        cursor.execute("""
-            SELECT COUNT(*) as num_prestamos, COALESCE(SUM(monto), 0) as total_prestamos 
-            FROM prestamos 
-            WHERE usuario_id = %s AND estado != 'pagado'
-        """, (user_id,))
-        prestamos_info = cursor.fetchone()
+        # Obtener total de ahorros validados y de préstamos activos
+        saldo = leer_saldo_usuario(cursor, user_id)
         
         cursor.close()
-        conn.close()
         
         return render_template('perfil.html', 
                              usuario=usuario,
-                             total_ahorros=total_ahorros,
-                             num_prestamos=prestamos_info['num_prestamos'],
-                             total_prestamos=prestamos_info['total_prestamos'])
+                             total_ahorros=saldo['ahorros_validados'],
+                             num_prestamos=saldo['prestamos_activos'],
+                             total_prestamos=saldo['total_prestamos'])
     
     flash('Error al conectar con la base de datos', 'danger')
     return redirect(url_for('dashboard'))
@@ -895,7 +917,7 @@ def cambiar_password():
         return redirect(url_for('perfil'))
     
     # Verificar la contraseña actual
-    conn = get_db_connection()
+    conn = get_db()
     if conn:
         cursor = conn.cursor(dictionary=True)
         cursor.execute("SELECT password FROM usuarios WHERE id = %s", (user_id,))
@@ -903,7 +925,6 @@ def cambiar_password():
         
         if not usuario or usuario['password'] != hash_password(current_password):
             cursor.close()
-            conn.close()
             flash('La contraseña actual es incorrecta', 'danger')
             return redirect(url_for('perfil'))
         
@@ -920,71 +941,60 @@ def cambiar_password():
             flash(f'Error al actualizar la contraseña: {err}', 'danger')
         finally:
             cursor.close()
-            conn.close()
     else:
         flash('Error al conectar con la base de datos', 'danger')
     
     return redirect(url_for('perfil'))
 
 # FUNCIONES PARA CÁLCULO DE TABLA DE AMORTIZACIÓN
-def calcular_tabla_amortizacion(monto_prestamo, tasa_interes_anual, plazo_meses):
+
+# Tablas ya calculadas por (monto, tasa, plazo, sistema): préstamos con las
+# mismas condiciones tienen la misma tabla
+cache_tablas = CacheLRU(capacidad=int(os.getenv('TABLAS_CACHE_TAMANO', '1024')))
+
+# Flujo de caja mensual del fondo (ver flujo_caja.py)
+flujo_caja = FlujoCaja(ttl=int(os.getenv('FLUJO_CAJA_TTL', '300')))
+
+def calcular_tabla_amortizacion(monto_prestamo, tasa_interes_anual, plazo_meses, sistema='frances'):
     """
-    Calcula la tabla de amortización para un préstamo
+    Calcula la tabla de amortización para un préstamo (ver amortizacion.py)
     Retorna lista de diccionarios con mes, abono_capital, interes, cuota_total, saldo_restante
     """
-    if not all([monto_prestamo, tasa_interes_anual, plazo_meses]) or plazo_meses <= 0:
+    if not all([monto_prestamo, tasa_interes_anual, plazo_meses]) or int(plazo_meses) <= 0:
         return []
     
     try:
-        # Convertir tasa anual a mensual
-        tasa_interes_mensual = float(tasa_interes_anual) / 100 / 12
-        monto = float(monto_prestamo)
-        plazo = int(plazo_meses)
-        
-        # Calcular cuota fija mensual (método francés)
-        if tasa_interes_mensual > 0:
-            cuota_fija = monto * (tasa_interes_mensual * (1 + tasa_interes_mensual)**plazo) / ((1 + tasa_interes_mensual)**plazo - 1)
-        else:
-            cuota_fija = monto / plazo
-        
-        tabla = []
-        saldo_restante = monto
-        
-        for mes in range(1, plazo + 1):
-            # Calcular interés del mes
-            interes_mes = saldo_restante * tasa_interes_mensual
-            
-            # Calcular abono a capital
-            abono_capital = cuota_fija - interes_mes
-            
-            # Actualizar saldo
-            saldo_restante -= abono_capital
-            
-            # Ajustar última cuota para evitar decimales
-            if mes == plazo:
-                abono_capital += saldo_restante
-                saldo_restante = 0
-            
-            tabla.append({
-                'mes': mes,
-                'abono_capital': round(abono_capital, 2),
-                'interes': round(interes_mes, 2),
-                'cuota_total': round(cuota_fija, 2),
-                'saldo_restante': round(saldo_restante, 2)
-            })
-        
-        return tabla
+        # Misma clave para 1000, 1000.0 y Decimal('1000.00')
+        clave = (f"{Decimal(str(monto_prestamo)):.2f}", f"{Decimal(str(tasa_interes_anual)):.2f}", int(plazo_meses), sistema)
+        tabla = cache_tablas.obtener(clave)
+        if tabla is None:
+            tabla = filas_tabla(calcular_tablas(sistema, [monto_prestamo], [tasa_interes_anual], [int(plazo_meses)]))
+            cache_tablas.guardar(clave, tabla)
+        # Copias: quien llama puede modificar las filas
+        return [dict(fila) for fila in tabla]
     except Exception as e:
         print(f"Error calculando tabla de amortización: {e}")
         return []
 
+def etag_pronostico(prestamo, pagos_realizados):
+    """ETag del pronóstico: cambia con cualquier columna del préstamo o con un pago nuevo"""
+    contenido = json.dumps(prestamo, sort_keys=True, default=str) + f"|{pagos_realizados}"
+    return hashlib.sha256(contenido.encode('utf-8')).hexdigest()[:32]
+
+def respuesta_validable(respuesta, etag):
+    """El navegador guarda la respuesta pero la revalida con If-None-Match cada vez"""
+    respuesta.set_etag(etag)
+    respuesta.cache_control.private = True
+    respuesta.cache_control.no_cache = True
+    return respuesta
+
 # ENDPOINTS API PARA ADMINISTRADOR - DETALLES DE AHORROS
 @app.route('/api/admin/ahorro/<int:ahorro_id>')
 @login_required
 @admin_required
 def api_detalle_ahorro(ahorro_id):
     """Obtiene detalles completos de un ahorro específico"""
-    conn = get_db_connection()
+    conn = get_db()
     if not conn:
         return jsonify({'error': 'Error de conexión a la base de datos'}), 500
     
@@ -1042,7 +1052,6 @@ def api_detalle_ahorro(ahorro_id):
     
     finally:
         cursor.close()
-        conn.close()
 
 # ENDPOINTS API PARA ADMINISTRADOR - PRÓSTICO DE PRÉSTAMOS
 @app.route('/api/admin/prestamo/<int:prestamo_id>/pronostico')
@@ -1050,7 +1059,7 @@ def api_detalle_ahorro(ahorro_id):
 @admin_required
 def api_pronostico_prestamo(prestamo_id):
     """Obtiene el pronóstico de pagos de un préstamo específico"""
-    conn = get_db_connection()
+    conn = get_db()
     if not conn:
         return jsonify({'error': 'Error de conexión a la base de datos'}), 500
     
@@ -1072,52 +1081,47 @@ def api_pronostico_prestamo(prestamo_id):
         if not prestamo:
             return jsonify({'error': 'Préstamo no encontrado'}), 404
         
-        # Calcular tabla de amortización
-        tabla_amortizacion = calcular_tabla_amortizacion(
-            prestamo['monto'],
-            prestamo['tasa_interes'],
-            prestamo['plazo_meses']
-        )
-        
-        # Obtener pagos realizados
-        cursor.execute("""
-            SELECT COUNT(*) as pagos_realizados, SUM(monto) as total_pagado
-            FROM pagos_prestamos
-            WHERE prestamo_id = %s
-        """, (prestamo_id,))
+        # Si el préstamo y sus pagos no cambiaron desde la última vista,
+        # 304 sin leer el plan ni armar la respuesta
+        cursor.execute("SELECT COUNT(*) AS pagos_realizados FROM pagos_prestamos WHERE prestamo_id = %s", (prestamo_id,))
+        etag = etag_pronostico(prestamo, cursor.fetchone()['pagos_realizados'])
+        if request.if_none_match.contains(etag):
+            return respuesta_validable(app.response_class(status=304), etag)
+        
+        # Plan de cuotas guardado al aprobar el préstamo; si no existe
+        # (préstamo sin aprobar), se calcula sin guardarlo
+        cuotas = leer_cuotas(cursor, prestamo_id)
+        if cuotas:
+            tabla_amortizacion_formateada = [
+                {
+                    'mes': cuota['numero'],
+                    'cuota_total': float(cuota['cuota']),
+                    'capital': float(cuota['capital']),
+                    'interes': float(cuota['interes']),
+                    'saldo_pendiente': float(cuota['saldo_esperado']),
+                    'fecha_vencimiento': cuota['fecha_vencimiento'].strftime('%Y-%m-%d'),
+                    'pagada': bool(cuota['pagada'])
+                } for cuota in cuotas
+            ]
+            fecha_finalizacion = cuotas[-1]['fecha_vencimiento']
+        else:
+            tabla_amortizacion_formateada = [
+                {
+                    'mes': item['mes'],
+                    'cuota_total': item['cuota_total'],
+                    'capital': item['abono_capital'],
+                    'interes': item['interes'],
+                    'saldo_pendiente': item['saldo_restante']
+                } for item in calcular_tabla_amortizacion(
+                    prestamo['monto'], prestamo['tasa_interes'], prestamo['plazo_meses'], sistema=SISTEMA_PRESTAMOS
+                )
+            ]
+            fecha_solicitud = prestamo['fecha_solicitud'] or datetime.now()
+            fecha_finalizacion = sumar_meses(fecha_solicitud, int(prestamo['plazo_meses'] or 0))
         
-        pagos_info = cursor.fetchone()
-        
-        # Formatear tabla de amortización al formato esperado por el template
-        cuota_mensual = tabla_amortizacion[0]['cuota_total'] if tabla_amortizacion else 0.0
-        tabla_amortizacion_formateada = [
-            {
-                'mes': item['mes'],
-                'cuota_total': item['cuota_total'],
-                'capital': item['abono_capital'],
-                'interes': item['interes'],
-                'saldo_pendiente': item['saldo_restante']
-            } for item in tabla_amortizacion
-        ]
-
-        total_pagado = float(pagos_info['total_pagado'] or 0)
-        total_intereses = float(sum(item['interes'] for item in tabla_amortizacion))
-        saldo_pendiente = float(prestamo['monto']) - total_pagado
-
-        # Calcular fecha de finalización (fecha_solicitud + plazo_meses)
-        try:
-            fecha_solicitud_dt = prestamo['fecha_solicitud'] if isinstance(prestamo['fecha_solicitud'], datetime) else datetime.strptime(str(prestamo['fecha_solicitud']), '%Y-%m-%d %H:%M:%S') if ' ' in str(prestamo['fecha_solicitud']) else datetime.strptime(str(prestamo['fecha_solicitud']), '%Y-%m-%d')
-        except Exception:
-            fecha_solicitud_dt = datetime.now()
-        import calendar
-        year = fecha_solicitud_dt.year
-        month = fecha_solicitud_dt.month + int(prestamo['plazo_meses'])
-        day = fecha_solicitud_dt.day
-        year += (month - 1) // 12
-        month = ((month - 1) % 12) + 1
-        last_day = calendar.monthrange(year, month)[1]
-        day = min(day, last_day)
-        fecha_finalizacion_dt = datetime(year, month, day)
+        cuota_mensual = tabla_amortizacion_formateada[0]['cuota_total'] if tabla_amortizacion_formateada else 0.0
+        total_pagado = float(prestamo['total_pagado'] or 0)
+        total_intereses = float(sum(item['interes'] for item in tabla_amortizacion_formateada))
         
         response = {
             'monto_prestamo': float(prestamo['monto']),
@@ -1127,10 +1131,10 @@ def api_pronostico_prestamo(prestamo_id):
             'tabla_amortizacion': tabla_amortizacion_formateada,
             'total_pagado': total_pagado,
             'total_intereses': total_intereses,
-            'fecha_finalizacion': fecha_finalizacion_dt.strftime('%Y-%m-%d')
+            'fecha_finalizacion': fecha_finalizacion.strftime('%Y-%m-%d')
         }
         
-        return jsonify(response)
+        return respuesta_validable(jsonify(response), etag)
         
     except Exception as e:
         print(f"Error obteniendo pronóstico de préstamo: {e}")
@@ -1138,14 +1142,52 @@ def api_pronostico_prestamo(prestamo_id):
     
     finally:
         cursor.close()
-        conn.close()
+
+# ENDPOINTS API PARA ADMINISTRADOR - FLUJO DE CAJA
+@app.route('/api/admin/flujo_caja')
+@login_required
+@admin_required
+def api_flujo_caja():
+    """
+    Flujo de caja esperado y realizado por mes para todo el fondo.
+    Parámetros opcionales ?desde=AAAA-MM&hasta=AAAA-MM (por defecto, de 6
+    meses atrás a 12 meses adelante)
+    """
+    mes_actual = datetime.now().strftime('%Y-%m')
+    desde = request.args.get('desde') or sumar_meses_clave(mes_actual, -6)
+    hasta = request.args.get('hasta') or sumar_meses_clave(mes_actual, 12)
+    try:
+        for valor in (desde, hasta):
+            datetime.strptime(valor, '%Y-%m')
+    except ValueError:
+        return jsonify({'error': 'Los meses deben estar en formato AAAA-MM'}), 400
+    if desde > hasta or hasta > sumar_meses_clave(desde, 239):
+        return jsonify({'error': 'El rango debe tener entre 1 y 240 meses'}), 400
+    
+    conn = get_db()
+    if not conn:
+        return jsonify({'error': 'Error de conexión a la base de datos'}), 500
+    
+    cursor = conn.cursor(dictionary=True)
+    try:
+        meses = flujo_caja.obtener(cursor, desde, hasta)
+        totales = {
+            clave: round(sum(mes[clave] or 0 for mes in meses), 2)
+            for clave in ('capital_esperado', 'interes_esperado', 'total_esperado', 'pagos_realizados', 'ahorros_proyectados')
+        }
+        return jsonify({'desde': desde, 'hasta': hasta, 'meses': meses, 'totales': totales})
+    except Exception as e:
+        print(f"Error obteniendo flujo de caja: {e}")
+        return jsonify({'error': 'Error al obtener el flujo de caja'}), 500
+    finally:
+        cursor.close()
 
 # API: Obtener préstamos aprobados de un usuario (para selector en pagos)
 @app.route('/api/prestamos_usuario/<int:usuario_id>')
 @login_required
 @admin_required
 def api_prestamos_usuario(usuario_id):
-    conn = get_db_connection()
+    conn = get_db()
     if not conn:
         return jsonify({'error': 'Error de conexión a la base de datos'}), 500
 
@@ -1162,15 +1204,10 @@ def api_prestamos_usuario(usuario_id):
 
         resultado = []
         for p in prestamos:
-            # Calcular saldo pendiente con pagos previos
-            cursor.execute("SELECT COALESCE(SUM(monto), 0) as total_pagado FROM pagos_prestamos WHERE prestamo_id = %s", (p['id'],))
-            total_pagado = cursor.fetchone()['total_pagado'] or 0
-            saldo_pendiente = float(p['monto']) - float(total_pagado)
-
             item = {
                 'id': p['id'],
                 'monto': float(p['monto']),
-                'saldo_pendiente': float(saldo_pendiente),
+                'saldo_pendiente': float(p['saldo_pendiente']),
             }
 
             # Incluir cuota sugerida si existe (interés simple anualizado)
@@ -1190,7 +1227,24 @@ def api_prestamos_usuario(usuario_id):
         return jsonify({'error': 'Error al obtener préstamos del usuario'}), 500
     finally:
         cursor.close()
-        conn.close()
+
+# ESTADÍSTICAS DEL POOL DE CONEXIONES
+@app.route('/api/admin/pool_db')
+@login_required
+@admin_required
+def api_estadisticas_pool():
+    """
+    Retorna los contadores del pool de conexiones (checkouts, esperas,
+    timeouts) y los de la caché de tablas de amortización de este proceso
+    """
+    estadisticas = pool_db.estadisticas()
+    estadisticas['cache_tablas'] = {
+        'aciertos': cache_tablas.aciertos,
+        'fallos': cache_tablas.fallos,
+        'entradas': len(cache_tablas),
+        'capacidad': cache_tablas.capacidad,
+    }
+    return jsonify(estadisticas)
 
 # ACTUALIZAR ESTADO DE AHORRO (VALIDAR/INVALIDAR)
 @app.route('/api/admin/ahorro/<int:ahorro_id>/validar', methods=['POST'])
@@ -1198,24 +1252,32 @@ def api_prestamos_usuario(usuario_id):
 @admin_required
 def api_validar_ahorro(ahorro_id):
     """Actualiza el estado de validación de un ahorro"""
-    conn = get_db_connection()
+    conn = get_db()
     if not conn:
         return jsonify({'error': 'Error de conexión a la base de datos'}), 500
     
-    cursor = conn.cursor()
+    cursor = conn.cursor(dictionary=True)
     
     try:
         data = request.get_json()
         validado = data.get('validado', False)
         
+        # Bloquear el ahorro para calcular el delta de saldos sin carreras
+        cursor.execute("SELECT usuario_id, monto, validado FROM ahorros WHERE id = %s FOR UPDATE", (ahorro_id,))
+        ahorro = cursor.fetchone()
+        
+        if not ahorro:
+            return jsonify({'error': 'Ahorro no encontrado'}), 404
+        
         cursor.execute("""
             UPDATE ahorros 
             SET validado = %s 
             WHERE id = %s
         """, (validado, ahorro_id))
         
-        if cursor.rowcount == 0:
-            return jsonify({'error': 'Ahorro no encontrado'}), 404
+        if bool(ahorro['validado']) != bool(validado):
+            monto = float(ahorro['monto']) if validado else -float(ahorro['monto'])
+            aplicar_delta_saldo(cursor, ahorro['usuario_id'], ahorros_validados=monto, ahorros_pendientes=-monto)
         
         conn.commit()
         
@@ -1231,7 +1293,6 @@ def api_validar_ahorro(ahorro_id):
     
     finally:
         cursor.close()
-        conn.close()
 
 # ACTUALIZAR ESTADO DE PRÉSTAMO
 @app.route('/api/admin/prestamo/<int:prestamo_id>/estado', methods=['POST'])
@@ -1239,11 +1300,11 @@ def api_validar_ahorro(ahorro_id):
 @admin_required
 def api_actualizar_estado_prestamo(prestamo_id):
     """Actualiza el estado de un préstamo"""
-    conn = get_db_connection()
+    conn = get_db()
     if not conn:
         return jsonify({'error': 'Error de conexión a la base de datos'}), 500
     
-    cursor = conn.cursor()
+    cursor = conn.cursor(dictionary=True)
     
     try:
         data = request.get_json()
@@ -1252,14 +1313,23 @@ def api_actualizar_estado_prestamo(prestamo_id):
         if nuevo_estado not in ['pendiente', 'aprobado', 'rechazado', 'pagado']:
             return jsonify({'error': 'Estado inválido'}), 400
         
+        cursor.execute("SELECT usuario_id, monto, estado FROM prestamos WHERE id = %s FOR UPDATE", (prestamo_id,))
+        prestamo = cursor.fetchone()
+        
+        if not prestamo:
+            return jsonify({'error': 'Préstamo no encontrado'}), 404
+        
         cursor.execute("""
             UPDATE prestamos 
             SET estado = %s 
             WHERE id = %s
         """, (nuevo_estado, prestamo_id))
         
-        if cursor.rowcount == 0:
-            return jsonify({'error': 'Préstamo no encontrado'}), 404
+        # Entrar o salir del estado 'pagado' cambia los préstamos activos del usuario
+        if (prestamo['estado'] == 'pagado') != (nuevo_estado == 'pagado'):
+            signo = -1 if nuevo_estado == 'pagado' else 1
+            aplicar_delta_saldo(cursor, prestamo['usuario_id'],
+                                total_prestamos=signo * float(prestamo['monto']), prestamos_activos=signo)
         
         conn.commit()
         
@@ -1275,13 +1345,30 @@ def api_actualizar_estado_prestamo(prestamo_id):
     
     finally:
         cursor.close()
-        conn.close()
+
+# Últimos pagos con el saldo que quedó después de cada uno.
+# Solo se leen las N filas más recientes (índice idx_pagos_fecha). Los pagos
+# posteriores a uno de ellos sobre el mismo préstamo también están entre esas
+# N filas, así que saldo_restante = saldo actual del préstamo + pagos
+# posteriores, calculado con una suma de ventana sobre esas filas.
+CONSULTA_ULTIMOS_PAGOS = """
+    SELECT ult.*, u.nombre, u.apellido,
+           p.saldo_pendiente
+             + SUM(ult.monto) OVER (PARTITION BY ult.prestamo_id ORDER BY ult.fecha DESC, ult.id DESC)
+             - ult.monto AS saldo_restante
+    FROM (
+        SELECT * FROM pagos_prestamos ORDER BY fecha DESC, id DESC LIMIT %s
+    ) ult
+    JOIN prestamos p ON ult.prestamo_id = p.id
+    JOIN usuarios u ON p.usuario_id = u.id
+    ORDER BY ult.fecha DESC, ult.id DESC
+"""
 
 @app.route('/admin/pagos_prestamos', methods=['GET', 'POST'])
 @login_required
 @admin_required
 def admin_pagos_prestamos():
-    conn = get_db_connection()
+    conn = get_db()
     if not conn:
         flash('Error al conectar con la base de datos', 'danger')
         return redirect(url_for('admin'))
@@ -1304,17 +1391,15 @@ def admin_pagos_prestamos():
             monto = float(request.form['monto'])
             fecha = request.form.get('fecha')  # opcional, por defecto NOW()
 
-            # Validar que el préstamo pertenece al usuario y está aprobado
-            cursor.execute("SELECT * FROM prestamos WHERE id = %s AND usuario_id = %s AND estado = 'aprobado'", (prestamo_id, usuario_id))
+            # Validar que el préstamo pertenece al usuario y está aprobado.
+            # FOR UPDATE serializa pagos concurrentes sobre el mismo préstamo
+            cursor.execute("SELECT * FROM prestamos WHERE id = %s AND usuario_id = %s AND estado = 'aprobado' FOR UPDATE", (prestamo_id, usuario_id))
             prestamo = cursor.fetchone()
             if not prestamo:
                 flash('Préstamo no encontrado para el ahorrador seleccionado', 'danger')
                 return redirect(url_for('admin_pagos_prestamos'))
 
-            # Calcular saldo pendiente con pagos previos
-            cursor.execute("SELECT COALESCE(SUM(monto), 0) as total_pagado FROM pagos_prestamos WHERE prestamo_id = %s", (prestamo_id,))
-            total_pagado = cursor.fetchone()['total_pagado'] or 0
-            saldo_pendiente = float(prestamo['monto']) - float(total_pagado)
+            saldo_pendiente = float(prestamo['saldo_pendiente'])
 
             # No permitir pagar más del saldo
             if monto > saldo_pendiente:
@@ -1332,32 +1417,31 @@ def admin_pagos_prestamos():
                     "INSERT INTO pagos_prestamos (prestamo_id, monto) VALUES (%s, %s)",
                     (prestamo_id, monto)
                 )
-            conn.commit()
 
-            # Recalcular saldo y actualizar estado si se pagó completo
-            nuevo_total_pagado = total_pagado + monto
-            nuevo_saldo = float(prestamo['monto']) - float(nuevo_total_pagado)
+            # Actualizar los acumulados del préstamo en la misma transacción
+            cursor.execute("""
+                UPDATE prestamos
+                SET total_pagado = total_pagado + %s,
+                    saldo_pendiente = saldo_pendiente - %s,
+                    ultimo_pago_fecha = GREATEST(COALESCE(ultimo_pago_fecha, '1000-01-01'),
+                                                 (SELECT fecha FROM pagos_prestamos WHERE id = %s))
+                WHERE id = %s
+            """, (monto, monto, cursor.lastrowid, prestamo_id))
+
+            # Actualizar estado si se pagó completo
+            nuevo_saldo = saldo_pendiente - monto
             if nuevo_saldo <= 0:
                 cursor.execute("UPDATE prestamos SET estado = 'pagado' WHERE id = %s", (prestamo_id,))
-                conn.commit()
+                aplicar_delta_saldo(cursor, usuario_id, total_prestamos=-float(prestamo['monto']), prestamos_activos=-1)
+            marcar_cuotas_pagadas(cursor, [prestamo_id])
+            conn.commit()
+            flujo_caja.sumar_pago(fecha or datetime.now(), monto)
 
             flash('Pago registrado correctamente', 'success')
             return redirect(url_for('admin_pagos_prestamos'))
 
         # Obtener últimos pagos registrados con datos del usuario
-        cursor.execute(
-            """
-            SELECT pp.*, u.nombre, u.apellido,
-                   (p.monto - COALESCE(SUM(pp2.monto), 0)) AS saldo_restante
-            FROM pagos_prestamos pp
-            JOIN prestamos p ON pp.prestamo_id = p.id
-            JOIN usuarios u ON p.usuario_id = u.id
-            LEFT JOIN pagos_prestamos pp2 ON pp2.prestamo_id = p.id AND pp2.fecha <= pp.fecha
-            GROUP BY pp.id
-            ORDER BY pp.fecha DESC
-            LIMIT 10
-            """
-        )
+        cursor.execute(CONSULTA_ULTIMOS_PAGOS, (10,))
         ultimos_pagos = cursor.fetchall()
 
         return render_template('admin_pagos_prestamos.html', usuarios=usuarios, ultimos_pagos=ultimos_pagos)
@@ -1367,7 +1451,6 @@ def admin_pagos_prestamos():
         return redirect(url_for('admin'))
     finally:
         cursor.close()
-        conn.close()
 
 # (eliminado bloque duplicado de arranque)
 
@@ -1436,16 +1519,16 @@ def crear_admin_inicial():
         cursor.close()
         conn.close()
 
-# Función para procesar archivo CSV de usuarios
-def procesar_csv_usuarios(archivo_csv):
-    """Procesa un archivo CSV con datos de usuarios y retorna lista de usuarios a crear"""
-    usuarios = []
-    errores = []
-    
+# Función para validar archivo CSV de usuarios
+def validar_csv_usuarios(archivo_csv):
+    """
+    Genera (fila_num, usuario, error) por cada fila del archivo CSV, a
+    medida que se lee. error es None o (categoria, mensaje); los errores
+    del archivo completo llevan fila_num None.
+    """
     try:
-        # Leer el archivo CSV
-        stream = io.StringIO(archivo_csv.stream.read().decode("UTF8"), newline=None)
-        csv_reader = csv.DictReader(stream)
+        # Leer el archivo CSV de forma incremental
+        csv_reader = leer_csv(archivo_csv)
         
         # Validar que el CSV tenga las columnas necesarias
         columnas_requeridas = ['nombre', 'apellido', 'email', 'cedula', 'fecha_nacimiento', 'direccion', 'telefono']
@@ -1453,15 +1536,15 @@ def procesar_csv_usuarios(archivo_csv):
         
         for columna in columnas_requeridas:
             if columna not in columnas_csv:
-                errores.append(f"Columna faltante: {columna}")
-                return [], errores
+                yield None, None, ('columna_faltante', f"Columna faltante: {columna}")
+                return
         
         # Procesar cada fila
         for fila_num, fila in enumerate(csv_reader, start=2):  # start=2 porque la fila 1 es el encabezado
             try:
                 # Validar datos básicos
                 if not all(fila.get(campo, '').strip() for campo in ['nombre', 'apellido', 'email', 'cedula']):
-                    errores.append(f"Fila {fila_num}: Datos básicos incompletos")
+                    yield fila_num, None, ('datos_incompletos', "Datos básicos incompletos")
                     continue
                 
                 # Crear usuario con contraseña por defecto CC+cedula
@@ -1477,110 +1560,237 @@ def procesar_csv_usuarios(archivo_csv):
                     'rol': 'ahorrador'
                 }
                 
-                usuarios.append(usuario)
-                
             except Exception as e:
-                errores.append(f"Fila {fila_num}: Error procesando fila - {str(e)}")
+                yield fila_num, None, ('fila_invalida', f"Error procesando fila - {str(e)}")
+                continue
+            
+            yield fila_num, usuario, None
                 
     except Exception as e:
-        errores.append(f"Error leyendo archivo CSV: {str(e)}")
-    
-    return usuarios, errores
+        yield None, None, ('archivo_invalido', f"Error leyendo archivo CSV: {str(e)}")
 
-# Ruta para carga masiva de usuarios
-@app.route('/admin/carga_masiva_usuarios', methods=['GET', 'POST'])
-@login_required
-@admin_required
-def carga_masiva_usuarios():
-    if request.method == 'POST':
-        # Verificar que se haya subido un archivo
-        if 'archivo_csv' not in request.files:
-            flash('No se ha seleccionado ningún archivo', 'danger')
-            return redirect(request.url)
-        
-        archivo = request.files['archivo_csv']
-        if archivo.filename == '':
-            flash('No se ha seleccionado ningún archivo', 'danger')
-            return redirect(request.url)
-        
-        # Procesar el archivo CSV
-        usuarios, errores = procesar_csv_usuarios(archivo)
+# Función para procesar archivo CSV de usuarios
+def procesar_csv_usuarios(archivo_csv, errores):
+    """
+    Genera los usuarios a crear a medida que se lee el archivo CSV.
+    Los errores de validación se agregan a `errores`.
+    """
+    return filas_validas(validar_csv_usuarios(archivo_csv), errores)
+
+# Mensajes de los errores de una carga masiva, indicando cuántos se omitieron
+def mensajes_errores_carga(errores, categoria, maximo=None):
+    mostrados = errores[:maximo]
+    mensajes = [{'categoria': categoria, 'texto': error} for error in mostrados]
+    restantes = errores.total - len(mostrados)
+    if restantes:
+        mensajes.append({'categoria': categoria, 'texto': f'... y {restantes} errores más'})
+    return mensajes
+
+# Carga de usuarios desde un archivo CSV (se ejecuta en segundo plano)
+def cargar_usuarios_csv(archivo, progreso):
+    """
+    Lee, valida e inserta por lotes los usuarios del archivo en una sola
+    transacción. progreso(filas_procesadas, filas_rechazadas) se llama
+    después de cada lote. Retorna el resultado para trabajos_carga.
+    """
+    conn = get_db()
+    if not conn:
+        return {'estado': 'error', 'mensajes': [{'categoria': 'danger', 'texto': 'Error al conectar con la base de datos'}]}
+    
+    cursor = conn.cursor()
+    errores = ErroresCarga()
+    
+    def al_terminar_lote(creados, errores_insercion):
+        rechazadas = errores.total + errores_insercion.total
+        progreso(creados + rechazadas, rechazadas)
+    
+    try:
+        usuarios = procesar_csv_usuarios(archivo, errores)
+        usuarios_creados, errores_insercion = insertar_usuarios(cursor, usuarios, al_terminar_lote=al_terminar_lote)
+        resultado = {
+            'filas_procesadas': usuarios_creados + errores.total + errores_insercion.total,
+            'filas_rechazadas': errores.total + errores_insercion.total,
+        }
         
+        # Si el archivo tiene errores no se guarda ningún usuario
         if errores:
-            for error in errores:
-                flash(error, 'danger')
-            return redirect(request.url)
-        
-        if not usuarios:
-            flash('El archivo CSV no contiene usuarios válidos', 'warning')
-            return redirect(request.url)
-        
-        # Conectar a la base de datos e insertar usuarios
-        conn = get_db_connection()
-        if not conn:
-            flash('Error al conectar con la base de datos', 'danger')
-            return redirect(request.url)
-        
-        cursor = conn.cursor()
-        usuarios_creados = 0
-        errores_insercion = []
+            conn.rollback()
+            return dict(resultado, estado='error', mensajes=mensajes_errores_carga(errores, 'danger'))
         
-        try:
-            for usuario in usuarios:
-                try:
-                    # Verificar si el email o cédula ya existen
-                    cursor.execute("SELECT id FROM usuarios WHERE email = %s OR cedula = %s", 
-                                 (usuario['email'], usuario['cedula']))
-                    if cursor.fetchone():
-                        errores_insercion.append(f"Usuario {usuario['email']} o cédula {usuario['cedula']} ya existe")
-                        continue
-                    
-                    # Insertar usuario
-                    cursor.execute("""
-                        INSERT INTO usuarios (nombre, apellido, email, cedula, fecha_nacimiento, 
-                                           direccion, telefono, password, rol)
-                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-                    """, (usuario['nombre'], usuario['apellido'], usuario['email'], 
-                          usuario['cedula'], usuario['fecha_nacimiento'], usuario['direccion'],
-                          usuario['telefono'], usuario['password'], usuario['rol']))
-                    
-                    usuarios_creados += 1
-                    
-                except Exception as e:
-                    errores_insercion.append(f"Error creando usuario {usuario['email']}: {str(e)}")
-            
-            conn.commit()
-            
-            # Mostrar resultados
-            if usuarios_creados > 0:
-                flash(f'Se crearon exitosamente {usuarios_creados} usuarios', 'success')
-            
-            if errores_insercion:
-                for error in errores_insercion[:10]:  # Mostrar máximo 10 errores
-                    flash(error, 'warning')
-                
-        except Exception as e:
+        if usuarios_creados == 0 and not errores_insercion:
             conn.rollback()
-            flash(f'Error al procesar usuarios: {str(e)}', 'danger')
-        finally:
-            cursor.close()
-            conn.close()
+            return dict(resultado, estado='error', mensajes=[
+                {'categoria': 'warning', 'texto': 'El archivo CSV no contiene usuarios válidos'}])
         
-        return redirect(url_for('carga_masiva_usuarios'))
+        conn.commit()
+        
+        mensajes = []
+        if usuarios_creados > 0:
+            mensajes.append({'categoria': 'success', 'texto': f'Se crearon exitosamente {usuarios_creados} usuarios'})
+        mensajes += mensajes_errores_carga(errores_insercion, 'warning', maximo=10)  # Mostrar máximo 10 errores
+        return dict(resultado, estado='completado', filas_creadas=usuarios_creados, mensajes=mensajes)
     
-    # GET: Mostrar formulario de carga
-    return render_template('admin_carga_masiva.html')
-
-# Función para procesar archivo CSV de ahorros
-def procesar_csv_ahorros(archivo_csv):
-    """Procesa un archivo CSV con datos de ahorros y retorna lista de ahorros a crear"""
-    ahorros = []
-    errores = []
+    except Exception as e:
+        conn.rollback()
+        return {'estado': 'error', 'mensajes': [{'categoria': 'danger', 'texto': f'Error al procesar usuarios: {str(e)}'}]}
+    finally:
+        cursor.close()
+
+# Vista previa de una carga masiva: clasifica cada fila sin escribir en la
+# base y guarda el reporte junto al archivo (ver vista_previa.py)
+def vista_previa_csv(archivo, progreso, entradas):
+    def al_escribir(filas, resumen):
+        progreso(filas, resumen['omitir'] + resumen['error'])
+    
+    resumen = escribir_reporte(ruta_reporte(archivo.name), entradas, al_escribir)
+    mensajes = [{'categoria': 'info', 'texto': f"Se insertarían {resumen['insertar']} filas, "
+                                               f"se omitirían {resumen['omitir']} y {resumen['error']} tienen errores"}]
+    if resumen['error']:
+        mensajes.append({'categoria': 'danger',
+                         'texto': 'Con filas con errores la carga no guarda nada; corrija el archivo antes de confirmar'})
+    return {
+        'estado': 'completado',
+        'filas_procesadas': resumen['insertar'] + resumen['omitir'] + resumen['error'],
+        'filas_rechazadas': resumen['omitir'] + resumen['error'],
+        'resumen': resumen,
+        'mensajes': mensajes,
+    }
+
+def vista_previa_usuarios_csv(archivo, progreso):
+    conn = get_db()
+    if not conn:
+        return {'estado': 'error', 'mensajes': [{'categoria': 'danger', 'texto': 'Error al conectar con la base de datos'}]}
+    cursor = conn.cursor()
+    try:
+        return vista_previa_csv(archivo, progreso, clasificar_usuarios(cursor, validar_csv_usuarios(archivo)))
+    finally:
+        cursor.close()
+
+def vista_previa_ahorros_csv(archivo, progreso):
+    conn = get_db()
+    if not conn:
+        return {'estado': 'error', 'mensajes': [{'categoria': 'danger', 'texto': 'Error al conectar con la base de datos'}]}
+    cursor = conn.cursor(dictionary=True)
+    try:
+        hash_archivo = hash_contenido(archivo)
+        importacion = buscar_importacion(cursor, 'ahorros', hash_archivo)
+        resultado = vista_previa_csv(archivo, progreso, clasificar_ahorros(
+            cursor, validar_csv_ahorros(archivo, cursor, hash_archivo), importacion=importacion))
+        if importacion:
+            resultado['mensajes'].append({'categoria': 'danger', 'texto': mensaje_ya_importado(importacion)})
+        return resultado
+    finally:
+        cursor.close()
+
+# Ejecuta un trabajo registrado en trabajos_carga (en un hilo del ejecutor)
+def ejecutar_trabajo_carga(trabajo_id, tipo, modo, ruta):
+    def registrar(**campos):
+        # Conexión propia, fuera de la transacción de la carga, para que el
+        # progreso sea visible mientras la carga está en curso
+        conn = get_db_connection()
+        if not conn:
+            return
+        try:
+            cursor = conn.cursor()
+            actualizar_trabajo(cursor, trabajo_id, **campos)
+            conn.commit()
+            cursor.close()
+        except Exception as e:
+            print(f"Error actualizando el trabajo {trabajo_id}: {e}")
+        finally:
+            conn.close()
     
+    with app.app_context():
+        g.trabajo_id = trabajo_id
+        registrar(estado='procesando', fecha_inicio=datetime.now())
+        try:
+            with open(ruta, 'rb') as archivo:
+                def progreso(filas_procesadas, filas_rechazadas):
+                    registrar(bytes_leidos=archivo.tell(), filas_procesadas=filas_procesadas,
+                              filas_rechazadas=filas_rechazadas)
+                resultado = FUNCIONES_TRABAJO[(tipo, modo)](archivo, progreso)
+            registrar(fecha_fin=datetime.now(), **resultado)
+        except Exception as e:
+            print(f"Error en el trabajo de carga {trabajo_id}: {e}")
+            registrar(estado='error', fecha_fin=datetime.now(),
+                      mensajes=[{'categoria': 'danger', 'texto': f'Error inesperado: {str(e)}'}])
+        finally:
+            # La vista previa conserva el archivo para poder confirmar la carga
+            if modo == 'cargar':
+                for ruta_borrar in (ruta, ruta_reporte(ruta)):
+                    if os.path.exists(ruta_borrar):
+                        os.remove(ruta_borrar)
+
+# Registra un trabajo sobre un archivo ya guardado y lo entrega al ejecutor.
+# Retorna el id del trabajo o None si no se pudo registrar
+def registrar_trabajo_carga(tipo, modo, ruta, total_bytes):
+    conn = get_db()
+    if not conn:
+        return None
+    cursor = conn.cursor()
     try:
-        # Leer el archivo CSV
-        stream = io.StringIO(archivo_csv.stream.read().decode("UTF8"), newline=None)
-        csv_reader = csv.DictReader(stream)
+        trabajo_id = crear_trabajo(cursor, tipo, session['user_id'], ruta, total_bytes, modo)
+        conn.commit()
+    except Exception as e:
+        print(f"Error registrando el trabajo de carga: {e}")
+        return None
+    finally:
+        cursor.close()
+    ejecutor.submit(ejecutar_trabajo_carga, trabajo_id, tipo, modo, ruta)
+    return trabajo_id
+
+# Guarda el archivo subido y encola su carga o su vista previa
+def encolar_carga(archivo, tipo, modo):
+    ruta, total_bytes = guardar_archivo(archivo)
+    trabajo_id = registrar_trabajo_carga(tipo, modo, ruta, total_bytes)
+    if not trabajo_id:
+        os.remove(ruta)
+    return trabajo_id
+
+# Ruta para carga masiva de usuarios
+@app.route('/admin/carga_masiva_usuarios', methods=['GET', 'POST'])
+@login_required
+@admin_required
+def carga_masiva_usuarios():
+    if request.method == 'POST':
+        # Verificar que se haya subido un archivo
+        if 'archivo_csv' not in request.files:
+            flash('No se ha seleccionado ningún archivo', 'danger')
+            return redirect(request.url)
+        
+        archivo = request.files['archivo_csv']
+        if archivo.filename == '':
+            flash('No se ha seleccionado ningún archivo', 'danger')
+            return redirect(request.url)
+        
+        # El archivo se procesa en segundo plano; la página consulta el progreso.
+        # En modo vista previa sólo se valida y no se escribe nada
+        modo = 'vista_previa' if request.form.get('modo') == 'vista_previa' else 'cargar'
+        trabajo_id = encolar_carga(archivo, 'usuarios', modo)
+        if not trabajo_id:
+            flash('Error al conectar con la base de datos', 'danger')
+            return redirect(request.url)
+        
+        return redirect(url_for('carga_masiva_usuarios', trabajo=trabajo_id))
+    
+    # GET: Mostrar formulario de carga (y el progreso de un trabajo, si se indica)
+    return render_template('admin_carga_masiva.html', trabajo_id=request.args.get('trabajo', type=int))
+
+# Función para validar archivo CSV de ahorros
+def validar_csv_ahorros(archivo_csv, cursor, hash_archivo=None):
+    """
+    Genera (fila_num, ahorro, error) por cada fila del archivo CSV, a
+    medida que se lee. Los emails se resuelven por lotes con consultas
+    IN (...). error es None o (categoria, mensaje); los errores del archivo
+    completo llevan fila_num None. `cursor` debe usar dictionary=True.
+    `hash_archivo` (ver importaciones.clave_fila) se calcula si no se indica.
+    """
+    try:
+        if hash_archivo is None:
+            hash_archivo = hash_contenido(archivo_csv)
+        
+        # Leer el archivo CSV de forma incremental
+        csv_reader = leer_csv(archivo_csv)
         
         # Validar que el CSV tenga las columnas necesarias
         columnas_requeridas = ['email', 'monto', 'fecha']
@@ -1588,75 +1798,158 @@ def procesar_csv_ahorros(archivo_csv):
         
         for columna in columnas_requeridas:
             if columna not in columnas_csv:
-                errores.append(f"Columna faltante: {columna}")
-                return [], errores
-        
-        # Conectar a la base de datos para validar usuarios
-        conn = get_db_connection()
-        if not conn:
-            errores.append("Error al conectar con la base de datos")
-            return [], errores
-        
-        cursor = conn.cursor(dictionary=True)
-        
-        # Procesar cada fila
-        for fila_num, fila in enumerate(csv_reader, start=2):  # start=2 porque la fila 1 es el encabezado
-            try:
-                # Validar datos básicos
-                if not all(fila.get(campo, '').strip() for campo in ['email', 'monto']):
-                    errores.append(f"Fila {fila_num}: Email y monto son obligatorios")
-                    continue
-                
-                # Validar que el usuario exista
-                email = fila['email'].strip().lower()
-                cursor.execute("SELECT id, nombre, apellido FROM usuarios WHERE email = %s", (email,))
-                usuario = cursor.fetchone()
-                
-                if not usuario:
-                    errores.append(f"Fila {fila_num}: Usuario con email {email} no encontrado")
-                    continue
-                
-                # Validar monto
+                yield None, None, ('columna_faltante', f"Columna faltante: {columna}")
+                return
+        
+        filas = enumerate(csv_reader, start=2)  # start=2 porque la fila 1 es el encabezado
+        for lote in en_bloques(filas, TAMANO_LOTE):
+            # Resolver los emails del lote en un diccionario en memoria
+            emails = {(fila.get('email') or '').strip().lower() for _, fila in lote} - {''}
+            usuarios = usuarios_por_email(cursor, emails)
+            
+            for fila_num, fila in lote:
                 try:
-                    monto = float(fila['monto'].strip())
-                    if monto <= 0:
-                        errores.append(f"Fila {fila_num}: El monto debe ser mayor a 0")
+                    # Validar datos básicos
+                    if not all(fila.get(campo, '').strip() for campo in ['email', 'monto']):
+                        yield fila_num, None, ('datos_incompletos', "Email y monto son obligatorios")
                         continue
-                except ValueError:
-                    errores.append(f"Fila {fila_num}: El monto debe ser un número válido")
-                    continue
-                
-                # Validar fecha (opcional, por defecto NOW())
-                fecha = fila['fecha'].strip() if fila.get('fecha', '').strip() else None
-                if fecha:
+                    
+                    # Validar que el usuario exista
+                    email = fila['email'].strip().lower()
+                    usuario = usuarios.get(email)
+                    
+                    if not usuario:
+                        yield fila_num, None, ('email_desconocido', f"Usuario con email {email} no encontrado")
+                        continue
+                    
+                    # Validar monto
                     try:
-                        datetime.strptime(fecha, '%Y-%m-%d')
+                        monto = float(fila['monto'].strip())
+                        if monto <= 0:
+                            yield fila_num, None, ('monto_no_positivo', "El monto debe ser mayor a 0")
+                            continue
                     except ValueError:
-                        errores.append(f"Fila {fila_num}: La fecha debe estar en formato YYYY-MM-DD")
+                        yield fila_num, None, ('monto_invalido', "El monto debe ser un número válido")
                         continue
+                    
+                    # Validar fecha (opcional, por defecto NOW())
+                    fecha = fila['fecha'].strip() if fila.get('fecha', '').strip() else None
+                    if fecha:
+                        try:
+                            datetime.strptime(fecha, '%Y-%m-%d')
+                        except ValueError:
+                            yield fila_num, None, ('fecha_invalida', "La fecha debe estar en formato YYYY-MM-DD")
+                            continue
+                    
+                    # Crear ahorro
+                    ahorro = {
+                        'usuario_id': usuario['id'],
+                        'usuario_nombre': f"{usuario['nombre']} {usuario['apellido']}",
+                        'usuario_email': email,
+                        'monto': monto,
+                        'fecha': fecha,
+                        'validado': False,  # Por defecto, los ahorros masivos no están validados
+                        'fila': fila_num,
+                        'clave_fila': clave_fila(usuario['id'], monto, fecha, fila_num, hash_archivo)
+                    }
+                    
+                except Exception as e:
+                    yield fila_num, None, ('fila_invalida', f"Error procesando fila - {str(e)}")
+                    continue
                 
-                # Crear ahorro
-                ahorro = {
-                    'usuario_id': usuario['id'],
-                    'usuario_nombre': f"{usuario['nombre']} {usuario['apellido']}",
-                    'usuario_email': email,
-                    'monto': monto,
-                    'fecha': fecha,
-                    'validado': False  # Por defecto, los ahorros masivos no están validados
-                }
-                
-                ahorros.append(ahorro)
-                
-            except Exception as e:
-                errores.append(f"Fila {fila_num}: Error procesando fila - {str(e)}")
-        
-        cursor.close()
-        conn.close()
+                yield fila_num, ahorro, None
                 
     except Exception as e:
-        errores.append(f"Error leyendo archivo CSV: {str(e)}")
+        yield None, None, ('archivo_invalido', f"Error leyendo archivo CSV: {str(e)}")
+
+# Función para procesar archivo CSV de ahorros
+def procesar_csv_ahorros(archivo_csv, cursor, errores, hash_archivo=None):
+    """
+    Genera los ahorros a crear a medida que se lee el archivo CSV.
+    Los errores de validación se agregan a `errores`.
+    """
+    return filas_validas(validar_csv_ahorros(archivo_csv, cursor, hash_archivo), errores)
+
+def mensaje_ya_importado(importacion):
+    return (f"Este archivo ya fue importado el {importacion['fecha_importacion']:%Y-%m-%d %H:%M} "
+            f"(importación #{importacion['id']}); no se cargó ningún ahorro")
+
+# Carga de ahorros desde un archivo CSV (se ejecuta en segundo plano)
+def cargar_ahorros_csv(archivo, progreso):
+    """
+    Lee, valida e inserta por lotes los ahorros del archivo en una sola
+    transacción, junto con los deltas de saldos_usuario.
+    progreso(filas_procesadas, filas_rechazadas) se llama después de cada
+    lote. Retorna el resultado para trabajos_carga.
+    """
+    conn = get_db()
+    if not conn:
+        return {'estado': 'error', 'mensajes': [{'categoria': 'danger', 'texto': 'Error al conectar con la base de datos'}]}
     
-    return ahorros, errores
+    cursor = conn.cursor()
+    cursor_usuarios = conn.cursor(dictionary=True)
+    errores = ErroresCarga()
+    
+    def al_terminar_lote(creados, errores_insercion):
+        rechazadas = errores.total + errores_insercion.total
+        progreso(creados + rechazadas, rechazadas)
+    
+    try:
+        # El mismo archivo no se importa dos veces (ver importaciones.py)
+        hash_archivo = hash_contenido(archivo)
+        importacion_id = registrar_importacion(cursor, 'ahorros', hash_archivo, g.get('trabajo_id'))
+        
+        ahorros_creados = None
+        filas_leidas = 0
+        if CARGA_LOAD_DATA:
+            try:
+                # Vía rápida: tabla temporal + validación e inserción con SQL
+                ahorros_creados, errores_insercion, filas_leidas = cargar_ahorros_staging(
+                    cursor, archivo.name, errores, hash_archivo, importacion_id, progreso)
+                deltas_saldo = {}  # cargar_ahorros_staging ya actualizó saldos_usuario
+            except LoadDataNoDisponible:
+                print("LOAD DATA LOCAL INFILE no disponible; se usa la carga por lotes")
+                conn.rollback()
+                importacion_id = registrar_importacion(cursor, 'ahorros', hash_archivo, g.get('trabajo_id'))
+        
+        if ahorros_creados is None:
+            ahorros = procesar_csv_ahorros(archivo, cursor_usuarios, errores, hash_archivo)
+            ahorros_creados, errores_insercion, deltas_saldo = insertar_ahorros(
+                cursor, ahorros, al_terminar_lote=al_terminar_lote, importacion_id=importacion_id)
+        resultado = {
+            'filas_procesadas': max(ahorros_creados + errores.total + errores_insercion.total, filas_leidas),
+            'filas_rechazadas': errores.total + errores_insercion.total,
+        }
+        
+        # Si el archivo tiene errores no se guarda ningún ahorro
+        if errores:
+            conn.rollback()
+            return dict(resultado, estado='error', mensajes=mensajes_errores_carga(errores, 'danger'))
+        
+        if ahorros_creados == 0 and not errores_insercion:
+            conn.rollback()
+            return dict(resultado, estado='error', mensajes=[
+                {'categoria': 'warning', 'texto': 'El archivo CSV no contiene ahorros válidos'}])
+        
+        aplicar_deltas_saldo(cursor, deltas_saldo)
+        finalizar_importacion(cursor, importacion_id, ahorros_creados, errores_insercion.total)
+        conn.commit()
+        
+        mensajes = []
+        if ahorros_creados > 0:
+            mensajes.append({'categoria': 'success', 'texto': f'Se crearon exitosamente {ahorros_creados} ahorros'})
+        mensajes += mensajes_errores_carga(errores_insercion, 'warning', maximo=10)  # Mostrar máximo 10 errores
+        return dict(resultado, estado='completado', filas_creadas=ahorros_creados, mensajes=mensajes)
+    
+    except ArchivoYaImportado as e:
+        conn.rollback()
+        return {'estado': 'error', 'mensajes': [{'categoria': 'danger', 'texto': mensaje_ya_importado(e.importacion)}]}
+    except Exception as e:
+        conn.rollback()
+        return {'estado': 'error', 'mensajes': [{'categoria': 'danger', 'texto': f'Error al procesar ahorros: {str(e)}'}]}
+    finally:
+        cursor_usuarios.close()
+        cursor.close()
 
 # Ruta para carga masiva de ahorros
 @app.route('/admin/carga_masiva_ahorros', methods=['GET', 'POST'])
@@ -1674,69 +1967,571 @@ def carga_masiva_ahorros():
             flash('No se ha seleccionado ningún archivo', 'danger')
             return redirect(request.url)
         
-        # Procesar el archivo CSV
-        ahorros, errores = procesar_csv_ahorros(archivo)
-        
-        if errores:
-            for error in errores:
-                flash(error, 'danger')
-            return redirect(request.url)
-        
-        if not ahorros:
-            flash('El archivo CSV no contiene ahorros válidos', 'warning')
-            return redirect(request.url)
-        
-        # Conectar a la base de datos e insertar ahorros
-        conn = get_db_connection()
-        if not conn:
+        # El archivo se procesa en segundo plano; la página consulta el progreso.
+        # En modo vista previa sólo se valida y no se escribe nada
+        modo = 'vista_previa' if request.form.get('modo') == 'vista_previa' else 'cargar'
+        trabajo_id = encolar_carga(archivo, 'ahorros', modo)
+        if not trabajo_id:
             flash('Error al conectar con la base de datos', 'danger')
             return redirect(request.url)
         
-        cursor = conn.cursor()
-        ahorros_creados = 0
-        errores_insercion = []
+        return redirect(url_for('carga_masiva_ahorros', trabajo=trabajo_id))
+    
+    # GET: Mostrar formulario de carga (y el progreso de un trabajo, si se indica)
+    return render_template('admin_carga_masiva_ahorros.html', trabajo_id=request.args.get('trabajo', type=int))
+
+# Validación de un archivo CSV de pagos de préstamos
+def validar_csv_pagos(archivo_csv, cursor, bloquear=True):
+    """
+    Genera (fila_num, pago, error) por cada fila del archivo CSV, a medida
+    que se lee. Cada fila indica el préstamo por prestamo_id, por cédula
+    (si el ahorrador tiene un solo préstamo aprobado) o por ambos. Los
+    préstamos se consultan por lotes con IN (...) y su saldo se descuenta
+    en memoria, así que los pagos que exceden el saldo se rechazan aunque
+    el préstamo aparezca varias veces en el archivo. Con bloquear=True los
+    préstamos quedan bloqueados hasta el fin de la transacción.
+    """
+    try:
+        csv_reader = leer_csv(archivo_csv)
+        columnas_csv = csv_reader.fieldnames or []
         
-        try:
-            for ahorro in ahorros:
+        if 'monto' not in columnas_csv:
+            yield None, None, ('columna_faltante', "Columna faltante: monto")
+            return
+        if 'prestamo_id' not in columnas_csv and 'cedula' not in columnas_csv:
+            yield None, None, ('columna_faltante', "Columna faltante: prestamo_id o cedula")
+            return
+        
+        prestamos = {}     # id -> préstamo con el saldo restante
+        por_cedula = {}    # cédula -> ids de sus préstamos aprobados
+        filas = enumerate(csv_reader, start=2)  # start=2 porque la fila 1 es el encabezado
+        for lote in en_bloques(filas, TAMANO_LOTE):
+            # Cargar los préstamos del lote que todavía no están en memoria
+            ids = set()
+            cedulas = set()
+            for _, fila in lote:
+                prestamo_id = (fila.get('prestamo_id') or '').strip()
+                cedula = (fila.get('cedula') or '').strip()
+                if prestamo_id.isdigit() and int(prestamo_id) not in prestamos:
+                    ids.add(int(prestamo_id))
+                elif not prestamo_id and cedula and cedula not in por_cedula:
+                    cedulas.add(cedula)
+            for prestamo in prestamos_aprobados(cursor, 'id', ids, bloquear):
+                prestamos[prestamo['id']] = prestamo
+            for cedula in cedulas:
+                por_cedula[cedula] = []
+            for prestamo in prestamos_aprobados(cursor, 'cedula', cedulas, bloquear):
+                prestamos.setdefault(prestamo['id'], prestamo)
+                por_cedula.setdefault(prestamo['cedula'], []).append(prestamo['id'])
+            
+            for fila_num, fila in lote:
                 try:
-                    # Insertar ahorro
-                    if ahorro['fecha']:
-                        cursor.execute("""
-                            INSERT INTO ahorros (usuario_id, monto, fecha, validado) 
-                            VALUES (%s, %s, %s, %s)
-                        """, (ahorro['usuario_id'], ahorro['monto'], ahorro['fecha'], ahorro['validado']))
+                    prestamo_id = (fila.get('prestamo_id') or '').strip()
+                    cedula = (fila.get('cedula') or '').strip()
+                    texto_monto = (fila.get('monto') or '').strip()
+                    
+                    # Validar datos básicos
+                    if not texto_monto or not (prestamo_id or cedula):
+                        yield fila_num, None, ('datos_incompletos', "Monto y prestamo_id o cédula son obligatorios")
+                        continue
+                    
+                    if prestamo_id and not prestamo_id.isdigit():
+                        yield fila_num, None, ('prestamo_invalido', "prestamo_id debe ser un número entero")
+                        continue
+                    
+                    # Validar monto
+                    try:
+                        monto = Decimal(texto_monto)
+                        if not monto.is_finite():
+                            raise InvalidOperation()
+                        # Al centavo, como se guarda en DECIMAL(10, 2), antes de comparar con el saldo
+                        monto = monto.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+                    except InvalidOperation:
+                        yield fila_num, None, ('monto_invalido', "El monto debe ser un número válido")
+                        continue
+                    if monto <= 0:
+                        yield fila_num, None, ('monto_no_positivo', "El monto debe ser mayor a 0")
+                        continue
+                    
+                    # Validar fecha (opcional, por defecto NOW())
+                    fecha = (fila.get('fecha') or '').strip() or None
+                    if fecha:
+                        try:
+                            fecha = datetime.strptime(fecha, '%Y-%m-%d').strftime('%Y-%m-%d')
+                        except ValueError:
+                            yield fila_num, None, ('fecha_invalida', "La fecha debe estar en formato YYYY-MM-DD")
+                            continue
+                    
+                    # Resolver el préstamo
+                    if prestamo_id:
+                        prestamo = prestamos.get(int(prestamo_id))
+                        if not prestamo:
+                            yield fila_num, None, ('prestamo_desconocido',
+                                                   f"Préstamo {prestamo_id} no encontrado o no está aprobado")
+                            continue
+                        if cedula and prestamo['cedula'] != cedula:
+                            yield fila_num, None, ('prestamo_desconocido',
+                                                   f"El préstamo {prestamo_id} no pertenece a la cédula {cedula}")
+                            continue
                     else:
-                        cursor.execute("""
-                            INSERT INTO ahorros (usuario_id, monto, validado) 
-                            VALUES (%s, %s, %s)
-                        """, (ahorro['usuario_id'], ahorro['monto'], ahorro['validado']))
+                        ids_cedula = por_cedula.get(cedula, [])
+                        if not ids_cedula:
+                            yield fila_num, None, ('prestamo_desconocido',
+                                                   f"La cédula {cedula} no tiene préstamos aprobados")
+                            continue
+                        if len(ids_cedula) > 1:
+                            yield fila_num, None, ('prestamo_ambiguo',
+                                                   f"La cédula {cedula} tiene varios préstamos aprobados; indique prestamo_id")
+                            continue
+                        prestamo = prestamos[ids_cedula[0]]
                     
-                    ahorros_creados += 1
+                    # No permitir pagar más del saldo (descontando los pagos anteriores del archivo)
+                    saldo_pendiente = Decimal(str(prestamo['saldo_pendiente']))
+                    if monto > saldo_pendiente:
+                        yield fila_num, None, ('sobrepago',
+                                               f"El pago de {monto} excede el saldo pendiente {saldo_pendiente} "
+                                               f"del préstamo {prestamo['id']}")
+                        continue
+                    prestamo['saldo_pendiente'] = saldo_pendiente - monto
+                    
+                    pago = {
+                        'prestamo_id': prestamo['id'],
+                        'usuario_id': prestamo['usuario_id'],
+                        'cedula': prestamo['cedula'],
+                        'monto': monto,
+                        'fecha': fecha,
+                        'fila': fila_num,
+                        'saldo_restante': prestamo['saldo_pendiente'],
+                    }
                     
                 except Exception as e:
-                    errores_insercion.append(f"Error creando ahorro para {ahorro['usuario_email']}: {str(e)}")
-            
-            conn.commit()
-            
-            # Mostrar resultados
-            if ahorros_creados > 0:
-                flash(f'Se crearon exitosamente {ahorros_creados} ahorros', 'success')
-            
-            if errores_insercion:
-                for error in errores_insercion[:10]:  # Mostrar máximo 10 errores
-                    flash(error, 'warning')
+                    yield fila_num, None, ('fila_invalida', f"Error procesando fila - {str(e)}")
+                    continue
                 
-        except Exception as e:
+                yield fila_num, pago, None
+    
+    except Exception as e:
+        yield None, None, ('archivo_invalido', f"Error leyendo archivo CSV: {str(e)}")
+
+def procesar_csv_pagos(archivo_csv, cursor, errores):
+    """
+    Genera los pagos a registrar a medida que se lee el archivo CSV.
+    Los errores de validación se agregan a `errores`.
+    """
+    return filas_validas(validar_csv_pagos(archivo_csv, cursor), errores)
+
+# Carga de pagos de préstamos desde un archivo CSV (se ejecuta en segundo plano)
+def cargar_pagos_csv(archivo, progreso):
+    """
+    Valida contra los saldos e inserta por lotes los pagos del archivo en
+    una sola transacción. Los préstamos que quedan sin saldo pasan a
+    'pagado' con un solo UPDATE ... WHERE id IN (...), junto con los
+    deltas de saldos_usuario. Retorna el resultado para trabajos_carga.
+    """
+    conn = get_db()
+    if not conn:
+        return {'estado': 'error', 'mensajes': [{'categoria': 'danger', 'texto': 'Error al conectar con la base de datos'}]}
+    
+    cursor = conn.cursor()
+    cursor_prestamos = conn.cursor(dictionary=True)
+    errores = ErroresCarga()
+    
+    def al_terminar_lote(creados, errores_insercion):
+        rechazadas = errores.total + errores_insercion.total
+        progreso(creados + rechazadas, rechazadas)
+    
+    # Préstamos con pagos en el archivo, para actualizar sus cuotas pagadas
+    prestamos_con_pagos = set()
+    
+    def anotar_prestamo(pago):
+        prestamos_con_pagos.add(pago['prestamo_id'])
+        return pago
+    
+    try:
+        pagos = map(anotar_prestamo, procesar_csv_pagos(archivo, cursor_prestamos, errores))
+        pagos_creados, errores_insercion, prestamos_pagados, deltas_saldo = insertar_pagos(
+            cursor, pagos, al_terminar_lote=al_terminar_lote)
+        resultado = {
+            'filas_procesadas': pagos_creados + errores.total + errores_insercion.total,
+            'filas_rechazadas': errores.total + errores_insercion.total,
+        }
+        
+        # Si el archivo tiene errores (incluidos los sobrepagos) no se registra ningún pago
+        if errores:
             conn.rollback()
-            flash(f'Error al procesar ahorros: {str(e)}', 'danger')
-        finally:
-            cursor.close()
-            conn.close()
+            return dict(resultado, estado='error', mensajes=mensajes_errores_carga(errores, 'danger'))
+        
+        if pagos_creados == 0 and not errores_insercion:
+            conn.rollback()
+            return dict(resultado, estado='error', mensajes=[
+                {'categoria': 'warning', 'texto': 'El archivo CSV no contiene pagos válidos'}])
+        
+        aplicar_deltas_saldo(cursor, deltas_saldo)
+        marcar_cuotas_pagadas(cursor, prestamos_con_pagos)
+        conn.commit()
+        flujo_caja.invalidar()
+        
+        mensajes = []
+        if pagos_creados > 0:
+            mensajes.append({'categoria': 'success', 'texto': f'Se registraron exitosamente {pagos_creados} pagos'})
+        if prestamos_pagados > 0:
+            mensajes.append({'categoria': 'info', 'texto': f'{prestamos_pagados} préstamos quedaron pagados'})
+        mensajes += mensajes_errores_carga(errores_insercion, 'warning', maximo=10)  # Mostrar máximo 10 errores
+        return dict(resultado, estado='completado', filas_creadas=pagos_creados, mensajes=mensajes)
+    
+    except Exception as e:
+        conn.rollback()
+        return {'estado': 'error', 'mensajes': [{'categoria': 'danger', 'texto': f'Error al procesar pagos: {str(e)}'}]}
+    finally:
+        cursor_prestamos.close()
+        cursor.close()
+
+def vista_previa_pagos_csv(archivo, progreso):
+    conn = get_db()
+    if not conn:
+        return {'estado': 'error', 'mensajes': [{'categoria': 'danger', 'texto': 'Error al conectar con la base de datos'}]}
+    cursor = conn.cursor(dictionary=True)
+    try:
+        return vista_previa_csv(archivo, progreso, clasificar_pagos(validar_csv_pagos(archivo, cursor, bloquear=False)))
+    finally:
+        cursor.close()
+
+# Ruta para carga masiva de pagos de préstamos (descuentos de nómina)
+@app.route('/admin/carga_masiva_pagos', methods=['GET', 'POST'])
+@login_required
+@admin_required
+def carga_masiva_pagos():
+    if request.method == 'POST':
+        # Verificar que se haya subido un archivo
+        if 'archivo_csv' not in request.files:
+            flash('No se ha seleccionado ningún archivo', 'danger')
+            return redirect(request.url)
         
-        return redirect(url_for('carga_masiva_ahorros'))
+        archivo = request.files['archivo_csv']
+        if archivo.filename == '':
+            flash('No se ha seleccionado ningún archivo', 'danger')
+            return redirect(request.url)
+        
+        # El archivo se procesa en segundo plano; la página consulta el progreso.
+        # En modo vista previa sólo se valida y no se escribe nada
+        modo = 'vista_previa' if request.form.get('modo') == 'vista_previa' else 'cargar'
+        trabajo_id = encolar_carga(archivo, 'pagos', modo)
+        if not trabajo_id:
+            flash('Error al conectar con la base de datos', 'danger')
+            return redirect(request.url)
+        
+        return redirect(url_for('carga_masiva_pagos', trabajo=trabajo_id))
     
-    # GET: Mostrar formulario de carga
-    return render_template('admin_carga_masiva_ahorros.html')
+    # GET: Mostrar formulario de carga (y el progreso de un trabajo, si se indica)
+    return render_template('admin_carga_masiva_pagos.html', trabajo_id=request.args.get('trabajo', type=int))
+
+# Conciliación del extracto bancario (se ejecuta en segundo plano, ver conciliacion.py)
+def conciliar_extracto_csv(archivo, progreso):
+    """
+    Cruza el extracto con los ahorros pendientes y los pagos registrados
+    y guarda el reporte de líneas conciliadas, ambiguas y sin conciliar
+    junto al archivo. No escribe en la base.
+    """
+    conn = get_db()
+    if not conn:
+        return {'estado': 'error', 'mensajes': [{'categoria': 'danger', 'texto': 'Error al conectar con la base de datos'}]}
+    cursor = conn.cursor()
+    try:
+        rango = rango_fechas(archivo)
+        indice = indexar_candidatos(cursor, *rango) if rango else {}
+        
+        def al_escribir(filas, resumen):
+            progreso(filas, filas - resumen['conciliado'])
+        
+        resumen = escribir_reporte(ruta_reporte(archivo.name), conciliar(leer_extracto(archivo), indice),
+                                   al_escribir, resultados=RESULTADOS_CONCILIACION)
+        total = sum(resumen[resultado] for resultado in RESULTADOS_CONCILIACION)
+        return {
+            'estado': 'completado',
+            'filas_procesadas': total,
+            'filas_rechazadas': total - resumen['conciliado'],
+            'resumen': resumen,
+            'mensajes': [{'categoria': 'info',
+                          'texto': f"{resumen['conciliado']} líneas conciliadas, {resumen['ambiguo']} ambiguas, "
+                                   f"{resumen['sin_conciliar']} sin conciliar y {resumen['error']} con errores"}],
+        }
+    finally:
+        cursor.close()
+
+# Ruta para conciliar el extracto bancario
+@app.route('/admin/conciliacion', methods=['GET', 'POST'])
+@login_required
+@admin_required
+def admin_conciliacion():
+    if request.method == 'POST':
+        # Verificar que se haya subido un archivo
+        if 'archivo_csv' not in request.files:
+            flash('No se ha seleccionado ningún archivo', 'danger')
+            return redirect(request.url)
+        
+        archivo = request.files['archivo_csv']
+        if archivo.filename == '':
+            flash('No se ha seleccionado ningún archivo', 'danger')
+            return redirect(request.url)
+        
+        trabajo_id = encolar_carga(archivo, 'conciliacion', 'conciliar')
+        if not trabajo_id:
+            flash('Error al conectar con la base de datos', 'danger')
+            return redirect(request.url)
+        
+        return redirect(url_for('admin_conciliacion', trabajo=trabajo_id))
+    
+    # GET: Mostrar formulario (y el resultado de una conciliación, si se indica)
+    return render_template('admin_conciliacion.html', trabajo_id=request.args.get('trabajo', type=int),
+                           ventana_dias=VENTANA_DIAS)
+
+# Valida en bloque los ahorros pendientes conciliados con el extracto
+@app.route('/admin/conciliacion/<int:trabajo_id>/validar', methods=['POST'])
+@login_required
+@admin_required
+def validar_ahorros_conciliados(trabajo_id):
+    conn = get_db()
+    if not conn:
+        flash('Error al conectar con la base de datos', 'danger')
+        return redirect(url_for('admin_conciliacion'))
+    
+    cursor = conn.cursor(dictionary=True)
+    try:
+        trabajo = obtener_trabajo(cursor, trabajo_id)
+        if not trabajo or trabajo['modo'] != 'conciliar' or trabajo['estado'] != 'completado':
+            flash('Conciliación no encontrada', 'danger')
+            return redirect(url_for('admin_conciliacion'))
+        
+        ruta = ruta_reporte(trabajo['archivo'])
+        if not os.path.exists(ruta):
+            flash('El resultado de la conciliación ya no está disponible; vuelva a subir el extracto', 'warning')
+            return redirect(url_for('admin_conciliacion'))
+        
+        validados, deltas_saldo = validar_ahorros(cursor, ahorros_conciliados(recorrer_reporte(ruta)))
+        aplicar_deltas_saldo(cursor, deltas_saldo)
+        conn.commit()
+        flash(f'Se validaron {validados} ahorros conciliados', 'success')
+    except Exception as e:
+        conn.rollback()
+        print(f"Error validando ahorros conciliados: {e}")
+        flash('Error al validar los ahorros conciliados', 'danger')
+    finally:
+        cursor.close()
+    return redirect(url_for('admin_conciliacion', trabajo=trabajo_id))
+
+# Reporte de mora sobre la última foto diaria (ver mora.py y calcular_mora.py)
+@app.route('/admin/mora')
+@login_required
+@admin_required
+def admin_mora():
+    tramo = request.args.get('tramo')
+    if tramo not in TRAMOS:
+        tramo = None
+    
+    conn = get_db()
+    if not conn:
+        flash('Error al conectar con la base de datos', 'danger')
+        return redirect(url_for('admin'))
+    
+    cursor = conn.cursor(dictionary=True)
+    try:
+        fecha_corte = ultima_fecha_corte(cursor)
+        resumen = resumen_tramos(cursor, fecha_corte) if fecha_corte else []
+        prestamos = prestamos_en_mora(cursor, fecha_corte, tramo) if fecha_corte else []
+        return render_template('admin_mora.html', fecha_corte=fecha_corte, resumen=resumen,
+                               prestamos=prestamos, tramo=tramo)
+    except Exception as e:
+        print(f"Error en admin_mora: {e}")
+        flash('Error al cargar el reporte de mora', 'danger')
+        return redirect(url_for('admin'))
+    finally:
+        cursor.close()
+
+# Recalcula la foto de mora de hoy sin esperar al proceso nocturno
+@app.route('/admin/mora/recalcular', methods=['POST'])
+@login_required
+@admin_required
+def recalcular_mora():
+    conn = get_db()
+    if not conn:
+        flash('Error al conectar con la base de datos', 'danger')
+        return redirect(url_for('admin_mora'))
+    
+    cursor = conn.cursor()
+    try:
+        en_mora = guardar_foto_mora(cursor)
+        conn.commit()
+        flash(f'Mora recalculada: {en_mora} préstamos en mora', 'success')
+    except Exception as e:
+        conn.rollback()
+        print(f"Error recalculando la mora: {e}")
+        flash('Error al recalcular la mora', 'danger')
+    finally:
+        cursor.close()
+    return redirect(url_for('admin_mora'))
+
+# Función que ejecuta cada trabajo según (tipo, modo)
+FUNCIONES_TRABAJO = {
+    ('usuarios', 'cargar'): cargar_usuarios_csv,
+    ('usuarios', 'vista_previa'): vista_previa_usuarios_csv,
+    ('ahorros', 'cargar'): cargar_ahorros_csv,
+    ('ahorros', 'vista_previa'): vista_previa_ahorros_csv,
+    ('pagos', 'cargar'): cargar_pagos_csv,
+    ('pagos', 'vista_previa'): vista_previa_pagos_csv,
+    ('conciliacion', 'conciliar'): conciliar_extracto_csv,
+}
+
+# Página de cada tipo de carga
+VISTAS_CARGA = {
+    'usuarios': 'carga_masiva_usuarios',
+    'ahorros': 'carga_masiva_ahorros',
+    'pagos': 'carga_masiva_pagos',
+    'conciliacion': 'admin_conciliacion',
+}
+
+# Modos de trabajo que dejan un reporte paginable en /admin/jobs/<id>/reporte
+MODOS_CON_REPORTE = ('vista_previa', 'conciliar')
+
+# Progreso de un trabajo de carga masiva
+@app.route('/admin/jobs/<int:trabajo_id>')
+@login_required
+@admin_required
+def api_trabajo_carga(trabajo_id):
+    """Retorna filas procesadas, rechazadas, porcentaje y tiempo restante estimado"""
+    conn = get_db()
+    if not conn:
+        return jsonify({'error': 'Error de conexión a la base de datos'}), 500
+    cursor = conn.cursor(dictionary=True)
+    trabajo = obtener_trabajo(cursor, trabajo_id)
+    cursor.close()
+    if not trabajo:
+        return jsonify({'error': 'Trabajo no encontrado'}), 404
+    return jsonify(trabajo_a_json(trabajo))
+
+# Reporte paginado de una vista previa de carga masiva o de una conciliación
+@app.route('/admin/jobs/<int:trabajo_id>/reporte')
+@login_required
+@admin_required
+def api_reporte_trabajo(trabajo_id):
+    """
+    Filas clasificadas por el trabajo. Filtros opcionales:
+    ?resultado=insertar|omitir|error (o los de la conciliación),
+    ?categoria=..., ?pagina=N
+    """
+    conn = get_db()
+    if not conn:
+        return jsonify({'error': 'Error de conexión a la base de datos'}), 500
+    cursor = conn.cursor(dictionary=True)
+    trabajo = obtener_trabajo(cursor, trabajo_id)
+    cursor.close()
+    if not trabajo or trabajo['modo'] not in MODOS_CON_REPORTE:
+        return jsonify({'error': 'Reporte no encontrado'}), 404
+    
+    pagina = max(request.args.get('pagina', 1, type=int), 1)
+    entradas, total = leer_reporte(ruta_reporte(trabajo['archivo']),
+                                   resultado=request.args.get('resultado') or None,
+                                   categoria=request.args.get('categoria') or None,
+                                   pagina=pagina)
+    if entradas is None:
+        return jsonify({'error': 'El reporte ya no está disponible'}), 404
+    return jsonify({
+        'entradas': entradas,
+        'total': total,
+        'pagina': pagina,
+        'paginas': max((total + TAMANO_PAGINA_REPORTE - 1) // TAMANO_PAGINA_REPORTE, 1),
+        'resumen': json.loads(trabajo['resumen']) if trabajo['resumen'] else None,
+    })
+
+# Confirma una vista previa: carga el mismo archivo sin volver a subirlo
+@app.route('/admin/jobs/<int:trabajo_id>/confirmar', methods=['POST'])
+@login_required
+@admin_required
+def confirmar_vista_previa(trabajo_id):
+    conn = get_db()
+    if not conn:
+        flash('Error al conectar con la base de datos', 'danger')
+        return redirect(url_for('admin'))
+    cursor = conn.cursor(dictionary=True)
+    trabajo = obtener_trabajo(cursor, trabajo_id)
+    cursor.close()
+    if not trabajo or trabajo['modo'] != 'vista_previa':
+        flash('Vista previa no encontrada', 'danger')
+        return redirect(url_for('admin'))
+    
+    vista = VISTAS_CARGA[trabajo['tipo']]
+    if trabajo['confirmado_por']:
+        flash('Esta vista previa ya fue confirmada', 'warning')
+        return redirect(url_for(vista, trabajo=trabajo['confirmado_por']))
+    if trabajo['estado'] != 'completado' or not os.path.exists(trabajo['archivo']):
+        flash('El archivo de la vista previa ya no está disponible; vuelva a subirlo', 'warning')
+        return redirect(url_for(vista))
+    # Con errores la carga no guardaría nada (ver cargar_*_csv)
+    if json.loads(trabajo['resumen'] or '{}').get('error'):
+        flash('La vista previa tiene filas con errores; corrija el archivo y vuelva a subirlo', 'danger')
+        return redirect(url_for(vista, trabajo=trabajo_id))
+    
+    # La carga se registra y la vista previa se marca como confirmada en la
+    # misma transacción: una segunda confirmación no encola otra carga del
+    # mismo archivo
+    cursor = conn.cursor()
+    try:
+        nuevo_id = crear_trabajo(cursor, trabajo['tipo'], session['user_id'], trabajo['archivo'],
+                                 trabajo['total_bytes'], 'cargar')
+        if not marcar_vista_previa_confirmada(cursor, trabajo_id, nuevo_id):
+            conn.rollback()
+            flash('Esta vista previa ya fue confirmada', 'warning')
+            return redirect(url_for(vista))
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        print(f"Error confirmando la vista previa {trabajo_id}: {e}")
+        flash('Error al registrar la carga', 'danger')
+        return redirect(url_for(vista))
+    finally:
+        cursor.close()
+    ejecutor.submit(ejecutar_trabajo_carga, nuevo_id, trabajo['tipo'], 'cargar', trabajo['archivo'])
+    return redirect(url_for(vista, trabajo=nuevo_id))
+
+# Exportación de ahorros, préstamos o pagos (ver exportaciones.py)
+@app.route('/admin/exportar/<tipo>')
+@login_required
+@admin_required
+def exportar(tipo):
+    """
+    Descarga en streaming. Parámetros opcionales: ?formato=csv|ndjson,
+    ?desde=YYYY-MM-DD, ?hasta=YYYY-MM-DD, ?usuario_id=N y ?gzip=1
+    """
+    formato = request.args.get('formato', 'csv')
+    if tipo not in EXPORTACIONES or formato not in FORMATOS:
+        flash('Exportación no válida', 'danger')
+        return redirect(url_for('admin'))
+    
+    filtros = {'usuario_id': request.args.get('usuario_id', type=int)}
+    for parametro in ('desde', 'hasta'):
+        valor = request.args.get(parametro)
+        if valor:
+            try:
+                filtros[parametro] = datetime.strptime(valor, '%Y-%m-%d').date()
+            except ValueError:
+                flash('Las fechas deben estar en formato YYYY-MM-DD', 'danger')
+                return redirect(url_for('admin'))
+    comprimir = request.args.get('gzip') == '1'
+    
+    conn = get_db()
+    if not conn:
+        flash('Error al conectar con la base de datos', 'danger')
+        return redirect(url_for('admin'))
+    
+    fragmentos = generar_exportacion(conn, tipo, formato, **filtros)
+    
+    nombre = f"sparfonds_{tipo}_{datetime.now():%Y%m%d}.{formato}"
+    if comprimir:
+        nombre += '.gz'
+    return app.response_class(
+        stream_with_context(codificar(fragmentos, comprimir)),
+        mimetype='application/gzip' if comprimir else FORMATOS[formato],
+        headers={'Content-Disposition': f'attachment; filename={nombre}'}
+    )
 
 # Ruta para descargar archivo CSV de ejemplo de ahorros
 @app.route('/admin/descargar_ejemplo_csv_ahorros')
@@ -1769,6 +2564,37 @@ def descargar_ejemplo_csv_ahorros():
     
     return response
 
+# Ruta para descargar archivo CSV de ejemplo de pagos de préstamos
+@app.route('/admin/descargar_ejemplo_csv_pagos')
+@login_required
+@admin_required
+def descargar_ejemplo_csv_pagos():
+    """Genera y descarga un archivo CSV de ejemplo para la carga masiva de pagos de préstamos"""
+    # Crear el contenido del CSV de ejemplo
+    output = io.StringIO()
+    writer = csv.writer(output)
+    
+    # Escribir encabezados
+    writer.writerow(['prestamo_id', 'cedula', 'monto', 'fecha'])
+    
+    # Escribir filas de ejemplo (préstamo por número, por cédula o por ambos)
+    writer.writerow(['12', '', '250000', '2024-01-31'])
+    writer.writerow(['', '12345678', '180000', '2024-01-31'])
+    writer.writerow(['15', '87654321', '300000', '2024-01-31'])
+    
+    # Preparar la respuesta para descarga
+    output.seek(0)
+    response = app.response_class(
+        output.getvalue(),
+        mimetype='text/csv',
+        headers={
+            'Content-Disposition': 'attachment; filename=ejemplo_pagos_prestamos.csv',
+            'Content-Type': 'text/csv; charset=utf-8'
+        }
+    )
+    
+    return response
+
 # Ruta para descargar archivo CSV de ejemplo
 @app.route('/admin/descargar_ejemplo_csv')
 @login_required
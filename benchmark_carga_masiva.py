@@ -0,0 +1,111 @@
+# Benchmark de la carga masiva de usuarios (/admin/carga_masiva_usuarios)
+#
+# Crea una base de datos aparte (BENCH_DB_NAME, por defecto sparfonds_bench)
+# y mide, para archivos de distintos tamaños, la carga fila por fila anterior
+# (SELECT de verificación + INSERT por fila) contra insertar_usuarios()
+# (bloques IN + INSERT de varias filas). El 10% de las filas de cada archivo
+# ya existe en la tabla, para ejercitar también el reporte de duplicados.
+# Uso:
+#   python benchmark_carga_masiva.py [tamaños...]
+#   python benchmark_carga_masiva.py 1000 10000 100000
+import os
+import sys
+import time
+
+import mysql.connector
+
+# Añadir el directorio actual al path para poder importar desde app.py
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import db_config, hash_password
+from carga_masiva import insertar_usuarios, INSERTAR_USUARIO, COLUMNAS_USUARIO
+
+BENCH_DB = os.getenv('BENCH_DB_NAME', 'sparfonds_bench')
+PROPORCION_EXISTENTES = 10
+
+def preparar_tabla(cursor):
+    cursor.execute("DROP TABLE IF EXISTS usuarios")
+    cursor.execute("""
+        CREATE TABLE usuarios (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            nombre VARCHAR(100) NOT NULL,
+            apellido VARCHAR(100) NOT NULL,
+            email VARCHAR(100) UNIQUE NOT NULL,
+            cedula VARCHAR(20) UNIQUE NOT NULL,
+            fecha_nacimiento DATE,
+            direccion VARCHAR(255),
+            telefono VARCHAR(20),
+            password VARCHAR(255) NOT NULL,
+            rol ENUM('admin', 'ahorrador') DEFAULT 'ahorrador',
+            fecha_registro TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+def generar_usuarios(tamano):
+    return [{
+        'nombre': f"Nombre{i}",
+        'apellido': f"Apellido{i}",
+        'email': f"usuario{i}@bench.com",
+        'cedula': str(10000000 + i),
+        'fecha_nacimiento': '1990-01-01',
+        'direccion': f"Calle {i}",
+        'telefono': '3000000000',
+        'password': hash_password(f"CC{10000000 + i}"),
+        'rol': 'ahorrador',
+    } for i in range(tamano)]
+
+def precargar_existentes(conn, cursor, usuarios):
+    existentes = usuarios[::PROPORCION_EXISTENTES]
+    cursor.executemany(INSERTAR_USUARIO,
+                       [tuple(u[columna] for columna in COLUMNAS_USUARIO) for u in existentes])
+    conn.commit()
+
+def carga_anterior(cursor, usuarios):
+    """Carga fila por fila, como la hacía carga_masiva_usuarios()"""
+    creados = 0
+    errores = []
+    for usuario in usuarios:
+        try:
+            cursor.execute("SELECT id FROM usuarios WHERE email = %s OR cedula = %s",
+                           (usuario['email'], usuario['cedula']))
+            if cursor.fetchone():
+                errores.append(f"Usuario {usuario['email']} o cédula {usuario['cedula']} ya existe")
+                continue
+            cursor.execute(INSERTAR_USUARIO, tuple(usuario[columna] for columna in COLUMNAS_USUARIO))
+            creados += 1
+        except Exception as e:
+            errores.append(f"Error creando usuario {usuario['email']}: {str(e)}")
+    return creados, errores
+
+def medir(conn, cursor, funcion, usuarios):
+    preparar_tabla(cursor)
+    precargar_existentes(conn, cursor, usuarios)
+    inicio = time.perf_counter()
+    creados, errores = funcion(cursor, usuarios)
+    conn.commit()
+    return time.perf_counter() - inicio, creados, len(errores)
+
+def main(tamanos):
+    config = {k: v for k, v in db_config.items() if k != 'database'}
+    conn = mysql.connector.connect(**config)
+    cursor = conn.cursor()
+    cursor.execute(f"DROP DATABASE IF EXISTS {BENCH_DB}")
+    cursor.execute(f"CREATE DATABASE {BENCH_DB}")
+    cursor.execute(f"USE {BENCH_DB}")
+
+    print(f"{'filas':>8} | {'fila por fila (s)':>17} | {'por lotes (s)':>13} | {'creados':>8} | {'duplicados':>10}")
+    for tamano in sorted(tamanos):
+        usuarios = generar_usuarios(tamano)
+        anterior, creados_anterior, errores_anterior = medir(conn, cursor, carga_anterior, usuarios)
+        lotes, creados, errores = medir(conn, cursor, insertar_usuarios, usuarios)
+        # Ambas cargas deben producir el mismo resultado
+        assert (creados, errores) == (creados_anterior, errores_anterior)
+        print(f"{tamano:>8} | {anterior:17.2f} | {lotes:13.2f} | {creados:>8} | {errores:>10}")
+
+    cursor.execute(f"DROP DATABASE {BENCH_DB}")
+    cursor.close()
+    conn.close()
+
+if __name__ == "__main__":
+    tamanos = [int(t) for t in sys.argv[1:]] or [1000, 10000, 100000]
+    main(tamanos)
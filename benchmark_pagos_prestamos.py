@@ -0,0 +1,126 @@
+# Benchmark de la consulta "últimos pagos" de /admin/pagos_prestamos
+#
+# Crea una base de datos aparte (BENCH_DB_NAME, por defecto sparfonds_bench),
+# la llena con pagos sintéticos en tamaños crecientes y mide la consulta
+# actual (ventana sobre las últimas filas) contra el self-join anterior.
+# Uso:
+#   python benchmark_pagos_prestamos.py [tamaños...]
+#   python benchmark_pagos_prestamos.py 10000 100000 1000000
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+import mysql.connector
+
+# Añadir el directorio actual al path para poder importar desde app.py
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import db_config, CONSULTA_ULTIMOS_PAGOS
+
+BENCH_DB = os.getenv('BENCH_DB_NAME', 'sparfonds_bench')
+NUM_PRESTAMOS = 2000
+LOTE = 5000
+REPETICIONES = 5
+# El self-join anterior es cuadrático; por encima de este tamaño no se mide
+LIMITE_CONSULTA_ANTERIOR = 100000
+
+CONSULTA_ANTERIOR = """
+    SELECT pp.*, u.nombre, u.apellido,
+           (p.monto - COALESCE(SUM(pp2.monto), 0)) AS saldo_restante
+    FROM pagos_prestamos pp
+    JOIN prestamos p ON pp.prestamo_id = p.id
+    JOIN usuarios u ON p.usuario_id = u.id
+    LEFT JOIN pagos_prestamos pp2 ON pp2.prestamo_id = p.id AND pp2.fecha <= pp.fecha
+    GROUP BY pp.id
+    ORDER BY pp.fecha DESC
+    LIMIT 10
+"""
+
+def preparar_base(cursor):
+    cursor.execute(f"DROP DATABASE IF EXISTS {BENCH_DB}")
+    cursor.execute(f"CREATE DATABASE {BENCH_DB}")
+    cursor.execute(f"USE {BENCH_DB}")
+    cursor.execute("""
+        CREATE TABLE usuarios (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            nombre VARCHAR(100) NOT NULL,
+            apellido VARCHAR(100) NOT NULL
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE prestamos (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            usuario_id INT NOT NULL,
+            monto DECIMAL(14, 2) NOT NULL,
+            saldo_pendiente DECIMAL(14, 2) NOT NULL,
+            FOREIGN KEY (usuario_id) REFERENCES usuarios(id)
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE pagos_prestamos (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            prestamo_id INT NOT NULL,
+            monto DECIMAL(10, 2) NOT NULL,
+            fecha DATETIME DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (prestamo_id) REFERENCES prestamos(id),
+            INDEX idx_pagos_fecha (fecha)
+        )
+    """)
+    cursor.executemany("INSERT INTO usuarios (nombre, apellido) VALUES (%s, %s)",
+                       [(f"Nombre{i}", f"Apellido{i}") for i in range(NUM_PRESTAMOS)])
+    cursor.executemany("INSERT INTO prestamos (usuario_id, monto, saldo_pendiente) VALUES (%s, %s, %s)",
+                       [(i + 1, 10000000, 10000000) for i in range(NUM_PRESTAMOS)])
+
+def crecer_pagos(conn, cursor, desde, hasta):
+    inicio = datetime(2020, 1, 1)
+    for base in range(desde, hasta, LOTE):
+        filas = [(random.randint(1, NUM_PRESTAMOS), 100, inicio + timedelta(minutes=n))
+                 for n in range(base, min(base + LOTE, hasta))]
+        cursor.executemany("INSERT INTO pagos_prestamos (prestamo_id, monto, fecha) VALUES (%s, %s, %s)", filas)
+    # Mantener saldo_pendiente consistente, como lo hace admin_pagos_prestamos()
+    cursor.execute("""
+        UPDATE prestamos p
+        JOIN (SELECT prestamo_id, SUM(monto) AS total FROM pagos_prestamos GROUP BY prestamo_id) pp
+          ON pp.prestamo_id = p.id
+        SET p.saldo_pendiente = p.monto - pp.total
+    """)
+    conn.commit()
+    cursor.execute("ANALYZE TABLE pagos_prestamos")
+    cursor.fetchall()
+
+def medir(cursor, consulta, parametros=()):
+    tiempos = []
+    for _ in range(REPETICIONES):
+        inicio = time.perf_counter()
+        cursor.execute(consulta, parametros)
+        cursor.fetchall()
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    return statistics.median(tiempos)
+
+def main(tamanos):
+    config = {k: v for k, v in db_config.items() if k != 'database'}
+    conn = mysql.connector.connect(**config)
+    cursor = conn.cursor()
+    preparar_base(cursor)
+    conn.commit()
+
+    print(f"{'pagos':>10} | {'ventana (ms)':>12} | {'self-join (ms)':>14}")
+    actual = 0
+    for tamano in sorted(tamanos):
+        crecer_pagos(conn, cursor, actual, tamano)
+        actual = tamano
+        ventana = medir(cursor, CONSULTA_ULTIMOS_PAGOS, (10,))
+        anterior = medir(cursor, CONSULTA_ANTERIOR) if tamano <= LIMITE_CONSULTA_ANTERIOR else None
+        anterior_texto = f"{anterior:14.1f}" if anterior is not None else f"{'(omitido)':>14}"
+        print(f"{tamano:>10} | {ventana:12.1f} | {anterior_texto}")
+
+    cursor.execute(f"DROP DATABASE {BENCH_DB}")
+    cursor.close()
+    conn.close()
+
+if __name__ == "__main__":
+    tamanos = [int(t) for t in sys.argv[1:]] or [10000, 100000, 1000000]
+    main(tamanos)
@@ -0,0 +1,84 @@
+# Cachés en memoria para la aplicación SparFonds
+import threading
+import time
+from collections import OrderedDict
+
+
+class CacheTTL:
+    """
+    Caché clave → valor donde cada entrada expira tras `ttl` segundos.
+    Es segura entre hilos; cada proceso del servidor mantiene su propia copia.
+    """
+
+    def __init__(self, ttl=60):
+        self.ttl = ttl
+        self._datos = {}
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+
+    def obtener(self, clave, por_defecto=None):
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada is not None:
+                valor, expira = entrada
+                if expira > time.monotonic():
+                    self.aciertos += 1
+                    return valor
+                del self._datos[clave]
+            self.fallos += 1
+            return por_defecto
+
+    def guardar(self, clave, valor):
+        with self._lock:
+            self._datos[clave] = (valor, time.monotonic() + self.ttl)
+
+    def invalidar(self, clave):
+        with self._lock:
+            self._datos.pop(clave, None)
+
+    def limpiar(self):
+        with self._lock:
+            self._datos.clear()
+
+
+class CacheLRU:
+    """
+    Caché clave → valor con a lo sumo `capacidad` entradas; al llenarse
+    descarta la usada hace más tiempo. Es segura entre hilos; cada proceso
+    del servidor mantiene su propia copia.
+    """
+
+    def __init__(self, capacidad=1024):
+        self.capacidad = capacidad
+        self._datos = OrderedDict()
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+
+    def obtener(self, clave, por_defecto=None):
+        with self._lock:
+            if clave in self._datos:
+                self._datos.move_to_end(clave)
+                self.aciertos += 1
+                return self._datos[clave]
+            self.fallos += 1
+            return por_defecto
+
+    def guardar(self, clave, valor):
+        with self._lock:
+            self._datos[clave] = valor
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.capacidad:
+                self._datos.popitem(last=False)
+
+    def invalidar(self, clave):
+        with self._lock:
+            self._datos.pop(clave, None)
+
+    def limpiar(self):
+        with self._lock:
+            self._datos.clear()
+
+    def __len__(self):
+        return len(self._datos)
@@ -0,0 +1,46 @@
+# Script para guardar la foto diaria de mora de los préstamos (ver mora.py)
+# Pensado para ejecutarse cada noche, por ejemplo con cron:
+#   15 0 * * * cd /ruta/a/sparfonds && python calcular_mora.py
+# Uso:
+#   python calcular_mora.py                 Foto con fecha de corte de hoy
+#   python calcular_mora.py 2024-03-31      Foto con otra fecha de corte
+import sys
+import os
+from datetime import datetime
+
+# Añadir el directorio actual al path para poder importar desde app.py
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import get_db_connection
+from mora import guardar_foto_mora
+
+def ejecutar(fecha_corte=None):
+    conn = get_db_connection()
+    if not conn:
+        print("Error: No se pudo conectar a la base de datos.")
+        return False
+    
+    cursor = conn.cursor()
+    try:
+        en_mora = guardar_foto_mora(cursor, fecha_corte)
+        conn.commit()
+        print(f"✓ Foto de mora guardada: {en_mora} préstamos en mora")
+        return True
+    except Exception as e:
+        conn.rollback()
+        print(f"Error calculando la mora: {e}")
+        return False
+    finally:
+        cursor.close()
+        conn.close()
+
+if __name__ == "__main__":
+    fecha_corte = None
+    if len(sys.argv) > 1:
+        try:
+            fecha_corte = datetime.strptime(sys.argv[1], '%Y-%m-%d').date()
+        except ValueError:
+            print("Error: la fecha de corte debe estar en formato YYYY-MM-DD")
+            sys.exit(1)
+    if not ejecutar(fecha_corte):
+        sys.exit(1)
@@ -0,0 +1,586 @@
+# Lectura en streaming e inserción por lotes para las cargas masivas desde CSV
+#
+# El archivo subido se decodifica de forma incremental y las filas válidas
+# se consumen en lotes de tamaño fijo: para cada lote los duplicados se
+# buscan con consultas IN (...) y las filas nuevas se insertan con
+# executemany, que mysql-connector convierte en un INSERT de varias filas.
+# La memoria usada depende del tamaño del lote, no del archivo. Todo ocurre
+# en la transacción del llamador.
+import codecs
+import csv
+import os
+import tempfile
+from itertools import islice
+
+from flask import Request
+
+from importaciones import CLAVE_FILA_SQL
+from saldos import delta_ahorro
+
+# Filas por INSERT de varias filas
+TAMANO_LOTE = int(os.getenv('CARGA_MASIVA_LOTE', '1000'))
+# Valores por consulta IN (...)
+TAMANO_BLOQUE_IN = 1000
+# Archivos subidos más grandes que esto se guardan en disco y no en memoria
+UMBRAL_SPOOL = int(os.getenv('CARGA_SPOOL_UMBRAL', str(1024 * 1024)))
+# Mensajes de error que se conservan por carga; del resto sólo se cuentan
+# (se muestran con flash y deben caber en la cookie de sesión)
+MAX_ERRORES = 20
+
+COLUMNAS_USUARIO = ('nombre', 'apellido', 'email', 'cedula', 'fecha_nacimiento',
+                    'direccion', 'telefono', 'password', 'rol')
+
+INSERTAR_USUARIO = f'''
+    INSERT INTO usuarios ({', '.join(COLUMNAS_USUARIO)})
+    VALUES ({', '.join(['%s'] * len(COLUMNAS_USUARIO))})
+'''
+
+
+class RequestConSpool(Request):
+    """Request que guarda los archivos subidos en disco por encima de UMBRAL_SPOOL bytes"""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return tempfile.SpooledTemporaryFile(max_size=UMBRAL_SPOOL, mode='rb+')
+
+
+class ErroresCarga(list):
+    """Lista de mensajes de error que conserva los primeros `maximo` y cuenta el resto"""
+
+    def __init__(self, maximo=MAX_ERRORES):
+        super().__init__()
+        self.maximo = maximo
+        self.omitidos = 0
+
+    def append(self, mensaje):
+        if len(self) < self.maximo:
+            super().append(mensaje)
+        else:
+            self.omitidos += 1
+
+    def extend(self, mensajes):
+        for mensaje in mensajes:
+            self.append(mensaje)
+
+    @property
+    def total(self):
+        return len(self) + self.omitidos
+
+
+def leer_csv(archivo):
+    """DictReader sobre un archivo binario, decodificado a medida que se lee"""
+    archivo.seek(0)
+    # iterdecode usa un decodificador incremental línea por línea y, a
+    # diferencia de TextIOWrapper, no cierra el archivo al terminar
+    return csv.DictReader(codecs.iterdecode(archivo, 'utf-8'))
+
+
+def en_bloques(valores, tamano):
+    """Agrupa cualquier iterable en listas de como máximo `tamano` elementos"""
+    iterador = iter(valores)
+    while True:
+        bloque = list(islice(iterador, tamano))
+        if not bloque:
+            return
+        yield bloque
+
+
+def filas_validas(resultados, errores):
+    """
+    Filtra los resultados (fila_num, registro, error) de la validación de un
+    CSV: genera los registros válidos y agrega a `errores` el mensaje de cada
+    fila rechazada. Con un error la carga no guarda nada, así que desde el
+    primero no se generan más registros; el resto del archivo sólo se valida
+    para informar todos los errores.
+    """
+    for fila_num, registro, error in resultados:
+        if error:
+            _, mensaje = error
+            errores.append(f"Fila {fila_num}: {mensaje}" if fila_num else mensaje)
+        elif not errores.total:
+            yield registro
+
+
+def valores_existentes(cursor, tabla, columna, valores, tamano=TAMANO_BLOQUE_IN):
+    """
+    Retorna el subconjunto de `valores` que ya existe en tabla.columna,
+    en minúsculas (las comparaciones de MySQL no distinguen mayúsculas)
+    """
+    existentes = set()
+    for bloque in en_bloques(sorted(set(valores)), tamano):
+        marcadores = ', '.join(['%s'] * len(bloque))
+        cursor.execute(f"SELECT {columna} FROM {tabla} WHERE {columna} IN ({marcadores})", tuple(bloque))
+        for fila in cursor.fetchall():
+            valor = fila[columna] if isinstance(fila, dict) else fila[0]
+            existentes.add(str(valor).lower())
+    return existentes
+
+
+def _insertar_lote(cursor, consulta, elementos, a_fila, descripcion_error):
+    """
+    Inserta un lote con un solo INSERT de varias filas. Si el lote falla,
+    MySQL revierte sólo esa sentencia y se reintenta fila por fila para
+    reportar el error de cada una. Retorna (elementos_insertados, errores).
+    """
+    if not elementos:
+        return [], []
+    try:
+        cursor.executemany(consulta, [a_fila(elemento) for elemento in elementos])
+        return elementos, []
+    except Exception:
+        insertados = []
+        errores = []
+        for elemento in elementos:
+            try:
+                cursor.execute(consulta, a_fila(elemento))
+                insertados.append(elemento)
+            except Exception as e:
+                errores.append(f"{descripcion_error(elemento)}: {str(e)}")
+        return insertados, errores
+
+
+def insertar_usuarios(cursor, usuarios, tamano_lote=TAMANO_LOTE, al_terminar_lote=None):
+    """
+    Inserta por lotes los usuarios (cualquier iterable) que no existen
+    todavía por email o cédula. Retorna (usuarios_creados, errores) con los
+    mismos mensajes por fila que la carga fila por fila: los repetidos
+    dentro del mismo archivo se reportan como existentes a partir de su
+    segunda aparición, porque la transacción ve los lotes ya insertados.
+    al_terminar_lote(creados, errores) se llama después de cada lote.
+    """
+    creados = 0
+    errores = ErroresCarga()
+    for lote in en_bloques(usuarios, tamano_lote):
+        emails = valores_existentes(cursor, 'usuarios', 'email', [u['email'] for u in lote])
+        cedulas = valores_existentes(cursor, 'usuarios', 'cedula', [u['cedula'] for u in lote])
+
+        nuevos = []
+        for usuario in lote:
+            email = usuario['email'].lower()
+            cedula = usuario['cedula'].lower()
+            if email in emails or cedula in cedulas:
+                errores.append(f"Usuario {usuario['email']} o cédula {usuario['cedula']} ya existe")
+                continue
+            emails.add(email)
+            cedulas.add(cedula)
+            nuevos.append(usuario)
+
+        insertados, errores_lote = _insertar_lote(
+            cursor, INSERTAR_USUARIO, nuevos,
+            lambda usuario: tuple(usuario[columna] for columna in COLUMNAS_USUARIO),
+            lambda usuario: f"Error creando usuario {usuario['email']}"
+        )
+        creados += len(insertados)
+        errores.extend(errores_lote)
+        if al_terminar_lote:
+            al_terminar_lote(creados, errores)
+    return creados, errores
+
+
+def usuarios_por_email(cursor, emails, tamano=TAMANO_BLOQUE_IN):
+    """
+    Resuelve una colección de emails con consultas IN (...) por bloques.
+    Retorna un diccionario email en minúsculas -> {id, nombre, apellido}.
+    """
+    usuarios = {}
+    for bloque in en_bloques(sorted(set(emails)), tamano):
+        marcadores = ', '.join(['%s'] * len(bloque))
+        cursor.execute(f"SELECT id, nombre, apellido, email FROM usuarios WHERE email IN ({marcadores})",
+                       tuple(bloque))
+        for fila in cursor.fetchall():
+            if not isinstance(fila, dict):
+                fila = dict(zip(('id', 'nombre', 'apellido', 'email'), fila))
+            usuarios[fila['email'].lower()] = fila
+    return usuarios
+
+
+def insertar_ahorros(cursor, ahorros, tamano_lote=TAMANO_LOTE, al_terminar_lote=None, importacion_id=None):
+    """
+    Inserta por lotes los ahorros (cualquier iterable). En cada lote, los
+    que traen fecha y los que usan la fecha por defecto de la tabla van en
+    sentencias distintas. Los ahorros con 'clave_fila' ya importada se
+    omiten con una advertencia (ver importaciones.py). Retorna
+    (ahorros_creados, errores, deltas_saldo) con los deltas por usuario de
+    los ahorros insertados (ver saldos.py).
+    al_terminar_lote(creados, errores) se llama después de cada lote.
+    """
+    sentencias = [
+        ("INSERT INTO ahorros (usuario_id, monto, fecha, validado, importacion_id, clave_fila) "
+         "VALUES (%s, %s, %s, %s, %s, %s)",
+         lambda a: (a['usuario_id'], a['monto'], a['fecha'], a['validado'],
+                    importacion_id, a.get('clave_fila')), True),
+        ("INSERT INTO ahorros (usuario_id, monto, validado, importacion_id, clave_fila) "
+         "VALUES (%s, %s, %s, %s, %s)",
+         lambda a: (a['usuario_id'], a['monto'], a['validado'],
+                    importacion_id, a.get('clave_fila')), False),
+    ]
+
+    creados = 0
+    errores = ErroresCarga()
+    deltas = {}
+    for lote in en_bloques(ahorros, tamano_lote):
+        claves = [a['clave_fila'] for a in lote if a.get('clave_fila')]
+        importadas = valores_existentes(cursor, 'ahorros', 'clave_fila', claves)
+        nuevos = []
+        for ahorro in lote:
+            if ahorro.get('clave_fila') in importadas:
+                errores.append(f"Fila {ahorro['fila']}: el ahorro de {ahorro['usuario_email']} ya fue importado")
+            else:
+                nuevos.append(ahorro)
+
+        for consulta, a_fila, con_fecha in sentencias:
+            grupo = [a for a in nuevos if bool(a['fecha']) == con_fecha]
+            if not grupo:
+                continue
+            insertados, errores_lote = _insertar_lote(
+                cursor, consulta, grupo, a_fila,
+                lambda ahorro: f"Error creando ahorro para {ahorro['usuario_email']}"
+            )
+            creados += len(insertados)
+            errores.extend(errores_lote)
+            for ahorro in insertados:
+                delta = delta_ahorro(ahorro['monto'], ahorro['validado'])
+                previo = deltas.get(ahorro['usuario_id'], (0, 0, 0, 0))
+                deltas[ahorro['usuario_id']] = tuple(a + b for a, b in zip(previo, delta))
+        if al_terminar_lote:
+            al_terminar_lote(creados, errores)
+    return creados, errores, deltas
+
+
+def prestamos_aprobados(cursor, columna, valores, bloquear=True, tamano=TAMANO_BLOQUE_IN):
+    """
+    Préstamos aprobados cuyo `columna` ('id' o 'cedula' del dueño) está en
+    `valores`, con consultas IN (...) por bloques. Con bloquear=True las
+    filas quedan bloqueadas (FOR UPDATE) hasta el fin de la transacción,
+    como en el registro de un pago individual.
+    """
+    condicion = 'p.id' if columna == 'id' else 'u.cedula'
+    prestamos = []
+    for bloque in en_bloques(sorted(set(valores)), tamano):
+        marcadores = ', '.join(['%s'] * len(bloque))
+        cursor.execute(f"""
+            SELECT p.id, p.usuario_id, p.monto, p.saldo_pendiente, u.cedula
+            FROM prestamos p
+            JOIN usuarios u ON u.id = p.usuario_id
+            WHERE {condicion} IN ({marcadores}) AND p.estado = 'aprobado'
+            {'FOR UPDATE' if bloquear else ''}
+        """, tuple(bloque))
+        for fila in cursor.fetchall():
+            if not isinstance(fila, dict):
+                fila = dict(zip(('id', 'usuario_id', 'monto', 'saldo_pendiente', 'cedula'), fila))
+            prestamos.append(fila)
+    return prestamos
+
+
+def _acumular_pagos(cursor, acumulados, tamano=TAMANO_BLOQUE_IN):
+    """
+    Suma a cada préstamo sus pagos insertados con un UPDATE por bloque.
+    acumulados: prestamo_id -> (total_pagado, fecha_ultimo_pago o None)
+    """
+    for bloque in en_bloques(sorted(acumulados.items()), tamano):
+        filas = ' UNION ALL '.join(['SELECT %s AS id, %s AS pagado, %s AS ultima'] * len(bloque))
+        parametros = [valor for prestamo_id, (pagado, ultima) in bloque for valor in (prestamo_id, pagado, ultima)]
+        cursor.execute(f"""
+            UPDATE prestamos p
+            JOIN ({filas}) d ON d.id = p.id
+            SET p.total_pagado = p.total_pagado + d.pagado,
+                p.saldo_pendiente = p.saldo_pendiente - d.pagado,
+                p.ultimo_pago_fecha = GREATEST(COALESCE(p.ultimo_pago_fecha, '1000-01-01'),
+                                               COALESCE(d.ultima, NOW()))
+        """, tuple(parametros))
+
+
+def _marcar_pagados(cursor, prestamo_ids, tamano=TAMANO_BLOQUE_IN):
+    """
+    Pasa a 'pagado' los préstamos de `prestamo_ids` sin saldo pendiente.
+    Retorna (cantidad, deltas_saldo) con los deltas de saldos_usuario.
+    """
+    pagados = []
+    for bloque in en_bloques(sorted(prestamo_ids), tamano):
+        marcadores = ', '.join(['%s'] * len(bloque))
+        cursor.execute(f"""
+            SELECT id, usuario_id, monto FROM prestamos
+            WHERE id IN ({marcadores}) AND saldo_pendiente <= 0
+        """, tuple(bloque))
+        for fila in cursor.fetchall():
+            pagados.append(fila if not isinstance(fila, dict) else (fila['id'], fila['usuario_id'], fila['monto']))
+
+    deltas = {}
+    for bloque in en_bloques(pagados, tamano):
+        marcadores = ', '.join(['%s'] * len(bloque))
+        cursor.execute(f"UPDATE prestamos SET estado = 'pagado' WHERE id IN ({marcadores})",
+                       tuple(prestamo_id for prestamo_id, _, _ in bloque))
+    for _, usuario_id, monto in pagados:
+        previo = deltas.get(usuario_id, (0, 0, 0, 0))
+        deltas[usuario_id] = tuple(a + b for a, b in zip(previo, (0, 0, -float(monto), -1)))
+    return len(pagados), deltas
+
+
+def insertar_pagos(cursor, pagos, tamano_lote=TAMANO_LOTE, al_terminar_lote=None):
+    """
+    Inserta por lotes los pagos de préstamos (cualquier iterable), ya
+    validados contra el saldo pendiente. Al final actualiza los acumulados
+    de cada préstamo y marca como 'pagado' los que quedan sin saldo.
+    Retorna (pagos_creados, errores, prestamos_pagados, deltas_saldo).
+    al_terminar_lote(creados, errores) se llama después de cada lote.
+    """
+    sentencias = [
+        ("INSERT INTO pagos_prestamos (prestamo_id, monto, fecha) VALUES (%s, %s, %s)",
+         lambda p: (p['prestamo_id'], p['monto'], p['fecha']), True),
+        ("INSERT INTO pagos_prestamos (prestamo_id, monto) VALUES (%s, %s)",
+         lambda p: (p['prestamo_id'], p['monto']), False),
+    ]
+
+    creados = 0
+    errores = ErroresCarga()
+    acumulados = {}
+    for lote in en_bloques(pagos, tamano_lote):
+        for consulta, a_fila, con_fecha in sentencias:
+            grupo = [p for p in lote if bool(p['fecha']) == con_fecha]
+            if not grupo:
+                continue
+            insertados, errores_lote = _insertar_lote(
+                cursor, consulta, grupo, a_fila,
+                lambda pago: f"Fila {pago['fila']}: error registrando el pago del préstamo {pago['prestamo_id']}"
+            )
+            creados += len(insertados)
+            errores.extend(errores_lote)
+            for pago in insertados:
+                # Sin fecha el pago queda con NOW() (None), posterior a cualquier fecha del archivo
+                if pago['prestamo_id'] not in acumulados:
+                    acumulados[pago['prestamo_id']] = (pago['monto'], pago['fecha'])
+                    continue
+                pagado, ultima = acumulados[pago['prestamo_id']]
+                if ultima and pago['fecha']:
+                    ultima = max(ultima, pago['fecha'])
+                else:
+                    ultima = None
+                acumulados[pago['prestamo_id']] = (pagado + pago['monto'], ultima)
+        if al_terminar_lote:
+            al_terminar_lote(creados, errores)
+
+    _acumular_pagos(cursor, acumulados)
+    pagados, deltas = _marcar_pagados(cursor, acumulados.keys())
+    return creados, errores, pagados, deltas
+
+
+# Carga rápida de ahorros con LOAD DATA LOCAL INFILE
+#
+# El CSV se carga tal cual en una tabla temporal; los rechazos se calculan
+# con una sola consulta sobre esa tabla (con los mismos mensajes que la
+# validación fila por fila) y las filas válidas pasan a ahorros con un
+# INSERT ... SELECT. Requiere local_infile habilitado en el servidor y
+# allow_local_infile_in_path en la conexión; si no, se usa la carga por lotes.
+
+# Errores de MySQL cuando LOAD DATA LOCAL no está permitido
+ERRORES_LOCAL_INFILE = (1148, 2068, 3948)
+
+MONTO_MAXIMO = 99999999.99  # DECIMAL(10, 2) de ahorros.monto
+
+CREAR_STAGING_AHORROS = '''
+CREATE TEMPORARY TABLE staging_ahorros (
+    fila INT AUTO_INCREMENT PRIMARY KEY,
+    email VARCHAR(255) NOT NULL DEFAULT '',
+    monto_texto VARCHAR(64) NOT NULL DEFAULT '',
+    fecha_texto VARCHAR(64) NOT NULL DEFAULT '',
+    linea INT DEFAULT NULL,
+    clave_fila CHAR(64) DEFAULT NULL,
+    omitida TINYINT(1) NOT NULL DEFAULT 0,
+    INDEX idx_staging_email (email)
+) AUTO_INCREMENT = 2
+'''
+
+# Motivo de rechazo de cada fila, en el mismo orden de validación que
+# validar_csv_ahorros() en app.py; NULL si la fila es válida
+MOTIVO_RECHAZO = r'''
+    CASE
+        WHEN s.email = '' OR s.monto_texto = '' THEN 'datos_incompletos'
+        WHEN u.id IS NULL THEN 'email_desconocido'
+        WHEN s.monto_texto NOT REGEXP '^[+-]?([0-9]+[.]?[0-9]*|[.][0-9]+)$' THEN 'monto_invalido'
+        WHEN CAST(s.monto_texto AS DECIMAL(30, 2)) <= 0 THEN 'monto_no_positivo'
+        WHEN s.fecha_texto != ''
+             AND (s.fecha_texto NOT REGEXP '^[0-9]{4}-[0-9]{1,2}-[0-9]{1,2}$'
+                  OR STR_TO_DATE(s.fecha_texto, '%Y-%m-%d') IS NULL) THEN 'fecha_invalida'
+    END
+'''
+
+MENSAJES_RECHAZO = {
+    'datos_incompletos': "Fila {fila}: Email y monto son obligatorios",
+    'email_desconocido': "Fila {fila}: Usuario con email {email} no encontrado",
+    'monto_invalido': "Fila {fila}: El monto debe ser un número válido",
+    'monto_no_positivo': "Fila {fila}: El monto debe ser mayor a 0",
+    'fecha_invalida': "Fila {fila}: La fecha debe estar en formato YYYY-MM-DD",
+}
+
+
+class LoadDataNoDisponible(Exception):
+    """LOAD DATA LOCAL INFILE está deshabilitado en el cliente o en el servidor"""
+
+
+def local_infile_disponible(cursor):
+    cursor.execute("SELECT @@GLOBAL.local_infile")
+    fila = cursor.fetchone()
+    valor = fila[0] if not isinstance(fila, dict) else list(fila.values())[0]
+    return bool(int(valor or 0))
+
+
+def _columnas_load_data(encabezado):
+    """
+    Lista de variables para LOAD DATA según el orden de las columnas del
+    archivo; las columnas que no se usan van a @ignorar
+    """
+    variables = []
+    for columna in encabezado:
+        columna = columna.strip()
+        variables.append(f"@{columna}" if columna in ('email', 'monto', 'fecha') else '@ignorar')
+    return variables
+
+
+def cargar_ahorros_staging(cursor, ruta, errores, hash_archivo, importacion_id=None, progreso=None):
+    """
+    Carga los ahorros del archivo `ruta` por la vía rápida, en la
+    transacción del llamador. Los rechazos de validación se agregan a
+    `errores` y, si hay alguno, no se inserta nada (igual que la carga por
+    lotes); las filas ya importadas se omiten con una advertencia.
+    progreso(filas_procesadas, filas_rechazadas) se llama después de cada
+    paso, para que un archivo grande no parezca un trabajo interrumpido.
+    Retorna (ahorros_creados, errores_insercion, filas_leidas).
+    Lanza LoadDataNoDisponible si LOAD DATA LOCAL no está permitido.
+    """
+    if not local_infile_disponible(cursor):
+        raise LoadDataNoDisponible()
+
+    def avisar(filas_procesadas, filas_rechazadas):
+        if progreso:
+            progreso(filas_procesadas, filas_rechazadas)
+
+    with open(ruta, 'rb') as archivo:
+        encabezado = next(csv.reader(codecs.iterdecode(archivo, 'utf-8')), [])
+    columnas = [columna.strip() for columna in encabezado]
+    for columna in ['email', 'monto', 'fecha']:
+        if columna not in columnas:
+            errores.append(f"Columna faltante: {columna}")
+            return 0, ErroresCarga(), 0
+
+    # Sólo se cargan archivos de DIRECTORIO_CARGAS, creados con mkstemp
+    ruta_sql = ruta.replace('\\', '\\\\').replace("'", "\\'")
+    limpiar = "TRIM(REPLACE({}, '\\r', ''))"
+    cursor.execute("DROP TEMPORARY TABLE IF EXISTS staging_ahorros")
+    cursor.execute(CREAR_STAGING_AHORROS)
+    try:
+        try:
+            cursor.execute(f'''
+                LOAD DATA LOCAL INFILE '{ruta_sql}'
+                INTO TABLE staging_ahorros
+                CHARACTER SET utf8mb4
+                FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '"' ESCAPED BY ''
+                LINES TERMINATED BY '\\n'
+                IGNORE 1 LINES
+                ({', '.join(_columnas_load_data(encabezado))})
+                SET email = LOWER({limpiar.format('@email')}),
+                    monto_texto = {limpiar.format('@monto')},
+                    fecha_texto = {limpiar.format('@fecha')}
+            ''')
+        except Exception as e:
+            if getattr(e, 'errno', None) in ERRORES_LOCAL_INFILE:
+                raise LoadDataNoDisponible() from e
+            raise
+
+        # Las líneas vacías no son filas, como en csv.DictReader
+        cursor.execute("DELETE FROM staging_ahorros WHERE email = '' AND monto_texto = '' AND fecha_texto = ''")
+        cursor.execute("SELECT COUNT(*) FROM staging_ahorros")
+        filas_leidas = cursor.fetchone()[0]
+        avisar(0, 0)
+
+        # Rechazos de validación: una sola consulta sobre la tabla temporal
+        cursor.execute(f'''
+            SELECT fila, email, motivo FROM (
+                SELECT s.fila, s.email, {MOTIVO_RECHAZO} AS motivo
+                FROM staging_ahorros s
+                LEFT JOIN usuarios u ON u.email = s.email
+            ) r
+            WHERE motivo IS NOT NULL
+            ORDER BY fila
+        ''')
+        for fila, email, motivo in cursor:
+            errores.append(MENSAJES_RECHAZO[motivo].format(fila=fila, email=email))
+        if errores:
+            avisar(filas_leidas, errores.total)
+            return 0, ErroresCarga(), filas_leidas
+        avisar(0, 0)
+
+        # Montos que no caben en ahorros.monto: se omiten con una advertencia,
+        # como cuando falla el INSERT de una fila en la carga por lotes
+        errores_insercion = ErroresCarga()
+        cursor.execute('''
+            SELECT email FROM staging_ahorros
+            WHERE CAST(monto_texto AS DECIMAL(30, 2)) > %s
+            ORDER BY fila
+        ''', (MONTO_MAXIMO,))
+        for (email,) in cursor:
+            errores_insercion.append(f"Error creando ahorro para {email}: monto fuera de rango")
+
+        # Clave de cada fila, con la misma numeración de líneas que
+        # csv.DictReader en la carga por lotes (sin contar líneas vacías).
+        # Una tabla temporal no puede aparecer dos veces en la misma
+        # consulta: la numeración se calcula en otra y se une por fila
+        cursor.execute("DROP TEMPORARY TABLE IF EXISTS staging_lineas")
+        cursor.execute('''
+            CREATE TEMPORARY TABLE staging_lineas (PRIMARY KEY (fila))
+            SELECT fila, ROW_NUMBER() OVER (ORDER BY fila) + 1 AS linea
+            FROM staging_ahorros
+        ''')
+        cursor.execute('''
+            UPDATE staging_ahorros s
+            JOIN staging_lineas n ON n.fila = s.fila
+            SET s.linea = n.linea
+        ''')
+        cursor.execute(f'''
+            UPDATE staging_ahorros s
+            JOIN usuarios u ON u.email = s.email
+            SET s.clave_fila = {CLAVE_FILA_SQL}
+            WHERE CAST(s.monto_texto AS DECIMAL(30, 2)) <= %s
+        ''', (hash_archivo, MONTO_MAXIMO))
+
+        # Filas ya importadas: búsqueda por el índice único de ahorros.clave_fila
+        cursor.execute('''
+            UPDATE staging_ahorros s
+            JOIN ahorros a ON a.clave_fila = s.clave_fila
+            SET s.omitida = 1
+        ''')
+        cursor.execute("SELECT linea, email FROM staging_ahorros WHERE omitida = 1 ORDER BY fila")
+        for linea, email in cursor:
+            errores_insercion.append(f"Fila {linea}: el ahorro de {email} ya fue importado")
+        avisar(0, errores_insercion.total)
+
+        # Filas válidas a ahorros en un solo INSERT ... SELECT
+        cursor.execute('''
+            INSERT INTO ahorros (usuario_id, monto, fecha, validado, importacion_id, clave_fila)
+            SELECT u.id, CAST(s.monto_texto AS DECIMAL(10, 2)),
+                   COALESCE(STR_TO_DATE(NULLIF(s.fecha_texto, ''), '%Y-%m-%d'), NOW()), 0,
+                   %s, s.clave_fila
+            FROM staging_ahorros s
+            JOIN usuarios u ON u.email = s.email
+            WHERE CAST(s.monto_texto AS DECIMAL(30, 2)) <= %s AND s.omitida = 0
+            ORDER BY s.fila
+        ''', (importacion_id, MONTO_MAXIMO))
+        creados = cursor.rowcount
+        avisar(creados + errores_insercion.total, errores_insercion.total)
+
+        # Deltas de saldos_usuario por usuario (ahorros no validados, ver saldos.py)
+        cursor.execute('''
+            INSERT INTO saldos_usuario
+                (usuario_id, ahorros_validados, ahorros_pendientes, total_prestamos, prestamos_activos)
+            SELECT u.id, 0, SUM(CAST(s.monto_texto AS DECIMAL(10, 2))), 0, 0
+            FROM staging_ahorros s
+            JOIN usuarios u ON u.email = s.email
+            WHERE CAST(s.monto_texto AS DECIMAL(30, 2)) <= %s AND s.omitida = 0
+            GROUP BY u.id
+            ON DUPLICATE KEY UPDATE
+                ahorros_pendientes = ahorros_pendientes + VALUES(ahorros_pendientes)
+        ''', (MONTO_MAXIMO,))
+        avisar(filas_leidas, errores_insercion.total)
+        return creados, errores_insercion, filas_leidas
+    finally:
+        # La conexión vuelve al pool: las tablas temporales no deben sobrevivirla
+        cursor.execute("DROP TEMPORARY TABLE IF EXISTS staging_lineas")
+        cursor.execute("DROP TEMPORARY TABLE IF EXISTS staging_ahorros")
@@ -0,0 +1,206 @@
+# Conciliación del extracto bancario contra ahorros y pagos de préstamos
+#
+# El extracto (CSV con fecha, monto y referencia = cédula o email de quien
+# consigna) se recorre dos veces: la primera sólo calcula el rango de
+# fechas, la segunda cruza cada línea con los candidatos. Los candidatos
+# (ahorros pendientes de validación y pagos registrados en ese rango,
+# ampliado con la ventana de días) se traen con una consulta por tabla y
+# se indexan en memoria por (referencia, monto en centavos): cada línea se
+# resuelve con una búsqueda en el diccionario, sin consultas por línea.
+import os
+from bisect import bisect_left
+from datetime import datetime, timedelta
+from decimal import Decimal, InvalidOperation
+
+from carga_masiva import TAMANO_BLOQUE_IN, en_bloques, leer_csv
+
+# Días de diferencia admitidos entre la fecha del extracto y la del registro
+VENTANA_DIAS = int(os.getenv('CONCILIACION_VENTANA_DIAS', '3'))
+
+RESULTADOS_CONCILIACION = ('conciliado', 'ambiguo', 'sin_conciliar', 'error')
+
+COLUMNAS_EXTRACTO = ('fecha', 'monto', 'referencia')
+
+CONSULTA_AHORROS_PENDIENTES = '''
+    SELECT a.id, a.usuario_id, a.monto, a.fecha, u.cedula, u.email
+    FROM ahorros a
+    JOIN usuarios u ON u.id = a.usuario_id
+    WHERE a.validado = 0 AND a.fecha >= %s AND a.fecha < %s
+'''
+
+CONSULTA_PAGOS = '''
+    SELECT pp.id, p.usuario_id, pp.monto, pp.fecha, u.cedula, u.email
+    FROM pagos_prestamos pp
+    JOIN prestamos p ON p.id = pp.prestamo_id
+    JOIN usuarios u ON u.id = p.usuario_id
+    WHERE pp.fecha >= %s AND pp.fecha < %s
+'''
+
+
+def normalizar_referencia(referencia):
+    """Email en minúsculas; cédula sin puntos, guiones ni espacios"""
+    referencia = (referencia or '').strip().lower()
+    if '@' in referencia:
+        return referencia
+    return referencia.replace('.', '').replace('-', '').replace(' ', '')
+
+
+def centavos(monto):
+    return int((Decimal(str(monto)) * 100).to_integral_value())
+
+
+def leer_extracto(archivo):
+    """
+    Genera (fila_num, movimiento, error) por cada línea del extracto.
+    error es None o (categoria, mensaje); los errores del archivo completo
+    llevan fila_num None.
+    """
+    try:
+        lector = leer_csv(archivo)
+        columnas = [columna.strip().lower() for columna in (lector.fieldnames or [])]
+        for columna in COLUMNAS_EXTRACTO:
+            if columna not in columnas:
+                yield None, None, ('columna_faltante', f"Columna faltante: {columna}")
+                return
+        lector.fieldnames = columnas
+
+        for fila_num, fila in enumerate(lector, start=2):
+            referencia = normalizar_referencia(fila.get('referencia'))
+            texto_monto = (fila.get('monto') or '').strip()
+            texto_fecha = (fila.get('fecha') or '').strip()
+            if not (referencia and texto_monto and texto_fecha):
+                yield fila_num, None, ('datos_incompletos', "Fecha, monto y referencia son obligatorios")
+                continue
+            try:
+                monto = Decimal(texto_monto)
+                if not monto.is_finite() or monto <= 0:
+                    raise InvalidOperation()
+            except InvalidOperation:
+                yield fila_num, None, ('monto_invalido', "El monto debe ser un número mayor a 0")
+                continue
+            try:
+                fecha = datetime.strptime(texto_fecha, '%Y-%m-%d').date()
+            except ValueError:
+                yield fila_num, None, ('fecha_invalida', "La fecha debe estar en formato YYYY-MM-DD")
+                continue
+            yield fila_num, {
+                'referencia': referencia,
+                'monto': monto,
+                'fecha': fecha,
+                'descripcion': (fila.get('descripcion') or '').strip(),
+            }, None
+    except Exception as e:
+        yield None, None, ('archivo_invalido', f"Error leyendo el extracto: {str(e)}")
+
+
+def rango_fechas(archivo):
+    """(primera, última) fecha válida del extracto, o None si no hay ninguna"""
+    fechas = [movimiento['fecha'] for _, movimiento, error in leer_extracto(archivo) if not error]
+    return (min(fechas), max(fechas)) if fechas else None
+
+
+def indexar_candidatos(cursor, desde, hasta, ventana=VENTANA_DIAS):
+    """
+    Trae los ahorros pendientes y los pagos entre `desde` y `hasta` (más la
+    ventana) y los indexa por (referencia, centavos). Cada candidato
+    (fecha, tipo, id, usuario_id) queda bajo su cédula y su email, en
+    listas ordenadas por fecha. Retorna el diccionario.
+    """
+    inicio = desde - timedelta(days=ventana)
+    fin = hasta + timedelta(days=ventana + 1)
+    indice = {}
+    for tipo, consulta in (('ahorro', CONSULTA_AHORROS_PENDIENTES), ('pago', CONSULTA_PAGOS)):
+        cursor.execute(consulta, (inicio, fin))
+        for fila in cursor:
+            if isinstance(fila, dict):
+                fila = (fila['id'], fila['usuario_id'], fila['monto'], fila['fecha'], fila['cedula'], fila['email'])
+            registro_id, usuario_id, monto, fecha, cedula, email = fila
+            candidato = (fecha.date() if isinstance(fecha, datetime) else fecha, tipo, registro_id, usuario_id)
+            importe = centavos(monto)
+            for referencia in {normalizar_referencia(cedula), normalizar_referencia(email)} - {''}:
+                indice.setdefault((referencia, importe), []).append(candidato)
+    for candidatos in indice.values():
+        candidatos.sort()
+    return indice
+
+
+def conciliar(resultados, indice, ventana=VENTANA_DIAS):
+    """
+    Cruza las líneas del extracto con el índice de candidatos y genera una
+    entrada de reporte por línea: 'conciliado' si hay un solo candidato
+    libre dentro de la ventana, 'ambiguo' si hay varios, 'sin_conciliar' si
+    no hay ninguno y 'error' si la línea no es válida. Un registro se
+    concilia con una sola línea.
+    """
+    usados = set()
+    antes = timedelta(days=ventana)
+    despues = timedelta(days=ventana + 1)
+    for fila_num, movimiento, error in resultados:
+        if error:
+            yield {'fila': fila_num, 'resultado': 'error', 'categoria': error[0], 'detalle': error[1]}
+            continue
+
+        entrada = {
+            'fila': fila_num,
+            'datos': {
+                'referencia': movimiento['referencia'],
+                'monto': movimiento['monto'],
+                'fecha': movimiento['fecha'].isoformat(),
+                'descripcion': movimiento['descripcion'],
+            },
+        }
+        # Sólo los candidatos dentro de la ventana, por búsqueda binaria
+        lista = indice.get((movimiento['referencia'], centavos(movimiento['monto'])), [])
+        desde = bisect_left(lista, (movimiento['fecha'] - antes,))
+        hasta = bisect_left(lista, (movimiento['fecha'] + despues,))
+        candidatos = [candidato for candidato in lista[desde:hasta] if candidato[1:3] not in usados]
+        if not candidatos:
+            entrada.update(resultado='sin_conciliar', categoria='sin_candidatos',
+                           detalle="No hay ahorros pendientes ni pagos con esa referencia, monto y fecha")
+        elif len(candidatos) > 1:
+            entrada.update(resultado='ambiguo', categoria='varios_candidatos',
+                           detalle=', '.join(f"{tipo} #{registro_id} ({fecha})"
+                                             for fecha, tipo, registro_id, _ in candidatos))
+        else:
+            fecha, tipo, registro_id, _ = candidatos[0]
+            usados.add((tipo, registro_id))
+            entrada.update(resultado='conciliado',
+                           categoria='ahorro_pendiente' if tipo == 'ahorro' else 'pago_prestamo',
+                           detalle=f"{tipo} #{registro_id} del {fecha}",
+                           registro_id=registro_id)
+        yield entrada
+
+
+def ahorros_conciliados(entradas):
+    """Ids de los ahorros pendientes conciliados en un reporte"""
+    return [entrada['registro_id'] for entrada in entradas
+            if entrada['resultado'] == 'conciliado' and entrada['categoria'] == 'ahorro_pendiente']
+
+
+def validar_ahorros(cursor, ahorro_ids, tamano=TAMANO_BLOQUE_IN):
+    """
+    Valida en bloque los ahorros de `ahorro_ids` que siguen pendientes.
+    Retorna (validados, deltas_saldo) con los deltas de saldos_usuario.
+    """
+    validados = 0
+    deltas = {}
+    for bloque in en_bloques(ahorro_ids, tamano):
+        marcadores = ', '.join(['%s'] * len(bloque))
+        # Bloquear los ahorros para calcular los deltas sin carreras
+        cursor.execute(f"""
+            SELECT id, usuario_id, monto FROM ahorros
+            WHERE id IN ({marcadores}) AND validado = 0
+            FOR UPDATE
+        """, tuple(bloque))
+        pendientes = [fila if not isinstance(fila, dict) else (fila['id'], fila['usuario_id'], fila['monto'])
+                      for fila in cursor.fetchall()]
+        if not pendientes:
+            continue
+        marcadores = ', '.join(['%s'] * len(pendientes))
+        cursor.execute(f"UPDATE ahorros SET validado = 1 WHERE id IN ({marcadores})",
+                       tuple(ahorro_id for ahorro_id, _, _ in pendientes))
+        validados += len(pendientes)
+        for _, usuario_id, monto in pendientes:
+            previo = deltas.get(usuario_id, (0, 0, 0, 0))
+            deltas[usuario_id] = tuple(a + b for a, b in zip(previo, (float(monto), -float(monto), 0, 0)))
+    return validados, deltas
@@ -0,0 +1,138 @@
+# Plan de cuotas de los préstamos (tabla cuotas_prestamo)
+#
+# El plan se calcula una sola vez, al aprobar el préstamo, con la tabla de
+# amortización de amortizacion.py y se guarda cuota por cuota con su fecha
+# de vencimiento. El pronóstico y la página de préstamos leen el plan por
+# clave primaria, y el índice por fecha de vencimiento permite consultar
+# lo que vence en un período para todo el fondo sin calcular nada.
+#
+# Una cuota queda pagada cuando los pagos del préstamo cubren la suma de
+# las cuotas hasta ella (cuota_acumulada), o cuando el préstamo se paga.
+import calendar
+from datetime import date, datetime
+from decimal import Decimal
+
+from amortizacion import calcular_tablas
+from carga_masiva import TAMANO_BLOQUE_IN, TAMANO_LOTE, en_bloques
+
+# Sistema con el que se aprueban los préstamos (ver validar_prestamo)
+SISTEMA_PRESTAMOS = 'interes_simple'
+
+CREAR_TABLA_CUOTAS = '''
+CREATE TABLE IF NOT EXISTS cuotas_prestamo (
+    prestamo_id INT NOT NULL,
+    numero INT NOT NULL,
+    fecha_vencimiento DATE NOT NULL,
+    capital DECIMAL(10, 2) NOT NULL,
+    interes DECIMAL(10, 2) NOT NULL,
+    cuota DECIMAL(10, 2) NOT NULL,
+    saldo_esperado DECIMAL(10, 2) NOT NULL,
+    cuota_acumulada DECIMAL(12, 2) NOT NULL,
+    pagada TINYINT(1) NOT NULL DEFAULT 0,
+    PRIMARY KEY (prestamo_id, numero),
+    KEY idx_cuotas_vencimiento (fecha_vencimiento, pagada),
+    FOREIGN KEY (prestamo_id) REFERENCES prestamos(id) ON DELETE CASCADE
+)
+'''
+
+# Resumen del plan por préstamo para la página de préstamos
+CONSULTA_RESUMEN_CUOTAS = '''
+    SELECT prestamo_id,
+           MAX(CASE WHEN numero = 1 THEN cuota END) AS cuota_total_mensual,
+           SUM(interes) AS total_intereses,
+           SUM(cuota) AS total_a_pagar,
+           MIN(CASE WHEN pagada = 0 THEN fecha_vencimiento END) AS proximo_vencimiento
+    FROM cuotas_prestamo
+    WHERE prestamo_id IN ({marcadores})
+    GROUP BY prestamo_id
+'''
+
+
+def sumar_meses(fecha, meses):
+    """Misma fecha `meses` después; si el día no existe, el último del mes"""
+    mes = fecha.month - 1 + meses
+    anio = fecha.year + mes // 12
+    mes = mes % 12 + 1
+    return date(anio, mes, min(fecha.day, calendar.monthrange(anio, mes)[1]))
+
+
+def _pesos(centavos):
+    return Decimal(int(centavos)) / 100
+
+
+def filas_cuotas(prestamos, sistema=SISTEMA_PRESTAMOS):
+    """
+    Calcula de una vez el plan de todos los `prestamos`, tuplas
+    (id, monto, tasa_anual, plazo_meses, fecha_base), y genera las filas de
+    cuotas_prestamo. La cuota N vence N meses después de la fecha base.
+    """
+    prestamos = list(prestamos)
+    if not prestamos:
+        return
+    ids, montos, tasas, plazos, fechas = zip(*prestamos)
+    tabla = calcular_tablas(sistema, montos, [tasa or 0 for tasa in tasas], [plazo or 0 for plazo in plazos])
+    for i, prestamo_id in enumerate(ids):
+        base = fechas[i] or date.today()
+        base = base.date() if isinstance(base, datetime) else base
+        acumulada = 0
+        for mes in range(int(tabla['plazo'][i])):
+            acumulada += int(tabla['cuota'][i, mes])
+            yield (prestamo_id, mes + 1, sumar_meses(base, mes + 1),
+                   _pesos(tabla['capital'][i, mes]), _pesos(tabla['interes'][i, mes]),
+                   _pesos(tabla['cuota'][i, mes]), _pesos(tabla['saldo'][i, mes]), _pesos(acumulada))
+
+
+def generar_cuotas(cursor, prestamos, sistema=SISTEMA_PRESTAMOS, tamano_lote=TAMANO_LOTE):
+    """
+    Reemplaza el plan de cuotas de los `prestamos` (ver filas_cuotas) y
+    marca las cuotas ya cubiertas por pagos. Retorna las cuotas creadas.
+    """
+    prestamos = list(prestamos)
+    prestamo_ids = [prestamo[0] for prestamo in prestamos]
+    for bloque in en_bloques(prestamo_ids, TAMANO_BLOQUE_IN):
+        marcadores = ', '.join(['%s'] * len(bloque))
+        cursor.execute(f"DELETE FROM cuotas_prestamo WHERE prestamo_id IN ({marcadores})", tuple(bloque))
+
+    creadas = 0
+    for lote in en_bloques(filas_cuotas(prestamos, sistema), tamano_lote):
+        cursor.executemany('''
+            INSERT INTO cuotas_prestamo
+                (prestamo_id, numero, fecha_vencimiento, capital, interes, cuota, saldo_esperado, cuota_acumulada)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+        ''', lote)
+        creadas += len(lote)
+    marcar_cuotas_pagadas(cursor, prestamo_ids)
+    return creadas
+
+
+def marcar_cuotas_pagadas(cursor, prestamo_ids, tamano=TAMANO_BLOQUE_IN):
+    """Actualiza `pagada` en las cuotas de los préstamos según su total pagado"""
+    for bloque in en_bloques(sorted(prestamo_ids), tamano):
+        marcadores = ', '.join(['%s'] * len(bloque))
+        cursor.execute(f"""
+            UPDATE cuotas_prestamo c
+            JOIN prestamos p ON p.id = c.prestamo_id
+            SET c.pagada = (p.estado = 'pagado' OR c.cuota_acumulada <= p.total_pagado)
+            WHERE c.prestamo_id IN ({marcadores})
+        """, tuple(bloque))
+
+
+def leer_cuotas(cursor, prestamo_id):
+    cursor.execute('''
+        SELECT numero, fecha_vencimiento, capital, interes, cuota, saldo_esperado, pagada
+        FROM cuotas_prestamo
+        WHERE prestamo_id = %s
+        ORDER BY numero
+    ''', (prestamo_id,))
+    return cursor.fetchall()
+
+
+def resumen_cuotas(cursor, prestamo_ids):
+    """prestamo_id -> fila de CONSULTA_RESUMEN_CUOTAS, en una consulta por bloque"""
+    resumen = {}
+    for bloque in en_bloques(list(prestamo_ids), TAMANO_BLOQUE_IN):
+        marcadores = ', '.join(['%s'] * len(bloque))
+        cursor.execute(CONSULTA_RESUMEN_CUOTAS.format(marcadores=marcadores), tuple(bloque))
+        for fila in cursor.fetchall():
+            resumen[fila['prestamo_id']] = fila
+    return resumen
@@ -0,0 +1,191 @@
+# Pool de conexiones MySQL para la aplicación SparFonds
+import threading
+import time
+from collections import deque
+
+import mysql.connector
+from mysql.connector import errors
+
+
+class PoolAgotado(errors.PoolError):
+    """Se agotó el tiempo de espera para obtener una conexión del pool"""
+
+
+class ConexionPool:
+    """
+    Envoltura de una conexión prestada por el pool.
+    Se comporta como la conexión original, pero close() la devuelve al pool
+    en lugar de cerrar el socket.
+    """
+
+    def __init__(self, pool, conn, creada_en):
+        self._pool = pool
+        self._conn = conn
+        self._creada_en = creada_en
+
+    def __getattr__(self, nombre):
+        if self._conn is None:
+            raise errors.OperationalError("La conexión ya fue devuelta al pool")
+        return getattr(self._conn, nombre)
+
+    def close(self):
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            self._pool._devolver(conn, self._creada_en)
+
+    def descartar(self):
+        """Cierra el socket sin devolver la conexión al pool (p. ej. con filas sin leer)"""
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            self._pool._descartar(conn)
+
+
+class PoolConexiones:
+    """
+    Pool de conexiones MySQL con tamaño fijo más un desborde temporal.
+
+    - tamano: conexiones que se mantienen abiertas y reutilizables.
+    - max_overflow: conexiones extra permitidas en picos; se cierran al devolverse.
+    - timeout: segundos de espera máxima cuando todas las conexiones están en uso.
+    - reciclar: segundos de vida máxima de una conexión antes de reemplazarla.
+    - verificar: hacer ping a la conexión al prestarla y descartarla si está caída.
+    """
+
+    def __init__(self, config, tamano=5, max_overflow=10, timeout=30, reciclar=3600, verificar=True):
+        # La configuración (incluida la ruta de certificados TLS) se resuelve una sola vez
+        self._config = dict(config)
+        self.tamano = tamano
+        self.max_overflow = max_overflow
+        self.timeout = timeout
+        self.reciclar = reciclar
+        self.verificar = verificar
+
+        self._libres = deque()
+        self._abiertas = 0
+        self._condicion = threading.Condition()
+        self._stats = {
+            'checkouts': 0,
+            'esperas': 0,
+            'timeouts': 0,
+            'creadas': 0,
+            'recicladas': 0,
+            'descartadas': 0,
+        }
+
+    def _conectar(self):
+        conn = mysql.connector.connect(**self._config)
+        with self._condicion:
+            self._stats['creadas'] += 1
+        return conn, time.monotonic()
+
+    def _cerrar_silencioso(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _liberar_cupo(self):
+        with self._condicion:
+            self._abiertas -= 1
+            self._condicion.notify()
+
+    def obtener(self):
+        """Presta una conexión del pool, creando una nueva si hay cupo disponible"""
+        limite = time.monotonic() + self.timeout
+        with self._condicion:
+            while True:
+                if self._libres:
+                    conn, creada_en = self._libres.pop()
+                    break
+                if self._abiertas < self.tamano + self.max_overflow:
+                    self._abiertas += 1
+                    conn = None
+                    break
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    self._stats['timeouts'] += 1
+                    raise PoolAgotado(
+                        f"No hay conexiones disponibles tras {self.timeout} segundos "
+                        f"({self._abiertas} abiertas)"
+                    )
+                self._stats['esperas'] += 1
+                self._condicion.wait(restante)
+            self._stats['checkouts'] += 1
+
+        try:
+            if conn is None:
+                conn, creada_en = self._conectar()
+            elif self.reciclar and time.monotonic() - creada_en > self.reciclar:
+                # Conexión demasiado antigua: se reemplaza por una nueva
+                self._cerrar_silencioso(conn)
+                with self._condicion:
+                    self._stats['recicladas'] += 1
+                conn, creada_en = self._conectar()
+            elif self.verificar:
+                try:
+                    conn.ping(reconnect=False)
+                except mysql.connector.Error:
+                    # Conexión caída (timeout del servidor, reinicio, etc.)
+                    self._cerrar_silencioso(conn)
+                    with self._condicion:
+                        self._stats['descartadas'] += 1
+                    conn, creada_en = self._conectar()
+        except Exception:
+            self._liberar_cupo()
+            raise
+
+        return ConexionPool(self, conn, creada_en)
+
+    def _devolver(self, conn, creada_en):
+        try:
+            # Descartar cualquier transacción que la vista haya dejado abierta
+            if conn.in_transaction:
+                conn.rollback()
+        except Exception:
+            self._cerrar_silencioso(conn)
+            with self._condicion:
+                self._stats['descartadas'] += 1
+            self._liberar_cupo()
+            return
+
+        with self._condicion:
+            if len(self._libres) < self.tamano:
+                self._libres.append((conn, creada_en))
+                self._condicion.notify()
+                return
+            # Conexión de desborde: se cierra en vez de guardarla
+            self._abiertas -= 1
+            self._condicion.notify()
+        self._cerrar_silencioso(conn)
+
+    def _descartar(self, conn):
+        # shutdown() cierra el socket sin enviar QUIT ni leer lo pendiente
+        try:
+            conn.shutdown()
+        except Exception:
+            self._cerrar_silencioso(conn)
+        with self._condicion:
+            self._stats['descartadas'] += 1
+        self._liberar_cupo()
+
+    def cerrar_todo(self):
+        """Cierra las conexiones libres; las prestadas se cierran al devolverse"""
+        with self._condicion:
+            libres = list(self._libres)
+            self._libres.clear()
+            self._abiertas -= len(libres)
+        for conn, _ in libres:
+            self._cerrar_silencioso(conn)
+
+    def estadisticas(self):
+        """Retorna un diccionario con el estado y los contadores del pool"""
+        with self._condicion:
+            datos = dict(self._stats)
+            datos.update({
+                'tamano': self.tamano,
+                'max_overflow': self.max_overflow,
+                'abiertas': self._abiertas,
+                'libres': len(self._libres),
+                'en_uso': self._abiertas - len(self._libres),
+            })
+        return datos
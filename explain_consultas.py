@@ -0,0 +1,184 @@
+# Script para capturar el plan de ejecución (EXPLAIN) de las consultas frecuentes de app.py
+#
+# Agrega una sección a EXPLAIN_CONSULTAS.md con la salida de EXPLAIN de
+# cada consulta, etiquetada (por ejemplo 'antes' / 'despues' de migrar).
+# Uso:
+#   python explain_consultas.py antes
+#   python migraciones.py
+#   python explain_consultas.py despues
+#
+# Sobre una base ya migrada, 'comparar' captura los planes sin y con los
+# índices de la migración 8 (los vuelve invisibles mientras captura el
+# "antes", MySQL 8.0+) e indica qué consultas usa cada índice:
+#   python explain_consultas.py comparar
+import os
+import sys
+from datetime import datetime
+
+# Añadir el directorio actual al path para poder importar desde app.py
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import get_db_connection, CONSULTA_ULTIMOS_PAGOS
+from migraciones import INDICES_CONSULTAS_FRECUENTES, indices_existentes, version_actual
+
+REPORTE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'EXPLAIN_CONSULTAS.md')
+COLUMNAS = ['id', 'select_type', 'table', 'type', 'possible_keys', 'key', 'key_len', 'rows', 'filtered', 'Extra']
+
+# (nombre, vista, consulta, parámetros de ejemplo)
+CONSULTAS = [
+    ('login', 'login()',
+     "SELECT * FROM usuarios WHERE email = %s AND password = %s", ('admin@sparfonds.com', '')),
+    ('saldo_usuario', 'dashboard(), perfil(), ahorros(), historial()',
+     "SELECT ahorros_validados, ahorros_pendientes, total_prestamos, prestamos_activos "
+     "FROM saldos_usuario WHERE usuario_id = %s", (1,)),
+    ('prestamos_activos', 'dashboard()',
+     "SELECT * FROM prestamos WHERE usuario_id = %s AND estado != 'pagado'", (1,)),
+    ('ahorros_pendientes', 'admin()',
+     "SELECT a.*, u.nombre, u.apellido FROM ahorros a JOIN usuarios u ON a.usuario_id = u.id "
+     "WHERE a.validado = 0", ()),
+    ('prestamos_pendientes', 'admin()',
+     "SELECT p.*, u.nombre, u.apellido FROM prestamos p JOIN usuarios u ON p.usuario_id = u.id "
+     "WHERE p.estado = 'pendiente'", ()),
+    ('usuarios_por_registro', 'admin()',
+     "SELECT * FROM usuarios ORDER BY fecha_registro DESC", ()),
+    ('usuarios_por_nombre', 'admin_ahorros(), admin_historial()',
+     "SELECT * FROM usuarios ORDER BY nombre ASC", ()),
+    ('ultimos_ahorros', 'admin_ahorros()',
+     "SELECT a.*, u.nombre, u.apellido FROM ahorros a JOIN usuarios u ON a.usuario_id = u.id "
+     "ORDER BY a.fecha DESC LIMIT 10", ()),
+    ('ahorros_usuario', 'ahorros()',
+     "SELECT *, CASE WHEN validado = 1 THEN 'Validado' ELSE 'Pendiente' END as estado "
+     "FROM ahorros WHERE usuario_id = %s ORDER BY fecha DESC", (1,)),
+    ('sumas_ahorros_usuario', 'api_detalle_ahorro(), verificar_saldos()',
+     "SELECT SUM(monto), COUNT(*) FROM ahorros WHERE usuario_id = %s AND validado = 1", (1,)),
+    ('prestamos_usuario', 'prestamos()',
+     "SELECT * FROM prestamos WHERE usuario_id = %s ORDER BY fecha_solicitud DESC", (1,)),
+    ('pagos_de_prestamos', 'prestamos()',
+     "SELECT * FROM pagos_prestamos WHERE prestamo_id IN (%s, %s, %s) ORDER BY fecha DESC", (1, 2, 3)),
+    ('historial_pagos', 'historial() (rama de pagos del UNION ALL)',
+     "SELECT pp.id, pp.monto, pp.fecha FROM pagos_prestamos pp JOIN prestamos p ON pp.prestamo_id = p.id "
+     "WHERE p.usuario_id = %s ORDER BY pp.fecha DESC, pp.id DESC LIMIT 51", (1,)),
+    ('usuarios_con_prestamos', 'admin_pagos_prestamos()',
+     "SELECT DISTINCT u.* FROM usuarios u JOIN prestamos p ON u.id = p.usuario_id "
+     "WHERE p.estado = 'aprobado' ORDER BY u.nombre ASC", ()),
+    ('ultimos_pagos', 'admin_pagos_prestamos()', CONSULTA_ULTIMOS_PAGOS, (10,)),
+    ('pagos_de_un_prestamo', 'api_pronostico_prestamo()',
+     "SELECT COUNT(*), SUM(monto) FROM pagos_prestamos WHERE prestamo_id = %s", (1,)),
+    ('prestamos_aprobados_usuario', 'api_prestamos_usuario()',
+     "SELECT p.* FROM prestamos p WHERE p.usuario_id = %s AND p.estado = 'aprobado' ORDER BY p.id DESC", (1,)),
+]
+
+def tabla_markdown(filas):
+    lineas = ['| ' + ' | '.join(COLUMNAS) + ' |', '|' + '---|' * len(COLUMNAS)]
+    for fila in filas:
+        valores = [str(fila.get(columna, '')) if fila.get(columna) is not None else '' for columna in COLUMNAS]
+        lineas.append('| ' + ' | '.join(valores) + ' |')
+    return '\n'.join(lineas)
+
+def planes(cursor):
+    """Retorna {nombre: filas de EXPLAIN o mensaje de error} de cada consulta"""
+    resultado = {}
+    for nombre, _, consulta, parametros in CONSULTAS:
+        try:
+            cursor.execute("EXPLAIN " + consulta, parametros)
+            resultado[nombre] = cursor.fetchall()
+        except Exception as e:
+            resultado[nombre] = f"Error: {e}"
+    return resultado
+
+def plan_markdown(plan):
+    return plan if isinstance(plan, str) else tabla_markdown(plan)
+
+def encabezado(conn, etiqueta):
+    cursor_version = conn.cursor()
+    version = version_actual(cursor_version)
+    cursor_version.close()
+    return f"\n## {etiqueta} — {datetime.now():%Y-%m-%d %H:%M} (esquema v{version or 0})\n"
+
+def agregar_al_reporte(secciones):
+    with open(REPORTE, 'a', encoding='utf-8') as archivo:
+        archivo.write('\n'.join(secciones))
+
+def capturar(etiqueta):
+    conn = get_db_connection()
+    if not conn:
+        print("Error: No se pudo conectar a la base de datos.")
+        return False
+
+    cursor = conn.cursor(dictionary=True)
+    try:
+        secciones = [encabezado(conn, etiqueta)]
+        capturados = planes(cursor)
+        for nombre, vista, _, _ in CONSULTAS:
+            secciones.append(f"### {nombre} — {vista}\n\n{plan_markdown(capturados[nombre])}\n")
+    finally:
+        cursor.close()
+        conn.close()
+
+    agregar_al_reporte(secciones)
+    print(f"✓ Planes de {len(CONSULTAS)} consultas agregados a {REPORTE}")
+    return True
+
+def cambiar_visibilidad(conn, visibilidad):
+    """Vuelve visibles o invisibles los índices de la migración 8 que existan"""
+    cursor = conn.cursor()
+    try:
+        for tabla, indices in INDICES_CONSULTAS_FRECUENTES.items():
+            existentes = indices_existentes(cursor, tabla)
+            cambios = [f"ALTER INDEX {nombre} {visibilidad}" for nombre in indices if nombre.lower() in existentes]
+            if cambios:
+                cursor.execute(f"ALTER TABLE {tabla} {', '.join(cambios)}")
+    finally:
+        cursor.close()
+
+def comparar():
+    conn = get_db_connection()
+    if not conn:
+        print("Error: No se pudo conectar a la base de datos.")
+        return False
+
+    cursor = conn.cursor(dictionary=True)
+    try:
+        try:
+            cambiar_visibilidad(conn, 'INVISIBLE')
+            antes = planes(cursor)
+        finally:
+            cambiar_visibilidad(conn, 'VISIBLE')
+        despues = planes(cursor)
+        secciones = [encabezado(conn, 'comparar')]
+    finally:
+        cursor.close()
+        conn.close()
+
+    # Consultas cuyo plan usa cada índice (columna `key` del "después")
+    usos = {nombre: [] for indices in INDICES_CONSULTAS_FRECUENTES.values() for nombre in indices}
+    for consulta, plan in despues.items():
+        if isinstance(plan, str):
+            continue
+        for fila in plan:
+            if fila.get('key') in usos and consulta not in usos[fila['key']]:
+                usos[fila['key']].append(consulta)
+
+    secciones.append("### Uso de los índices de la migración 8\n")
+    secciones.append("| Índice | Consultas que lo usan |\n|---|---|")
+    secciones.extend(f"| `{indice}` | {', '.join(consultas) or 'ninguna'} |" for indice, consultas in usos.items())
+    secciones.append('')
+    for nombre, vista, _, _ in CONSULTAS:
+        secciones.append(f"### {nombre} — {vista}\n\n"
+                         f"Sin los índices de la migración 8:\n\n{plan_markdown(antes[nombre])}\n\n"
+                         f"Con los índices:\n\n{plan_markdown(despues[nombre])}\n")
+
+    agregar_al_reporte(secciones)
+    sin_uso = [indice for indice, consultas in usos.items() if not consultas]
+    print(f"✓ Planes de {len(CONSULTAS)} consultas agregados a {REPORTE}")
+    if sin_uso:
+        print(f"  Índices sin uso en los planes: {', '.join(sin_uso)}")
+    return True
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("Uso: python explain_consultas.py <etiqueta>   (por ejemplo: antes, despues)")
+        print("     python explain_consultas.py comparar")
+        sys.exit(1)
+    if not (comparar() if sys.argv[1] == 'comparar' else capturar(sys.argv[1])):
+        sys.exit(1)
@@ -0,0 +1,158 @@
+# Exportaciones de ahorros, préstamos y pagos en CSV o NDJSON
+#
+# Las filas se leen con un cursor sin buffer (el servidor las envía a
+# medida que se consumen, sin traer el resultado completo a memoria) en
+# bloques de TAMANO_BLOQUE filas, y cada bloque se codifica y se entrega
+# como un fragmento de la respuesta. Con gzip, los fragmentos se comprimen
+# al vuelo con un solo compresor para todo el archivo. La memoria usada no
+# depende del número de filas exportadas.
+import csv
+import io
+import json
+import os
+import zlib
+from datetime import date, datetime
+from decimal import Decimal
+
+# Filas por fragmento de la respuesta
+TAMANO_BLOQUE = int(os.getenv('EXPORTACION_BLOQUE', '5000'))
+
+FORMATOS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+# Tiempo (en segundos) que el servidor espera a que el cliente consuma el
+# resultado; una descarga lenta no debe cortar la consulta
+SEGUNDOS_ESCRITURA = 3600
+
+# Consulta, columnas exportadas, columna de fecha para el rango y columna
+# de usuario para el filtro de cada exportación
+EXPORTACIONES = {
+    'ahorros': {
+        'consulta': '''
+            SELECT a.id, a.usuario_id, u.cedula, u.email, u.nombre, u.apellido,
+                   a.monto, a.fecha, a.validado
+            FROM ahorros a
+            JOIN usuarios u ON u.id = a.usuario_id
+        ''',
+        'fecha': 'a.fecha',
+        'usuario': 'a.usuario_id',
+        'orden': 'a.fecha, a.id',
+    },
+    'prestamos': {
+        'consulta': '''
+            SELECT p.id, p.usuario_id, u.cedula, u.email, u.nombre, u.apellido,
+                   p.monto, p.tasa_interes, p.plazo_meses, p.estado, p.fecha_solicitud,
+                   p.total_pagado, p.saldo_pendiente, p.ultimo_pago_fecha
+            FROM prestamos p
+            JOIN usuarios u ON u.id = p.usuario_id
+        ''',
+        'fecha': 'p.fecha_solicitud',
+        'usuario': 'p.usuario_id',
+        'orden': 'p.fecha_solicitud, p.id',
+    },
+    'pagos': {
+        'consulta': '''
+            SELECT pp.id, pp.prestamo_id, p.usuario_id, u.cedula, u.email, u.nombre, u.apellido,
+                   pp.monto, pp.fecha
+            FROM pagos_prestamos pp
+            JOIN prestamos p ON p.id = pp.prestamo_id
+            JOIN usuarios u ON u.id = p.usuario_id
+        ''',
+        'fecha': 'pp.fecha',
+        'usuario': 'p.usuario_id',
+        'orden': 'pp.fecha, pp.id',
+    },
+}
+
+
+def consulta_exportacion(tipo, desde=None, hasta=None, usuario_id=None):
+    """Retorna (consulta, parámetros) con los filtros indicados"""
+    exportacion = EXPORTACIONES[tipo]
+    condiciones = []
+    parametros = []
+    if desde:
+        condiciones.append(f"{exportacion['fecha']} >= %s")
+        parametros.append(desde)
+    if hasta:
+        # Incluye el día completo de `hasta`
+        condiciones.append(f"{exportacion['fecha']} < %s + INTERVAL 1 DAY")
+        parametros.append(hasta)
+    if usuario_id:
+        condiciones.append(f"{exportacion['usuario']} = %s")
+        parametros.append(usuario_id)
+    consulta = exportacion['consulta']
+    if condiciones:
+        consulta += ' WHERE ' + ' AND '.join(condiciones)
+    consulta += f" ORDER BY {exportacion['orden']}"
+    return consulta, tuple(parametros)
+
+
+def _valor(valor):
+    """Fechas en ISO y decimales como texto, sin pérdida de precisión"""
+    if isinstance(valor, datetime):
+        return valor.isoformat(sep=' ')
+    if isinstance(valor, (date, Decimal)):
+        return str(valor)
+    return valor
+
+
+def _bloque_csv(filas, encabezado=None):
+    salida = io.StringIO()
+    escritor = csv.writer(salida)
+    if encabezado:
+        escritor.writerow(encabezado)
+    escritor.writerows([_valor(v) for v in fila] for fila in filas)
+    return salida.getvalue()
+
+
+def _bloque_ndjson(columnas, filas):
+    return ''.join(json.dumps(dict(zip(columnas, (_valor(v) for v in fila))), ensure_ascii=False) + '\n'
+                   for fila in filas)
+
+
+def generar_exportacion(conn, tipo, formato='csv', tamano=TAMANO_BLOQUE, **filtros):
+    """
+    Ejecuta la exportación en un cursor sin buffer de `conn` (conexión del
+    pool) y genera un fragmento de texto por cada bloque de `tamano` filas.
+    El CSV empieza con el encabezado aunque no haya filas.
+    """
+    # Cursor sin buffer: las filas llegan del servidor a medida que se envían
+    cursor = conn.cursor(buffered=False)
+    completa = False
+    try:
+        cursor.execute(f"SET SESSION net_write_timeout = {SEGUNDOS_ESCRITURA}")
+        cursor.execute(*consulta_exportacion(tipo, **filtros))
+        columnas = cursor.column_names
+        if formato == 'csv':
+            yield _bloque_csv([], columnas)
+        while True:
+            filas = cursor.fetchmany(tamano)
+            if not filas:
+                break
+            yield _bloque_csv(filas) if formato == 'csv' else _bloque_ndjson(columnas, filas)
+        completa = True
+    finally:
+        if completa:
+            cursor.execute("SET SESSION net_write_timeout = DEFAULT")
+            cursor.close()
+        else:
+            # Descarga interrumpida: quedan filas sin leer, que el rollback
+            # del pool o cursor.close() leerían enteras. La conexión se
+            # descarta en vez de volver al pool
+            conn.descartar()
+
+
+def codificar(fragmentos, comprimir=False):
+    """Codifica en UTF-8 y, con comprimir=True, genera un gzip al vuelo"""
+    if not comprimir:
+        for fragmento in fragmentos:
+            yield fragmento.encode('utf-8')
+        return
+    compresor = zlib.compressobj(6, zlib.DEFLATED, 31)  # 31: formato gzip
+    for fragmento in fragmentos:
+        comprimido = compresor.compress(fragmento.encode('utf-8'))
+        if comprimido:
+            yield comprimido
+    yield compresor.flush()
@@ -0,0 +1,147 @@
+# Flujo de caja del fondo por mes
+#
+# Para cada mes (AAAA-MM): capital e interés esperados según el plan de
+# cuotas de los préstamos (tabla cuotas_prestamo), pagos realizados según
+# pagos_prestamos y, desde el mes en curso, los ahorros proyectados (el
+# promedio mensual de ahorros validados de los últimos meses completos).
+#
+# Los acumulados se calculan con una consulta agregada por tabla y quedan
+# en memoria; la aprobación de un préstamo y el registro de un pago los
+# actualizan en el lugar, sin volver a consultar. El TTL limita cuánto
+# tarda otro proceso del servidor en ver los cambios.
+import os
+import threading
+import time
+from datetime import date
+from decimal import Decimal
+
+# Meses completos que se promedian para proyectar los ahorros
+MESES_PROMEDIO_AHORROS = int(os.getenv('FLUJO_CAJA_MESES_AHORROS', '6'))
+
+CONSULTA_CUOTAS_POR_MES = '''
+    SELECT DATE_FORMAT(fecha_vencimiento, '%Y-%m') AS mes,
+           SUM(capital) AS capital, SUM(interes) AS interes
+    FROM cuotas_prestamo
+    GROUP BY mes
+'''
+
+CONSULTA_PAGOS_POR_MES = '''
+    SELECT DATE_FORMAT(fecha, '%Y-%m') AS mes, SUM(monto) AS pagos
+    FROM pagos_prestamos
+    GROUP BY mes
+'''
+
+CONSULTA_AHORROS_VALIDADOS = '''
+    SELECT COALESCE(SUM(monto), 0) AS total
+    FROM ahorros
+    WHERE validado = 1 AND fecha >= %s AND fecha < %s
+'''
+
+
+def sumar_meses_clave(mes, meses):
+    """'AAAA-MM' desplazado `meses` meses"""
+    anio, numero = int(mes[:4]), int(mes[5:7])
+    indice = anio * 12 + numero - 1 + meses
+    return f"{indice // 12:04d}-{indice % 12 + 1:02d}"
+
+
+def clave_mes(fecha):
+    """'AAAA-MM' de una fecha o de un texto ISO ('2024-03-15T10:00')"""
+    return fecha[:7] if isinstance(fecha, str) else fecha.strftime('%Y-%m')
+
+
+def meses_entre(desde, hasta):
+    mes = desde
+    while mes <= hasta:
+        yield mes
+        mes = sumar_meses_clave(mes, 1)
+
+
+class FlujoCaja:
+    """
+    Acumulados mensuales del flujo de caja en memoria, seguros entre hilos.
+    Se cargan en la primera consulta y otra vez cuando vence el TTL o
+    después de invalidar().
+    """
+
+    def __init__(self, ttl=300):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._meses = {}
+        self._ahorros_mensuales = Decimal('0')
+        self._cargado_en = None
+        self._cambios = 0
+
+    def _vigente(self):
+        return self._cargado_en is not None and time.monotonic() - self._cargado_en < self.ttl
+
+    def cargar(self, cursor, hoy=None):
+        """Recalcula los acumulados con una consulta agregada por tabla"""
+        with self._lock:
+            cambios_al_empezar = self._cambios
+        meses = {}
+        cursor.execute(CONSULTA_CUOTAS_POR_MES)
+        for fila in cursor.fetchall():
+            meses.setdefault(fila['mes'], [Decimal('0')] * 3)[:2] = [fila['capital'], fila['interes']]
+        cursor.execute(CONSULTA_PAGOS_POR_MES)
+        for fila in cursor.fetchall():
+            meses.setdefault(fila['mes'], [Decimal('0')] * 3)[2] = fila['pagos']
+
+        mes_actual = clave_mes(hoy or date.today())
+        inicio = sumar_meses_clave(mes_actual, -MESES_PROMEDIO_AHORROS)
+        cursor.execute(CONSULTA_AHORROS_VALIDADOS, (f"{inicio}-01", f"{mes_actual}-01"))
+        ahorros = Decimal(cursor.fetchone()['total']) / MESES_PROMEDIO_AHORROS
+
+        with self._lock:
+            self._meses = meses
+            self._ahorros_mensuales = ahorros
+            # Si hubo cambios incrementales mientras se consultaba, la carga
+            # pudo incluirlos o no: queda vencida para la próxima consulta
+            self._cargado_en = time.monotonic() if self._cambios == cambios_al_empezar else None
+
+    def obtener(self, cursor, desde, hasta, hoy=None):
+        """Lista de meses entre `desde` y `hasta` ('AAAA-MM', inclusive)"""
+        with self._lock:
+            vigente = self._vigente()
+        if not vigente:
+            self.cargar(cursor, hoy)
+
+        mes_actual = clave_mes(hoy or date.today())
+        cero = [Decimal('0')] * 3
+        with self._lock:
+            resultado = []
+            for mes in meses_entre(desde, hasta):
+                capital, interes, pagos = self._meses.get(mes, cero)
+                resultado.append({
+                    'mes': mes,
+                    'capital_esperado': round(float(capital), 2),
+                    'interes_esperado': round(float(interes), 2),
+                    'total_esperado': round(float(capital + interes), 2),
+                    'pagos_realizados': round(float(pagos), 2),
+                    'ahorros_proyectados': round(float(self._ahorros_mensuales), 2) if mes >= mes_actual else None,
+                })
+            return resultado
+
+    def sumar_cuotas(self, cuotas):
+        """Agrega las cuotas (fecha_vencimiento, capital, interes) de un préstamo recién aprobado"""
+        with self._lock:
+            self._cambios += 1
+            if self._cargado_en is None:
+                return
+            for cuota in cuotas:
+                acumulado = self._meses.setdefault(clave_mes(cuota['fecha_vencimiento']), [Decimal('0')] * 3)
+                acumulado[0] += Decimal(cuota['capital'])
+                acumulado[1] += Decimal(cuota['interes'])
+
+    def sumar_pago(self, fecha, monto):
+        with self._lock:
+            self._cambios += 1
+            if self._cargado_en is None:
+                return
+            acumulado = self._meses.setdefault(clave_mes(fecha), [Decimal('0')] * 3)
+            acumulado[2] += Decimal(str(monto))
+
+    def invalidar(self):
+        with self._lock:
+            self._cambios += 1
+            self._cargado_en = None
@@ -0,0 +1,109 @@
+# Importaciones idempotentes de ahorros
+#
+# Cada archivo cargado se registra en la tabla importaciones con el SHA-256
+# de su contenido; un índice único sobre (tipo, hash_contenido) rechaza el
+# mismo archivo subido dos veces. Cada ahorro importado lleva además una
+# clave de fila determinista (usuario, monto, fecha y línea del archivo; sin
+# fecha, el hash del archivo en lugar de la fecha) con un índice único en
+# ahorros.clave_fila, así que las filas ya importadas se detectan con
+# búsquedas por índice, sin recorrer la tabla.
+import hashlib
+from decimal import ROUND_HALF_UP, Decimal
+
+CREAR_TABLA_IMPORTACIONES = '''
+CREATE TABLE IF NOT EXISTS importaciones (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    tipo VARCHAR(30) NOT NULL,
+    hash_contenido CHAR(64) NOT NULL,
+    trabajo_id INT DEFAULT NULL,
+    filas_creadas INT NOT NULL DEFAULT 0,
+    filas_omitidas INT NOT NULL DEFAULT 0,
+    fecha_importacion DATETIME DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE KEY uk_importaciones_tipo_hash (tipo, hash_contenido),
+    FOREIGN KEY (trabajo_id) REFERENCES trabajos_carga(id) ON DELETE SET NULL
+)
+'''
+
+# Columnas agregadas a ahorros por la migración 11 (NULL en los ahorros
+# registrados uno por uno)
+COLUMNAS_IMPORTACION_AHORROS = {
+    'importacion_id': "INT DEFAULT NULL",
+    'clave_fila': "CHAR(64) DEFAULT NULL",
+}
+
+# Expresión SQL equivalente a clave_fila() para la carga con tabla temporal
+# (ver carga_masiva.cargar_ahorros_staging); el parámetro es el hash del archivo
+CLAVE_FILA_SQL = ("SHA2(CONCAT_WS('|', u.id, CAST(s.monto_texto AS DECIMAL(10, 2)), "
+                  "IF(s.fecha_texto = '', CONCAT('archivo:', %s), s.fecha_texto), s.linea), 256)")
+
+BLOQUE_LECTURA = 1024 * 1024
+
+
+class ArchivoYaImportado(Exception):
+    """El mismo contenido ya se importó; `importacion` es la fila previa"""
+
+    def __init__(self, importacion):
+        super().__init__(f"Archivo ya importado (importación #{importacion['id']})")
+        self.importacion = importacion
+
+
+def hash_contenido(archivo):
+    """SHA-256 del archivo abierto en modo binario, leído por bloques"""
+    archivo.seek(0)
+    resumen = hashlib.sha256()
+    for bloque in iter(lambda: archivo.read(BLOQUE_LECTURA), b''):
+        resumen.update(bloque)
+    archivo.seek(0)
+    return resumen.hexdigest()
+
+
+def clave_fila(usuario_id, monto, fecha, linea, hash_archivo):
+    """
+    Clave determinista de un ahorro importado. El monto se redondea como
+    DECIMAL(10, 2) de MySQL para coincidir con CLAVE_FILA_SQL.
+    Sin fecha, el ahorro se guarda con la fecha de la importación: la clave
+    lleva el hash del archivo en su lugar, para que la misma fila en otro
+    archivo (p. ej. la nómina del mes siguiente) no se tome por importada.
+    """
+    monto = Decimal(str(monto)).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+    texto = f"{usuario_id}|{monto}|{fecha or 'archivo:' + hash_archivo}|{linea}"
+    return hashlib.sha256(texto.encode('utf-8')).hexdigest()
+
+
+def buscar_importacion(cursor, tipo, hash_archivo):
+    cursor.execute('''
+        SELECT id, fecha_importacion FROM importaciones
+        WHERE tipo = %s AND hash_contenido = %s
+    ''', (tipo, hash_archivo))
+    fila = cursor.fetchone()
+    if fila and not isinstance(fila, dict):
+        fila = dict(zip(('id', 'fecha_importacion'), fila))
+    return fila
+
+
+def registrar_importacion(cursor, tipo, hash_archivo, trabajo_id=None):
+    """
+    Registra la importación en la transacción del llamador y retorna su id.
+    Lanza ArchivoYaImportado si el contenido ya se importó; si otra carga
+    del mismo archivo está en curso, el índice único espera a que termine.
+    """
+    previa = buscar_importacion(cursor, tipo, hash_archivo)
+    if previa:
+        raise ArchivoYaImportado(previa)
+    try:
+        cursor.execute('''
+            INSERT INTO importaciones (tipo, hash_contenido, trabajo_id)
+            VALUES (%s, %s, %s)
+        ''', (tipo, hash_archivo, trabajo_id))
+    except Exception as e:
+        if getattr(e, 'errno', None) == 1062:  # Entrada duplicada
+            raise ArchivoYaImportado(buscar_importacion(cursor, tipo, hash_archivo)) from e
+        raise
+    return cursor.lastrowid
+
+
+def finalizar_importacion(cursor, importacion_id, filas_creadas, filas_omitidas):
+    cursor.execute('''
+        UPDATE importaciones SET filas_creadas = %s, filas_omitidas = %s
+        WHERE id = %s
+    ''', (filas_creadas, filas_omitidas, importacion_id))
@@ -0,0 +1,426 @@
+# Migraciones versionadas del esquema de la base de datos SparFonds
+#
+# Cada migración tiene un número de versión y se aplica una sola vez; la
+# tabla schema_version registra las versiones aplicadas. Todas las
+# migraciones son idempotentes (verifican information_schema antes de
+# modificar), así que volver a ejecutarlas sobre una base parcialmente
+# migrada es seguro.
+#
+# Uso:
+#   python migraciones.py            Aplica las migraciones pendientes
+#   python migraciones.py --estado   Muestra la versión actual del esquema
+import sys
+import os
+
+import mysql.connector
+
+from cuotas import CREAR_TABLA_CUOTAS, generar_cuotas
+from mora import CREAR_TABLA_MORA
+from saldos import CREAR_TABLA_SALDOS, reconstruir_saldos
+from importaciones import COLUMNAS_IMPORTACION_AHORROS, CREAR_TABLA_IMPORTACIONES
+from trabajos import COLUMNAS_CONFIRMACION, COLUMNAS_MODO, CREAR_TABLA_TRABAJOS
+
+# Filas por lote en los rellenos de datos (cada lote es una transacción corta)
+TAMANO_LOTE = 5000
+
+# Cláusula para que ALTER TABLE no bloquee lecturas ni escrituras
+EN_LINEA = "ALGORITHM=INPLACE, LOCK=NONE"
+
+# Índices de la migración 8 por tabla; explain_consultas.py compara los
+# planes con y sin ellos
+INDICES_CONSULTAS_FRECUENTES = {
+    'ahorros': {
+        # Últimos ahorros registrados (admin_ahorros)
+        'idx_ahorros_fecha': ['fecha'],
+        # Ahorros pendientes de validación (admin)
+        'idx_ahorros_validado_fecha': ['validado', 'fecha'],
+        # Sumas por usuario y estado de validación: índice de cobertura
+        'idx_ahorros_usuario_validado_monto': ['usuario_id', 'validado', 'monto'],
+        # Historial de ahorros de un usuario ordenado por fecha
+        'idx_ahorros_usuario_fecha': ['usuario_id', 'fecha'],
+    },
+    'usuarios': {
+        # Selectores de ahorradores ordenados por nombre
+        'idx_usuarios_nombre': ['nombre'],
+        # Listado de usuarios del panel de administración
+        'idx_usuarios_fecha_registro': ['fecha_registro'],
+    },
+    'prestamos': {
+        # Préstamos de un usuario ordenados por fecha de solicitud
+        'idx_prestamos_usuario_fecha': ['usuario_id', 'fecha_solicitud'],
+    },
+    'pagos_prestamos': {
+        # Pagos de un préstamo ordenados por fecha
+        'idx_pagos_prestamo_fecha': ['prestamo_id', 'fecha'],
+    },
+}
+
+CREAR_TABLA_VERSION = '''
+CREATE TABLE IF NOT EXISTS schema_version (
+    version INT PRIMARY KEY,
+    descripcion VARCHAR(255) NOT NULL,
+    fecha_aplicacion DATETIME DEFAULT CURRENT_TIMESTAMP
+)
+'''
+
+# Funciones auxiliares
+
+def tabla_existe(cursor, tabla):
+    cursor.execute("""
+        SELECT 1 FROM information_schema.tables
+        WHERE table_schema = DATABASE() AND table_name = %s
+    """, (tabla,))
+    return cursor.fetchone() is not None
+
+def columnas_existentes(cursor, tabla):
+    cursor.execute("""
+        SELECT column_name FROM information_schema.columns
+        WHERE table_schema = DATABASE() AND table_name = %s
+    """, (tabla,))
+    return {fila[0].lower() for fila in cursor.fetchall()}
+
+def indices_existentes(cursor, tabla):
+    """Retorna {nombre_indice: (columna1, columna2, ...)}"""
+    cursor.execute("""
+        SELECT index_name, column_name FROM information_schema.statistics
+        WHERE table_schema = DATABASE() AND table_name = %s
+        ORDER BY index_name, seq_in_index
+    """, (tabla,))
+    indices = {}
+    for nombre, columna in cursor.fetchall():
+        indices.setdefault(nombre.lower(), []).append(columna.lower())
+    return {nombre: tuple(columnas) for nombre, columnas in indices.items()}
+
+def agregar_columnas(cursor, tabla, columnas):
+    """
+    Agrega en un solo ALTER TABLE (en línea) las columnas que falten.
+    columnas: diccionario nombre -> definición SQL
+    """
+    existentes = columnas_existentes(cursor, tabla)
+    faltantes = [f"ADD COLUMN {nombre} {definicion}"
+                 for nombre, definicion in columnas.items() if nombre.lower() not in existentes]
+    if faltantes:
+        cursor.execute(f"ALTER TABLE {tabla} {', '.join(faltantes)}, {EN_LINEA}")
+        print(f"  ✓ {tabla}: {len(faltantes)} columnas agregadas")
+
+def agregar_indices(cursor, tabla, indices, unicos=False):
+    """
+    Agrega en un solo ALTER TABLE (en línea) los índices que falten.
+    indices: diccionario nombre -> lista de columnas. Un índice se
+    considera existente si ya hay uno con el mismo nombre o las mismas
+    columnas en el mismo orden. Con unicos=True se crean UNIQUE.
+    """
+    existentes = indices_existentes(cursor, tabla)
+    columnas_existentes_idx = set(existentes.values())
+    faltantes = []
+    for nombre, columnas in indices.items():
+        if nombre.lower() in existentes or tuple(c.lower() for c in columnas) in columnas_existentes_idx:
+            continue
+        faltantes.append(f"ADD {'UNIQUE ' if unicos else ''}INDEX {nombre} ({', '.join(columnas)})")
+    if faltantes:
+        cursor.execute(f"ALTER TABLE {tabla} {', '.join(faltantes)}, {EN_LINEA}")
+        print(f"  ✓ {tabla}: {len(faltantes)} índices agregados")
+
+def actualizar_en_lotes(conn, cursor, tabla, sentencia, parametros_por_lote):
+    """
+    Ejecuta `sentencia` por rangos de id de `tabla`, con un commit por lote.
+    parametros_por_lote(desde, hasta) retorna los parámetros de cada rango.
+    """
+    cursor.execute(f"SELECT MIN(id), MAX(id) FROM {tabla}")
+    minimo, maximo = cursor.fetchone()
+    if minimo is None:
+        return 0
+    total = 0
+    for desde in range(minimo, maximo + 1, TAMANO_LOTE):
+        cursor.execute(sentencia, parametros_por_lote(desde, desde + TAMANO_LOTE - 1))
+        total += cursor.rowcount
+        conn.commit()
+    return total
+
+# Migraciones
+
+def m001_tablas_base(conn, cursor):
+    # Tabla de usuarios
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS usuarios (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        nombre VARCHAR(100) NOT NULL,
+        apellido VARCHAR(100) NOT NULL,
+        cedula VARCHAR(20) UNIQUE NOT NULL,
+        fecha_nacimiento DATE NOT NULL,
+        direccion VARCHAR(255) NOT NULL,
+        telefono VARCHAR(20) NOT NULL,
+        email VARCHAR(100) UNIQUE NOT NULL,
+        password VARCHAR(255) NOT NULL,
+        rol ENUM('admin', 'ahorrador') DEFAULT 'ahorrador',
+        fecha_registro DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+
+    # Tabla de ahorros
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS ahorros (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        usuario_id INT NOT NULL,
+        monto DECIMAL(10, 2) NOT NULL,
+        fecha DATETIME DEFAULT CURRENT_TIMESTAMP,
+        validado BOOLEAN DEFAULT 0,
+        FOREIGN KEY (usuario_id) REFERENCES usuarios(id)
+    )
+    ''')
+
+    # Tabla de préstamos
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS prestamos (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        usuario_id INT NOT NULL,
+        monto DECIMAL(10, 2) NOT NULL,
+        tasa_interes DECIMAL(5, 2) NOT NULL,
+        plazo_meses INT NOT NULL,
+        fecha_solicitud DATETIME DEFAULT CURRENT_TIMESTAMP,
+        estado ENUM('pendiente', 'aprobado', 'rechazado', 'pagado') DEFAULT 'pendiente',
+        FOREIGN KEY (usuario_id) REFERENCES usuarios(id)
+    )
+    ''')
+
+    # Tabla de pagos de préstamos
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS pagos_prestamos (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        prestamo_id INT NOT NULL,
+        monto DECIMAL(10, 2) NOT NULL,
+        fecha DATETIME DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (prestamo_id) REFERENCES prestamos(id)
+    )
+    ''')
+
+def m002_columnas_heredadas(conn, cursor):
+    # Bases creadas antes de los campos de perfil, el rol y la validación de ahorros
+    # (antes actualizar_usuarios.py, actualizar_db.sql y actualizar_ahorros.py)
+    agregar_columnas(cursor, 'usuarios', {
+        'cedula': "VARCHAR(20)",
+        'fecha_nacimiento': "DATE",
+        'direccion': "VARCHAR(255)",
+        'telefono': "VARCHAR(20)",
+        'rol': "ENUM('admin', 'ahorrador') DEFAULT 'ahorrador'",
+    })
+    if ('cedula',) not in indices_existentes(cursor, 'usuarios').values():
+        cursor.execute(f"ALTER TABLE usuarios ADD UNIQUE INDEX idx_cedula (cedula), {EN_LINEA}")
+    agregar_columnas(cursor, 'ahorros', {'validado': "BOOLEAN DEFAULT 0"})
+
+def m003_prestamos_tasa_plazo_opcionales(conn, cursor):
+    # La tasa y el plazo se fijan al aprobar el préstamo
+    # (antes actualizar_prestamos.py, corregir_tasa_interes.py y corregir_plazo_meses.py)
+    cursor.execute("""
+        SELECT column_name FROM information_schema.columns
+        WHERE table_schema = DATABASE() AND table_name = 'prestamos'
+          AND column_name IN ('tasa_interes', 'plazo_meses') AND is_nullable = 'NO'
+    """)
+    obligatorias = {fila[0].lower() for fila in cursor.fetchall()}
+    cambios = []
+    if 'tasa_interes' in obligatorias:
+        cambios.append("MODIFY COLUMN tasa_interes DECIMAL(5, 2) NULL")
+    if 'plazo_meses' in obligatorias:
+        cambios.append("MODIFY COLUMN plazo_meses INT NULL")
+    if cambios:
+        cursor.execute(f"ALTER TABLE prestamos {', '.join(cambios)}")
+
+def m004_interes_simple(conn, cursor):
+    # Sistema de interés simple anualizado (antes actualizar_interes_simple.py)
+    agregar_columnas(cursor, 'prestamos', {
+        'interes_mensual_fijo': "DECIMAL(10, 2) DEFAULT NULL COMMENT 'Interés mensual fijo calculado sobre el monto inicial'",
+        'cuota_capital_mensual': "DECIMAL(10, 2) DEFAULT NULL COMMENT 'Cuota de capital mensual (monto/plazo)'",
+    })
+    agregar_indices(cursor, 'prestamos', {
+        'idx_prestamos_estado': ['estado'],
+        'idx_prestamos_usuario_estado': ['usuario_id', 'estado'],
+    })
+    actualizar_en_lotes(conn, cursor, 'prestamos', """
+        UPDATE prestamos
+        SET interes_mensual_fijo = monto * (tasa_interes / 100) / 12,
+            cuota_capital_mensual = monto / plazo_meses
+        WHERE id BETWEEN %s AND %s
+          AND estado = 'aprobado' AND tasa_interes IS NOT NULL AND plazo_meses > 0
+          AND interes_mensual_fijo IS NULL
+    """, lambda desde, hasta: (desde, hasta))
+
+def m005_saldos_usuario(conn, cursor):
+    # Saldos precalculados por usuario
+    cursor.execute(CREAR_TABLA_SALDOS)
+    cursor.execute("SELECT 1 FROM saldos_usuario LIMIT 1")
+    if not cursor.fetchall():
+        print(f"  ✓ Saldos de usuario inicializados: {reconstruir_saldos(cursor)} filas")
+
+def m006_saldo_prestamos(conn, cursor):
+    # Acumulados de pagos en la fila del préstamo
+    agregar_columnas(cursor, 'prestamos', {
+        'total_pagado': "DECIMAL(10, 2) NOT NULL DEFAULT 0 COMMENT 'Suma de pagos registrados en pagos_prestamos'",
+        'saldo_pendiente': "DECIMAL(10, 2) NOT NULL DEFAULT 0 COMMENT 'monto - total_pagado'",
+        'ultimo_pago_fecha': "DATETIME DEFAULT NULL COMMENT 'Fecha del pago más reciente'",
+    })
+    filas = actualizar_en_lotes(conn, cursor, 'prestamos', """
+        UPDATE prestamos p
+        LEFT JOIN (
+            SELECT prestamo_id, SUM(monto) AS total, MAX(fecha) AS ultima
+            FROM pagos_prestamos
+            WHERE prestamo_id BETWEEN %s AND %s
+            GROUP BY prestamo_id
+        ) pp ON pp.prestamo_id = p.id
+        SET p.total_pagado = COALESCE(pp.total, 0),
+            p.saldo_pendiente = p.monto - COALESCE(pp.total, 0),
+            p.ultimo_pago_fecha = pp.ultima
+        WHERE p.id BETWEEN %s AND %s
+    """, lambda desde, hasta: (desde, hasta, desde, hasta))
+    print(f"  ✓ Saldos calculados para {filas} préstamos")
+
+def m007_indice_pagos_fecha(conn, cursor):
+    # Listado de los pagos más recientes en /admin/pagos_prestamos
+    agregar_indices(cursor, 'pagos_prestamos', {'idx_pagos_fecha': ['fecha']})
+
+def m008_indices_consultas_frecuentes(conn, cursor):
+    # Índices compuestos para las consultas frecuentes de app.py
+    # (ver EXPLAIN_CONSULTAS.md y explain_consultas.py)
+    for tabla, indices in INDICES_CONSULTAS_FRECUENTES.items():
+        agregar_indices(cursor, tabla, indices)
+
+def m009_trabajos_carga(conn, cursor):
+    # Trabajos en segundo plano de las cargas masivas
+    cursor.execute(CREAR_TABLA_TRABAJOS)
+
+def m010_vista_previa_cargas(conn, cursor):
+    # Modo de los trabajos de carga y resumen de la vista previa
+    agregar_columnas(cursor, 'trabajos_carga', COLUMNAS_MODO)
+
+def m011_importaciones_idempotentes(conn, cursor):
+    # Huella de cada archivo importado y clave única por ahorro importado
+    # (ver importaciones.py). Los ahorros existentes quedan con clave NULL,
+    # que el índice único admite repetida
+    cursor.execute(CREAR_TABLA_IMPORTACIONES)
+    agregar_columnas(cursor, 'ahorros', COLUMNAS_IMPORTACION_AHORROS)
+    agregar_indices(cursor, 'ahorros', {'uk_ahorros_clave_fila': ['clave_fila']}, unicos=True)
+    agregar_indices(cursor, 'ahorros', {'idx_ahorros_importacion': ['importacion_id']})
+
+def m012_cuotas_prestamo(conn, cursor):
+    # Plan de cuotas de cada préstamo (ver cuotas.py), generado para los
+    # préstamos ya aprobados o pagados que todavía no lo tienen
+    cursor.execute(CREAR_TABLA_CUOTAS)
+    ultimo_id = 0
+    total = 0
+    while True:
+        cursor.execute("""
+            SELECT p.id, p.monto, p.tasa_interes, p.plazo_meses, p.fecha_solicitud
+            FROM prestamos p
+            WHERE p.id > %s AND p.estado IN ('aprobado', 'pagado') AND p.plazo_meses > 0
+              AND NOT EXISTS (SELECT 1 FROM cuotas_prestamo c WHERE c.prestamo_id = p.id)
+            ORDER BY p.id
+            LIMIT %s
+        """, (ultimo_id, TAMANO_LOTE))
+        prestamos = cursor.fetchall()
+        if not prestamos:
+            break
+        total += generar_cuotas(cursor, prestamos)
+        conn.commit()
+        ultimo_id = prestamos[-1][0]
+    print(f"  ✓ Cuotas generadas: {total}")
+
+def m013_mora_prestamos(conn, cursor):
+    # Fotos diarias de mora de los préstamos (ver mora.py y calcular_mora.py)
+    cursor.execute(CREAR_TABLA_MORA)
+
+def m014_confirmacion_vista_previa(conn, cursor):
+    # Una vista previa se confirma una sola vez (ver confirmar_vista_previa en app.py)
+    agregar_columnas(cursor, 'trabajos_carga', COLUMNAS_CONFIRMACION)
+
+# Lista ordenada de migraciones: (versión, descripción, función)
+MIGRACIONES = [
+    (1, 'Tablas base', m001_tablas_base),
+    (2, 'Columnas heredadas de usuarios y ahorros', m002_columnas_heredadas),
+    (3, 'Tasa y plazo de préstamos opcionales', m003_prestamos_tasa_plazo_opcionales),
+    (4, 'Interés simple anualizado', m004_interes_simple),
+    (5, 'Tabla saldos_usuario', m005_saldos_usuario),
+    (6, 'total_pagado, saldo_pendiente y ultimo_pago_fecha en prestamos', m006_saldo_prestamos),
+    (7, 'Índice de pagos por fecha', m007_indice_pagos_fecha),
+    (8, 'Índices para consultas frecuentes', m008_indices_consultas_frecuentes),
+    (9, 'Tabla trabajos_carga', m009_trabajos_carga),
+    (10, 'Vista previa de cargas masivas', m010_vista_previa_cargas),
+    (11, 'Importaciones idempotentes de ahorros', m011_importaciones_idempotentes),
+    (12, 'Plan de cuotas de préstamos', m012_cuotas_prestamo),
+    (13, 'Fotos diarias de mora de préstamos', m013_mora_prestamos),
+    (14, 'Confirmación de vistas previas de carga', m014_confirmacion_vista_previa),
+]
+
+ULTIMA_VERSION = MIGRACIONES[-1][0]
+
+# Ejecución
+
+def version_actual(cursor):
+    """Versión aplicada del esquema; None si la tabla schema_version no existe"""
+    try:
+        cursor.execute("SELECT MAX(version) FROM schema_version")
+    except mysql.connector.Error as err:
+        if err.errno == 1146:  # 1146: la tabla no existe
+            return None
+        raise
+    return cursor.fetchone()[0] or 0
+
+def migrar(conn):
+    """
+    Aplica las migraciones pendientes y retorna cuántas se aplicaron.
+    Si el esquema está al día solo cuesta una consulta.
+    """
+    cursor = conn.cursor()
+    try:
+        if version_actual(cursor) == ULTIMA_VERSION:
+            return 0
+
+        # Evitar que dos procesos migren a la vez
+        cursor.execute("SELECT GET_LOCK('sparfonds_migraciones', 300)")
+        if cursor.fetchone()[0] != 1:
+            raise RuntimeError("No se pudo obtener el bloqueo de migraciones")
+        try:
+            cursor.execute(CREAR_TABLA_VERSION)
+            actual = version_actual(cursor)
+            aplicadas = 0
+            for version, descripcion, funcion in MIGRACIONES:
+                if version <= actual:
+                    continue
+                print(f"Aplicando migración {version}: {descripcion}")
+                funcion(conn, cursor)
+                cursor.execute("INSERT INTO schema_version (version, descripcion) VALUES (%s, %s)",
+                               (version, descripcion))
+                conn.commit()
+                aplicadas += 1
+            return aplicadas
+        finally:
+            cursor.execute("SELECT RELEASE_LOCK('sparfonds_migraciones')")
+            cursor.fetchall()
+    finally:
+        cursor.close()
+
+if __name__ == "__main__":
+    # Añadir el directorio actual al path para poder importar desde app.py
+    sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+    from app import get_db_connection
+
+    conn = get_db_connection()
+    if not conn:
+        print("Error: No se pudo conectar a la base de datos.")
+        sys.exit(1)
+
+    try:
+        if "--estado" in sys.argv:
+            cursor = conn.cursor()
+            actual = version_actual(cursor) or 0
+            cursor.close()
+            print(f"Versión del esquema: {actual} (última disponible: {ULTIMA_VERSION})")
+            for version, descripcion, _ in MIGRACIONES:
+                marca = "✓" if version <= actual else " "
+                print(f"  [{marca}] {version:03d} {descripcion}")
+        else:
+            aplicadas = migrar(conn)
+            print(f"✅ Esquema en la versión {ULTIMA_VERSION} ({aplicadas} migraciones aplicadas)")
+    except Exception as e:
+        print(f"❌ Error durante la migración: {e}")
+        sys.exit(1)
+    finally:
+        conn.close()
@@ -0,0 +1,196 @@
+# Mora de los préstamos aprobados (tabla mora_prestamos)
+#
+# Para todos los préstamos a la vez se compara lo que se esperaba cobrar a
+# la fecha de corte (la cuota acumulada de la última cuota vencida, según
+# cuotas_prestamo) con lo realmente pagado (suma de pagos_prestamos, en una
+# consulta agrupada). La comparación se hace sobre vectores NumPy, con un
+# elemento por préstamo y otro por cuota vencida: monto en atraso, días
+# desde la primera cuota no cubierta, cuotas vencidas y tramo (1-30, 31-60,
+# 61-90 y más de 90 días).
+#
+# El resultado se guarda como foto diaria en mora_prestamos (ver
+# calcular_mora.py, pensado para ejecutarse cada noche), así el reporte de
+# mora lee una tabla ya calculada.
+import os
+from datetime import date
+
+import numpy as np
+
+from amortizacion import a_centavos
+from carga_masiva import TAMANO_LOTE, en_bloques
+
+# Días de fotos de mora que se conservan
+DIAS_HISTORIAL_MORA = int(os.getenv('MORA_DIAS_HISTORIAL', '90'))
+
+# Tramos de antigüedad: límite inferior de días de atraso de cada uno
+TRAMOS = ('al_dia', '1-30', '31-60', '61-90', '90+')
+LIMITES_TRAMOS = (1, 31, 61, 91)
+
+CREAR_TABLA_MORA = '''
+CREATE TABLE IF NOT EXISTS mora_prestamos (
+    fecha_corte DATE NOT NULL,
+    prestamo_id INT NOT NULL,
+    usuario_id INT NOT NULL,
+    esperado DECIMAL(12, 2) NOT NULL,
+    pagado DECIMAL(12, 2) NOT NULL,
+    monto_atraso DECIMAL(12, 2) NOT NULL,
+    dias_atraso INT NOT NULL,
+    cuotas_vencidas INT NOT NULL,
+    tramo VARCHAR(10) NOT NULL,
+    PRIMARY KEY (fecha_corte, prestamo_id),
+    KEY idx_mora_fecha_tramo (fecha_corte, tramo),
+    FOREIGN KEY (prestamo_id) REFERENCES prestamos(id) ON DELETE CASCADE
+)
+'''
+
+# Pagos realizados por préstamo aprobado, en una consulta agrupada
+CONSULTA_PAGADO_POR_PRESTAMO = '''
+    SELECT p.id, p.usuario_id, COALESCE(SUM(pp.monto), 0) AS pagado
+    FROM prestamos p
+    LEFT JOIN pagos_prestamos pp ON pp.prestamo_id = p.id
+    WHERE p.estado = 'aprobado'
+    GROUP BY p.id, p.usuario_id
+    ORDER BY p.id
+'''
+
+# Cuotas vencidas a la fecha de corte de los préstamos aprobados; la cuota
+# que vence ese mismo día todavía puede pagarse y no cuenta
+CONSULTA_CUOTAS_VENCIDAS = '''
+    SELECT c.prestamo_id, c.fecha_vencimiento, c.cuota_acumulada
+    FROM cuotas_prestamo c
+    JOIN prestamos p ON p.id = c.prestamo_id
+    WHERE p.estado = 'aprobado' AND c.fecha_vencimiento < %s
+'''
+
+
+def calcular_mora(prestamos, cuotas, fecha_corte):
+    """
+    prestamos: (ids ordenados, usuario_ids, pagado) con un elemento por préstamo
+    cuotas: (prestamo_ids, fechas_vencimiento, cuotas_acumuladas) de las
+    cuotas vencidas, en cualquier orden; las que vencen en `fecha_corte` o
+    después se ignoran
+    Retorna un diccionario de vectores: esperado y pagado (centavos),
+    monto_atraso (centavos), dias_atraso, cuotas_vencidas y tramo (índice
+    en TRAMOS).
+    """
+    ids, _, pagado = prestamos
+    ids = np.asarray(ids, dtype=np.int64)
+    pagado = a_centavos(pagado) if len(ids) else np.zeros(0, dtype=np.int64)
+    cuota_ids, vencimientos, acumuladas = cuotas
+    cuota_ids = np.asarray(cuota_ids, dtype=np.int64)
+    acumuladas = a_centavos(acumuladas) if len(cuota_ids) else np.zeros(0, dtype=np.int64)
+    vencimientos = np.asarray([fecha.toordinal() for fecha in vencimientos], dtype=np.int64)
+
+    # Posición de cada cuota en el vector de préstamos (se descartan las de
+    # préstamos que no están en `prestamos` y las todavía no vencidas)
+    posiciones = np.searchsorted(ids, cuota_ids)
+    validas = posiciones < len(ids)
+    validas[validas] = ids[posiciones[validas]] == cuota_ids[validas]
+    validas &= vencimientos < fecha_corte.toordinal()
+    posiciones, vencimientos, acumuladas = posiciones[validas], vencimientos[validas], acumuladas[validas]
+
+    # Lo esperado a la fecha es la mayor cuota acumulada vencida
+    esperado = np.zeros(len(ids), dtype=np.int64)
+    np.maximum.at(esperado, posiciones, acumuladas)
+    monto_atraso = np.maximum(esperado - pagado, 0)
+
+    # Cuotas vencidas no cubiertas por lo pagado y la más antigua de ellas
+    no_cubiertas = acumuladas > pagado[posiciones]
+    cuotas_vencidas = np.bincount(posiciones[no_cubiertas], minlength=len(ids))
+    primera = np.full(len(ids), fecha_corte.toordinal(), dtype=np.int64)
+    np.minimum.at(primera, posiciones[no_cubiertas], vencimientos[no_cubiertas])
+    dias_atraso = np.where(monto_atraso > 0, fecha_corte.toordinal() - primera, 0)
+
+    return {
+        'esperado': esperado,
+        'pagado': pagado,
+        'monto_atraso': monto_atraso,
+        'dias_atraso': dias_atraso,
+        'cuotas_vencidas': cuotas_vencidas,
+        'tramo': np.digitize(dias_atraso, LIMITES_TRAMOS),
+    }
+
+
+def leer_prestamos_y_cuotas(cursor, fecha_corte):
+    """Lee los vectores de entrada de calcular_mora() con dos consultas"""
+    cursor.execute(CONSULTA_PAGADO_POR_PRESTAMO)
+    filas = cursor.fetchall()
+    prestamos = tuple(zip(*filas)) if filas else ((), (), ())
+    cursor.execute(CONSULTA_CUOTAS_VENCIDAS, (fecha_corte,))
+    filas = cursor.fetchall()
+    cuotas = tuple(zip(*filas)) if filas else ((), (), ())
+    return prestamos, cuotas
+
+
+def guardar_foto_mora(cursor, fecha_corte=None, tamano_lote=TAMANO_LOTE):
+    """
+    Calcula la mora a `fecha_corte` (hoy por defecto) y reemplaza la foto
+    de ese día en mora_prestamos. Borra las fotos de más de
+    DIAS_HISTORIAL_MORA días. Retorna la cantidad de préstamos en mora.
+    """
+    fecha_corte = fecha_corte or date.today()
+    prestamos, cuotas = leer_prestamos_y_cuotas(cursor, fecha_corte)
+    mora = calcular_mora(prestamos, cuotas, fecha_corte)
+
+    cursor.execute("DELETE FROM mora_prestamos WHERE fecha_corte = %s", (fecha_corte,))
+    columnas = [mora[clave].tolist() for clave in
+                ('esperado', 'pagado', 'monto_atraso', 'dias_atraso', 'cuotas_vencidas', 'tramo')]
+    filas = (
+        (fecha_corte, prestamo_id, usuario_id, esperado / 100, pagado / 100, atraso / 100, dias, vencidas, TRAMOS[tramo])
+        for prestamo_id, usuario_id, esperado, pagado, atraso, dias, vencidas, tramo
+        in zip(prestamos[0], prestamos[1], *columnas)
+    )
+    for lote in en_bloques(filas, tamano_lote):
+        cursor.executemany('''
+            INSERT INTO mora_prestamos
+                (fecha_corte, prestamo_id, usuario_id, esperado, pagado, monto_atraso,
+                 dias_atraso, cuotas_vencidas, tramo)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+        ''', lote)
+    cursor.execute("DELETE FROM mora_prestamos WHERE fecha_corte < %s - INTERVAL %s DAY",
+                   (fecha_corte, DIAS_HISTORIAL_MORA))
+    return int(np.count_nonzero(mora['tramo']))
+
+
+# Reporte de mora sobre la última foto
+
+# Préstamos en mora mostrados como máximo en el reporte
+MAXIMO_FILAS_REPORTE = 1000
+
+
+def ultima_fecha_corte(cursor):
+    cursor.execute("SELECT MAX(fecha_corte) AS fecha_corte FROM mora_prestamos")
+    fila = cursor.fetchone()
+    return fila['fecha_corte'] if fila else None
+
+
+def resumen_tramos(cursor, fecha_corte):
+    """Cantidad de préstamos y monto en atraso por tramo, en el orden de TRAMOS"""
+    cursor.execute('''
+        SELECT tramo, COUNT(*) AS prestamos, SUM(monto_atraso) AS monto_atraso
+        FROM mora_prestamos
+        WHERE fecha_corte = %s
+        GROUP BY tramo
+    ''', (fecha_corte,))
+    por_tramo = {fila['tramo']: fila for fila in cursor.fetchall()}
+    return [{
+        'tramo': tramo,
+        'prestamos': por_tramo.get(tramo, {}).get('prestamos', 0),
+        'monto_atraso': float(por_tramo.get(tramo, {}).get('monto_atraso') or 0),
+    } for tramo in TRAMOS]
+
+
+def prestamos_en_mora(cursor, fecha_corte, tramo=None, limite=MAXIMO_FILAS_REPORTE):
+    """Préstamos con atraso en la foto, los más atrasados primero"""
+    condicion = "AND m.tramo = %s" if tramo else "AND m.tramo <> 'al_dia'"
+    parametros = (fecha_corte, tramo, limite) if tramo else (fecha_corte, limite)
+    cursor.execute(f'''
+        SELECT m.*, p.monto, u.nombre, u.apellido, u.email
+        FROM mora_prestamos m
+        JOIN prestamos p ON p.id = m.prestamo_id
+        JOIN usuarios u ON u.id = m.usuario_id
+        WHERE m.fecha_corte = %s {condicion}
+        ORDER BY m.dias_atraso DESC, m.monto_atraso DESC
+        LIMIT %s
+    ''', parametros)
+    return cursor.fetchall()
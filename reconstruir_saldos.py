@@ -0,0 +1,46 @@
+# Script para recalcular desde cero la tabla saldos_usuario
+# Uso:
+#   python reconstruir_saldos.py              Recalcula toda la tabla
+#   python reconstruir_saldos.py --verificar  Solo reporta los usuarios con saldos desfasados
+import sys
+import os
+
+# Añadir el directorio actual al path para poder importar desde app.py
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import get_db_connection
+from saldos import reconstruir_saldos, verificar_saldos
+
+def ejecutar(solo_verificar=False):
+    conn = get_db_connection()
+    if not conn:
+        print("Error: No se pudo conectar a la base de datos.")
+        return False
+    
+    cursor = conn.cursor()
+    try:
+        desfasados = verificar_saldos(cursor)
+        if desfasados:
+            print(f"Usuarios con saldos desfasados: {len(desfasados)}")
+            print(", ".join(str(usuario_id) for usuario_id in desfasados[:50]))
+        else:
+            print("✓ Todos los saldos coinciden con ahorros y préstamos")
+        
+        if solo_verificar:
+            return not desfasados
+        
+        filas = reconstruir_saldos(cursor)
+        conn.commit()
+        print(f"✓ Tabla saldos_usuario reconstruida: {filas} usuarios")
+        return True
+    except Exception as e:
+        conn.rollback()
+        print(f"Error reconstruyendo saldos: {e}")
+        return False
+    finally:
+        cursor.close()
+        conn.close()
+
+if __name__ == "__main__":
+    if not ejecutar(solo_verificar="--verificar" in sys.argv):
+        sys.exit(1)
@@ -0,0 +1,119 @@
+# Saldos precalculados por usuario (tabla saldos_usuario)
+#
+# Cada escritura sobre ahorros o préstamos aplica un delta a la fila del
+# usuario dentro de la misma transacción, de modo que las páginas leen los
+# totales con una sola consulta por clave primaria.
+
+CREAR_TABLA_SALDOS = '''
+CREATE TABLE IF NOT EXISTS saldos_usuario (
+    usuario_id INT PRIMARY KEY,
+    ahorros_validados DECIMAL(14, 2) NOT NULL DEFAULT 0,
+    ahorros_pendientes DECIMAL(14, 2) NOT NULL DEFAULT 0,
+    total_prestamos DECIMAL(14, 2) NOT NULL DEFAULT 0,
+    prestamos_activos INT NOT NULL DEFAULT 0,
+    fecha_actualizacion DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    FOREIGN KEY (usuario_id) REFERENCES usuarios(id)
+)
+'''
+
+# Columnas acumuladas, en el orden en que se pasan los deltas
+COLUMNAS_SALDO = ('ahorros_validados', 'ahorros_pendientes', 'total_prestamos', 'prestamos_activos')
+
+# Recalcula los saldos desde las tablas de origen. "Préstamos activos" son
+# los que no están en estado 'pagado', igual que en las vistas originales.
+CONSULTA_SALDOS_DESDE_ORIGEN = '''
+    SELECT u.id AS usuario_id,
+           COALESCE(a.ahorros_validados, 0) AS ahorros_validados,
+           COALESCE(a.ahorros_pendientes, 0) AS ahorros_pendientes,
+           COALESCE(p.total_prestamos, 0) AS total_prestamos,
+           COALESCE(p.prestamos_activos, 0) AS prestamos_activos
+    FROM usuarios u
+    LEFT JOIN (
+        SELECT usuario_id,
+               SUM(CASE WHEN validado = 1 THEN monto ELSE 0 END) AS ahorros_validados,
+               SUM(CASE WHEN validado = 1 THEN 0 ELSE monto END) AS ahorros_pendientes
+        FROM ahorros
+        GROUP BY usuario_id
+    ) a ON a.usuario_id = u.id
+    LEFT JOIN (
+        SELECT usuario_id, SUM(monto) AS total_prestamos, COUNT(*) AS prestamos_activos
+        FROM prestamos
+        WHERE estado != 'pagado'
+        GROUP BY usuario_id
+    ) p ON p.usuario_id = u.id
+'''
+
+
+def aplicar_deltas_saldo(cursor, deltas):
+    """
+    Suma los deltas a saldos_usuario creando la fila si no existe.
+    deltas: diccionario usuario_id -> tupla en el orden de COLUMNAS_SALDO
+    """
+    if not deltas:
+        return
+    filas = [(usuario_id,) + tuple(delta) for usuario_id, delta in deltas.items()]
+    cursor.executemany('''
+        INSERT INTO saldos_usuario
+            (usuario_id, ahorros_validados, ahorros_pendientes, total_prestamos, prestamos_activos)
+        VALUES (%s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE
+            ahorros_validados = ahorros_validados + VALUES(ahorros_validados),
+            ahorros_pendientes = ahorros_pendientes + VALUES(ahorros_pendientes),
+            total_prestamos = total_prestamos + VALUES(total_prestamos),
+            prestamos_activos = prestamos_activos + VALUES(prestamos_activos)
+    ''', filas)
+
+
+def aplicar_delta_saldo(cursor, usuario_id, ahorros_validados=0, ahorros_pendientes=0,
+                        total_prestamos=0, prestamos_activos=0):
+    """Aplica el delta de un solo usuario (ver aplicar_deltas_saldo)"""
+    aplicar_deltas_saldo(cursor, {
+        usuario_id: (ahorros_validados, ahorros_pendientes, total_prestamos, prestamos_activos)
+    })
+
+
+def delta_ahorro(monto, validado, signo=1):
+    """Delta que produce insertar (signo=1) o eliminar (signo=-1) un ahorro"""
+    monto = float(monto) * signo
+    return (monto, 0, 0, 0) if validado else (0, monto, 0, 0)
+
+
+def leer_saldo_usuario(cursor, usuario_id):
+    """Lee la fila de saldos de un usuario; requiere un cursor con dictionary=True"""
+    cursor.execute('''
+        SELECT ahorros_validados, ahorros_pendientes, total_prestamos, prestamos_activos
+        FROM saldos_usuario
+        WHERE usuario_id = %s
+    ''', (usuario_id,))
+    saldo = cursor.fetchone()
+    if not saldo:
+        # Usuario sin movimientos todavía
+        saldo = {columna: 0 for columna in COLUMNAS_SALDO}
+    return saldo
+
+
+def reconstruir_saldos(cursor):
+    """Recalcula toda la tabla saldos_usuario desde ahorros y préstamos"""
+    cursor.execute("DELETE FROM saldos_usuario")
+    cursor.execute('''
+        INSERT INTO saldos_usuario
+            (usuario_id, ahorros_validados, ahorros_pendientes, total_prestamos, prestamos_activos)
+    ''' + CONSULTA_SALDOS_DESDE_ORIGEN)
+    return cursor.rowcount
+
+
+def verificar_saldos(cursor):
+    """
+    Compara saldos_usuario contra el recálculo desde las tablas de origen.
+    Retorna la lista de usuario_id cuyos saldos no coinciden.
+    """
+    cursor.execute('''
+        SELECT o.usuario_id
+        FROM (''' + CONSULTA_SALDOS_DESDE_ORIGEN + ''') o
+        LEFT JOIN saldos_usuario s ON s.usuario_id = o.usuario_id
+        WHERE COALESCE(s.ahorros_validados, 0) != o.ahorros_validados
+           OR COALESCE(s.ahorros_pendientes, 0) != o.ahorros_pendientes
+           OR COALESCE(s.total_prestamos, 0) != o.total_prestamos
+           OR COALESCE(s.prestamos_activos, 0) != o.prestamos_activos
+    ''')
+    return [fila[0] if not isinstance(fila, dict) else fila['usuario_id'] for fila in cursor.fetchall()]
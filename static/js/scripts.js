@@ -84,6 +84,252 @@ document.addEventListener('DOMContentLoaded', function() {
     
     formatCurrency();
     
+    // Historial de transacciones: cargar la página siguiente sin recargar
+    const cargarMas = document.getElementById('cargar-mas-transacciones');
+    if (cargarMas) {
+        const cuerpoTabla = document.getElementById('transacciones-body');
+        const formatoMoneda = new Intl.NumberFormat('es-MX', { style: 'currency', currency: 'MXN' });
+        const etiquetas = {
+            ahorro: '<span class="badge bg-success">Ahorro</span>',
+            prestamo: '<span class="badge bg-info">Préstamo</span>',
+            pago: '<span class="badge bg-warning">Pago</span>'
+        };
+        const clases = { ahorro: 'positive', prestamo: 'negative', pago: '' };
+        
+        cargarMas.addEventListener('click', async function(event) {
+            event.preventDefault();
+            cargarMas.classList.add('disabled');
+            try {
+                const url = `${cargarMas.dataset.api}?despues=${encodeURIComponent(cargarMas.dataset.despues)}`;
+                const response = await fetch(url);
+                const data = await response.json();
+                if (!response.ok) {
+                    throw new Error(data.error || 'Error al cargar el historial');
+                }
+                
+                const filtro = document.getElementById('filter-transactions');
+                data.transacciones.forEach(t => {
+                    const fila = document.createElement('tr');
+                    fila.className = 'transaction-item';
+                    fila.dataset.type = t.tipo;
+                    fila.innerHTML = `
+                        <td class="transaction-date">${t.fecha_texto}</td>
+                        <td>${etiquetas[t.tipo] || ''}</td>
+                        <td></td>
+                        <td class="transaction-amount ${clases[t.tipo] || ''} currency">${formatoMoneda.format(t.monto)}</td>
+                    `;
+                    fila.children[2].textContent = t.descripcion;
+                    if (filtro && filtro.value !== 'all' && filtro.value !== t.tipo) {
+                        fila.style.display = 'none';
+                    }
+                    cuerpoTabla.appendChild(fila);
+                });
+                
+                if (data.siguiente) {
+                    cargarMas.dataset.despues = data.siguiente;
+                    cargarMas.classList.remove('disabled');
+                } else {
+                    cargarMas.remove();
+                }
+            } catch (error) {
+                cargarMas.classList.remove('disabled');
+                alert(error.message);
+            }
+        });
+    }
+    
+    // Cargas masivas: consultar el progreso del trabajo en segundo plano
+    const progresoCarga = document.getElementById('progreso-carga');
+    if (progresoCarga) {
+        const barra = progresoCarga.querySelector('.progress-bar');
+        const estado = progresoCarga.querySelector('[data-campo="estado"]');
+        const procesadas = progresoCarga.querySelector('[data-campo="filas_procesadas"]');
+        const rechazadas = progresoCarga.querySelector('[data-campo="filas_rechazadas"]');
+        const restante = progresoCarga.querySelector('[data-campo="eta"]');
+        const mensajes = progresoCarga.querySelector('[data-campo="mensajes"]');
+        const vistaPrevia = progresoCarga.querySelector('[data-campo="vista_previa"]');
+        const textosResultado = {
+            insertar: 'Se insertarían',
+            omitir: 'Se omitirían',
+            conciliado: 'Conciliadas',
+            ambiguo: 'Ambiguas',
+            sin_conciliar: 'Sin conciliar',
+            error: 'Con errores'
+        };
+        const coloresResultado = {
+            insertar: 'text-success',
+            omitir: 'text-warning',
+            conciliado: 'text-success',
+            ambiguo: 'text-warning',
+            sin_conciliar: 'text-secondary',
+            error: 'text-danger'
+        };
+        const textosEstado = {
+            pendiente: 'En cola',
+            procesando: 'Procesando',
+            completado: 'Completado',
+            error: 'Con errores'
+        };
+        
+        // Reporte de una vista previa o una conciliación: resumen por
+        // categoría, tabla filtrable y paginada con /admin/jobs/<id>/reporte
+        // y botón para confirmar (cargar el archivo o validar lo conciliado)
+        const mostrarReporte = function(resumen, confirmable) {
+            const categorias = Object.entries(resumen.categorias).map(([clave, total]) => {
+                const [resultado, categoria] = clave.split(':');
+                return `<option value="${clave}">${textosResultado[resultado]} - ${categoria} (${total})</option>`;
+            }).join('');
+            vistaPrevia.innerHTML = `
+                <div class="row text-center mb-3">
+                    ${Object.keys(textosResultado).filter(resultado => resultado in resumen).map(resultado =>
+                        `<div class="col"><strong class="${coloresResultado[resultado]}">${resumen[resultado]}</strong><br>${textosResultado[resultado]}</div>`
+                    ).join('')}
+                </div>
+                <div class="d-flex gap-2 mb-2">
+                    <select class="form-select" data-filtro>
+                        <option value="">Todas las filas</option>${categorias}
+                    </select>
+                    <form method="POST" action="${progresoCarga.dataset.confirmar}">
+                        <button type="submit" class="btn btn-primary text-nowrap" ${confirmable ? '' : 'disabled'}>
+                            <i class="fas fa-check me-2"></i>${progresoCarga.dataset.textoConfirmar || 'Confirmar carga'}
+                        </button>
+                    </form>
+                </div>
+                <div class="table-responsive">
+                    <table class="table table-sm table-striped">
+                        <thead><tr><th>Fila</th><th>Resultado</th><th>Categoría</th><th>Datos</th><th>Detalle</th></tr></thead>
+                        <tbody></tbody>
+                    </table>
+                </div>
+                <nav class="d-flex justify-content-between align-items-center">
+                    <button type="button" class="btn btn-sm btn-outline-secondary" data-pagina="-1">Anterior</button>
+                    <span data-campo="pagina"></span>
+                    <button type="button" class="btn btn-sm btn-outline-secondary" data-pagina="1">Siguiente</button>
+                </nav>`;
+            
+            const filtro = vistaPrevia.querySelector('[data-filtro]');
+            const cuerpo = vistaPrevia.querySelector('tbody');
+            const textoPagina = vistaPrevia.querySelector('[data-campo="pagina"]');
+            let pagina = 1;
+            let paginas = 1;
+            
+            const cargarPagina = async function() {
+                const [resultado, categoria] = filtro.value ? filtro.value.split(':') : ['', ''];
+                const parametros = new URLSearchParams({resultado, categoria, pagina});
+                const response = await fetch(`${progresoCarga.dataset.reporte}?${parametros}`);
+                const reporte = await response.json();
+                if (!response.ok) {
+                    cuerpo.innerHTML = '';
+                    textoPagina.textContent = reporte.error || 'Error al consultar el reporte';
+                    return;
+                }
+                paginas = reporte.paginas;
+                cuerpo.innerHTML = '';
+                reporte.entradas.forEach(entrada => {
+                    const fila = document.createElement('tr');
+                    const datos = entrada.datos ? Object.values(entrada.datos).filter(v => v !== null).join(', ') : '';
+                    [entrada.fila ?? '-', textosResultado[entrada.resultado], entrada.categoria, datos, entrada.detalle || '']
+                        .forEach(valor => {
+                            const celda = document.createElement('td');
+                            celda.textContent = valor;
+                            fila.appendChild(celda);
+                        });
+                    cuerpo.appendChild(fila);
+                });
+                textoPagina.textContent = `Página ${reporte.pagina} de ${paginas} (${reporte.total} filas)`;
+            };
+            
+            filtro.addEventListener('change', function() {
+                pagina = 1;
+                cargarPagina();
+            });
+            vistaPrevia.querySelectorAll('[data-pagina]').forEach(boton => {
+                boton.addEventListener('click', function() {
+                    const nueva = pagina + parseInt(boton.dataset.pagina, 10);
+                    if (nueva >= 1 && nueva <= paginas) {
+                        pagina = nueva;
+                        cargarPagina();
+                    }
+                });
+            });
+            cargarPagina();
+        };
+        
+        const consultarProgreso = async function() {
+            try {
+                const response = await fetch(progresoCarga.dataset.api);
+                const data = await response.json();
+                if (!response.ok) {
+                    throw new Error(data.error || 'Error al consultar el progreso');
+                }
+                
+                barra.style.width = `${data.porcentaje}%`;
+                barra.textContent = `${data.porcentaje}%`;
+                estado.textContent = textosEstado[data.estado] || data.estado;
+                procesadas.textContent = data.filas_procesadas;
+                rechazadas.textContent = data.filas_rechazadas;
+                restante.textContent = data.eta_segundos !== null ? `${data.eta_segundos} s` : '-';
+                
+                if (data.estado === 'completado' || data.estado === 'error') {
+                    barra.classList.remove('progress-bar-animated');
+                    barra.classList.add(data.estado === 'completado' ? 'bg-success' : 'bg-danger');
+                    data.mensajes.forEach(m => {
+                        const alerta = document.createElement('div');
+                        alerta.className = `alert alert-${m.categoria} py-2 mb-2`;
+                        alerta.textContent = m.texto;
+                        mensajes.appendChild(alerta);
+                    });
+                    if (data.modo === 'vista_previa' && data.estado === 'completado') {
+                        // Con errores la carga no guardaría nada
+                        mostrarReporte(data.resumen, !data.resumen.error);
+                    } else if (data.modo === 'conciliar' && data.estado === 'completado') {
+                        mostrarReporte(data.resumen, Boolean(data.resumen.categorias['conciliado:ahorro_pendiente']));
+                    }
+                    return;
+                }
+                setTimeout(consultarProgreso, 1000);
+            } catch (error) {
+                estado.textContent = error.message;
+            }
+        };
+        consultarProgreso();
+    }
+    
+    // Flujo de caja del fondo en el panel de administración
+    const flujoCaja = document.getElementById('flujoCaja');
+    if (flujoCaja) {
+        const cuerpo = flujoCaja.querySelector('[data-campo="meses"]');
+        const pie = flujoCaja.querySelector('[data-campo="totales"]');
+        const moneda = valor => valor === null ? '-' : `$${valor.toFixed(2)}`;
+        const fila = (etiqueta, m) => `
+            <td>${etiqueta}</td>
+            <td>${moneda(m.capital_esperado)}</td>
+            <td>${moneda(m.interes_esperado)}</td>
+            <td>${moneda(m.total_esperado)}</td>
+            <td>${moneda(m.pagos_realizados)}</td>
+            <td>${moneda(m.ahorros_proyectados)}</td>
+        `;
+        
+        fetch(flujoCaja.dataset.api)
+            .then(async response => {
+                const data = await response.json();
+                if (!response.ok) {
+                    throw new Error(data.error || 'Error al cargar el flujo de caja');
+                }
+                cuerpo.innerHTML = '';
+                data.meses.forEach(m => {
+                    const tr = document.createElement('tr');
+                    tr.innerHTML = fila(m.mes, m);
+                    cuerpo.appendChild(tr);
+                });
+                pie.innerHTML = `<tr>${fila('Total', data.totales)}</tr>`;
+            })
+            .catch(error => {
+                cuerpo.innerHTML = '<tr><td colspan="6" class="text-center text-danger"></td></tr>';
+                cuerpo.querySelector('td').textContent = error.message;
+            });
+    }
+    
     // Validación de formularios
     const forms = document.querySelectorAll('.needs-validation');
     forms.forEach(form => {
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Pruebas de las tablas de amortización por lotes: mismo resultado que
+préstamo por préstamo y centavos exactos en ambos sistemas
+"""
+
+from datetime import date, datetime
+from decimal import Decimal
+
+import numpy as np
+
+from amortizacion import a_centavos, calcular_tablas, cuotas_interes_simple, filas_tabla
+from cuotas import filas_cuotas
+
+
+def test_tablas_por_lote_cierran_en_cero_al_centavo():
+    montos = [1000, 1000.01, 250000, 777.77]
+    tasas = [12, 7, 0, 24.5]
+    plazos = [10, 7, 36, 1]
+    for sistema in ('frances', 'interes_simple'):
+        tabla = calcular_tablas(sistema, montos, tasas, plazos)
+        assert (tabla['capital'].sum(axis=1) == a_centavos(montos)).all()
+        assert (tabla['cuota'] == tabla['capital'] + tabla['interes']).all()
+        for i, plazo in enumerate(plazos):
+            filas = filas_tabla(tabla, i)
+            assert len(filas) == plazo and filas[-1]['saldo_restante'] == 0
+            # Igual que calcular la tabla de ese préstamo solo
+            assert filas == filas_tabla(calcular_tablas(sistema, [montos[i]], [tasas[i]], [plazo]))
+
+    frances = filas_tabla(calcular_tablas('frances', [1000], [12], [10]))
+    assert frances[0] == {'mes': 1, 'abono_capital': 95.58, 'interes': 10.0,
+                          'cuota_total': 105.58, 'saldo_restante': 904.42}
+    assert frances[-1]['cuota_total'] == 105.6
+
+
+def test_interes_simple_como_validar_prestamo():
+    interes, capital = cuotas_interes_simple([1000, 1000.01], [12, 7], [3, 7])
+    assert interes.tolist() == [1000, 583]
+    assert capital.tolist() == [33333, 14286]
+
+    filas = filas_tabla(calcular_tablas('interes_simple', [1000], [12], [3]))
+    assert [fila['abono_capital'] for fila in filas] == [333.33, 333.33, 333.34]
+    assert {fila['interes'] for fila in filas} == {10.0}
+    assert np.isclose(sum(fila['abono_capital'] for fila in filas), 1000)
+
+
+def test_plan_de_cuotas_con_vencimientos():
+    filas = list(filas_cuotas([
+        (1, Decimal('1000.00'), Decimal('12.00'), 3, datetime(2024, 1, 31, 10, 30)),
+        (2, Decimal('500.00'), Decimal('0.00'), 2, date(2024, 11, 15)),
+    ]))
+    assert [(fila[0], fila[1], fila[2]) for fila in filas] == [
+        (1, 1, date(2024, 2, 29)), (1, 2, date(2024, 3, 31)), (1, 3, date(2024, 4, 30)),
+        (2, 1, date(2024, 12, 15)), (2, 2, date(2025, 1, 15)),
+    ]
+    # capital, interés, cuota, saldo esperado y cuota acumulada
+    assert filas[2][3:] == (Decimal('333.34'), Decimal('10'), Decimal('343.34'), Decimal('0'), Decimal('1030'))
+    assert filas[3][3:] == (Decimal('250'), Decimal('0'), Decimal('250'), Decimal('250'), Decimal('250'))
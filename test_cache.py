@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Pruebas de la caché LRU de tablas de amortización: capacidad acotada,
+contadores de aciertos y fallos y tablas independientes por llamada; y del
+ETag del pronóstico de un préstamo
+"""
+
+from datetime import datetime
+from decimal import Decimal
+
+import app as app_module
+from cache import CacheLRU
+
+
+def test_cache_lru_descarta_la_menos_usada():
+    cache = CacheLRU(capacidad=2)
+    cache.guardar('a', 1)
+    cache.guardar('b', 2)
+    assert cache.obtener('a') == 1
+    cache.guardar('c', 3)
+
+    assert cache.obtener('b') is None
+    assert (cache.obtener('a'), cache.obtener('c')) == (1, 3)
+    assert (len(cache), cache.aciertos, cache.fallos) == (2, 3, 1)
+
+
+def test_tabla_amortizacion_memoizada(monkeypatch):
+    monkeypatch.setattr(app_module, 'cache_tablas', CacheLRU(capacidad=8))
+    tabla = app_module.calcular_tabla_amortizacion(1000, 12, 10)
+    tabla[0]['interes'] = 0
+
+    # Mismas condiciones escritas de otra forma: acierto y copia intacta
+    otra = app_module.calcular_tabla_amortizacion(Decimal('1000.00'), Decimal('12.00'), 10)
+    assert otra[0]['interes'] == 10.0
+    assert (app_module.cache_tablas.aciertos, app_module.cache_tablas.fallos) == (1, 1)
+
+
+class CursorPronostico:
+    """Préstamo sin plan de cuotas, sus pagos y el rol del administrador"""
+
+    def __init__(self, conexion):
+        self.conexion = conexion
+        self.consulta = None
+        self.lastrowid = None
+
+    def execute(self, consulta, parametros=None):
+        self.consulta = consulta
+        prestamo = self.conexion.prestamo
+        if consulta.startswith('INSERT INTO pagos_prestamos'):
+            self.conexion.pagos.append(Decimal(str(parametros[1])))
+            self.lastrowid = len(self.conexion.pagos)
+        elif 'SET total_pagado = total_pagado + %s' in consulta:
+            prestamo['total_pagado'] += Decimal(str(parametros[0]))
+            prestamo['saldo_pendiente'] -= Decimal(str(parametros[1]))
+
+    def fetchone(self):
+        if self.consulta.startswith('SELECT rol FROM usuarios'):
+            return {'rol': 'admin'}
+        if 'COUNT(*) AS pagos_realizados' in self.consulta:
+            return {'pagos_realizados': len(self.conexion.pagos)}
+        if 'FROM prestamos' in self.consulta:
+            return dict(self.conexion.prestamo)
+        return None
+
+    def fetchall(self):
+        return []
+
+    def close(self):
+        pass
+
+
+class ConexionPronostico:
+    def __init__(self):
+        self.pagos = []
+        self.prestamo = {
+            'id': 1, 'usuario_id': 2, 'monto': Decimal('1000.00'), 'tasa_interes': Decimal('12.00'),
+            'plazo_meses': 10, 'fecha_solicitud': datetime(2024, 1, 1), 'estado': 'aprobado',
+            'total_pagado': Decimal('0.00'), 'saldo_pendiente': Decimal('1000.00'),
+        }
+
+    def cursor(self, dictionary=False):
+        return CursorPronostico(self)
+
+    def commit(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def test_pronostico_304_hasta_registrar_un_pago(monkeypatch):
+    conexion = ConexionPronostico()
+    monkeypatch.setattr(app_module, 'get_db_connection', lambda: conexion)
+    monkeypatch.setattr(app_module, 'cache_roles', app_module.CacheTTL())
+    cliente = app_module.app.test_client()
+    with cliente.session_transaction() as sesion:
+        sesion['user_id'] = 1
+        sesion['nombre'] = 'Admin'
+
+    respuesta = cliente.get('/api/admin/prestamo/1/pronostico')
+    etag = respuesta.get_etag()[0]
+    assert respuesta.status_code == 200 and etag
+
+    respuesta = cliente.get('/api/admin/prestamo/1/pronostico', headers={'If-None-Match': f'"{etag}"'})
+    assert respuesta.status_code == 304
+
+    respuesta = cliente.post('/admin/pagos_prestamos', data={'usuario_id': 2, 'prestamo_id': 1, 'monto': '100'})
+    assert respuesta.status_code == 302 and len(conexion.pagos) == 1
+
+    respuesta = cliente.get('/api/admin/prestamo/1/pronostico', headers={'If-None-Match': f'"{etag}"'})
+    assert respuesta.status_code == 200
+    assert respuesta.get_json()['total_pagado'] == 100.0
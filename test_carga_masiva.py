@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+Pruebas de la carga masiva por lotes: mismas filas creadas y mismos
+errores por fila que la carga fila por fila, con pocas consultas
+"""
+
+from carga_masiva import ErroresCarga, filas_validas, insertar_ahorros, insertar_pagos, insertar_usuarios
+from importaciones import clave_fila
+from vista_previa import clasificar_usuarios
+
+
+class CursorFalso:
+    """Simula la tabla usuarios con índices únicos en email y cédula"""
+
+    def __init__(self, emails=(), cedulas=()):
+        self.emails = set(emails)
+        self.cedulas = set(cedulas)
+        self.consultas = []
+        self.resultado = []
+
+    def execute(self, consulta, parametros=()):
+        self.consultas.append(consulta)
+        if consulta.startswith('SELECT email'):
+            self.resultado = [(v.upper(),) for v in parametros if v in self.emails]
+        elif consulta.startswith('SELECT cedula'):
+            self.resultado = [(v,) for v in parametros if v in self.cedulas]
+        else:
+            self._insertar([parametros])
+
+    def executemany(self, consulta, filas):
+        self.consultas.append(consulta)
+        self._insertar(filas)
+
+    def _insertar(self, filas):
+        # Un INSERT de varias filas es atómico: falla completo o no falla
+        nuevos = [(fila[2], fila[3]) for fila in filas]
+        for email, cedula in nuevos:
+            if email in self.emails or cedula in self.cedulas or cedula == 'invalida':
+                raise Exception(f"Duplicate entry '{email}'")
+        for email, cedula in nuevos:
+            self.emails.add(email)
+            self.cedulas.add(cedula)
+
+    def fetchall(self):
+        return self.resultado
+
+
+def _usuario(email, cedula):
+    return {'nombre': 'N', 'apellido': 'A', 'email': email, 'cedula': cedula,
+            'fecha_nacimiento': '1990-01-01', 'direccion': '', 'telefono': '',
+            'password': 'x', 'rol': 'ahorrador'}
+
+
+def test_duplicados_y_errores_por_fila():
+    cursor = CursorFalso(emails={'existe@x.com'}, cedulas={'111'})
+    usuarios = [
+        _usuario('nuevo1@x.com', '1'),
+        _usuario('existe@x.com', '2'),
+        _usuario('nuevo2@x.com', '111'),
+        _usuario('nuevo1@x.com', '3'),      # repetido dentro del archivo
+        _usuario('nuevo3@x.com', 'invalida'),
+        _usuario('nuevo4@x.com', '4'),
+    ]
+
+    creados, errores = insertar_usuarios(cursor, usuarios, tamano_lote=3)
+
+    assert creados == 2
+    assert cursor.emails == {'existe@x.com', 'nuevo1@x.com', 'nuevo4@x.com'}
+    assert errores == [
+        "Usuario existe@x.com o cédula 2 ya existe",
+        "Usuario nuevo2@x.com o cédula 111 ya existe",
+        "Usuario nuevo1@x.com o cédula 3 ya existe",
+        "Error creando usuario nuevo3@x.com: Duplicate entry 'nuevo3@x.com'",
+    ]
+
+
+def test_sin_registros_despues_del_primer_error():
+    errores = ErroresCarga()
+    resultados = [(2, 'a', None), (3, None, ('monto_invalido', 'Monto')), (4, 'b', None),
+                  (5, None, ('fecha_invalida', 'Fecha'))]
+
+    assert list(filas_validas(resultados, errores)) == ['a']
+    assert errores == ["Fila 3: Monto", "Fila 5: Fecha"]
+
+
+def test_consultas_por_bloques():
+    cursor = CursorFalso()
+    usuarios = [_usuario(f"u{i}@x.com", str(i)) for i in range(2500)]
+
+    creados, errores = insertar_usuarios(cursor, usuarios, tamano_lote=1000)
+
+    assert (creados, errores) == (2500, [])
+    # 3 bloques IN por columna + 3 lotes de inserción
+    assert len(cursor.consultas) == 9
+
+
+class CursorAhorros:
+    def __init__(self):
+        self.filas = []
+
+    def executemany(self, consulta, filas):
+        if any(fila[1] < 0 for fila in filas):
+            raise Exception("Check constraint")
+        self.filas.extend(filas)
+
+    def execute(self, consulta, fila):
+        self.executemany(consulta, [fila])
+
+
+def test_ahorros_por_lotes_con_deltas_de_los_insertados():
+    cursor = CursorAhorros()
+    ahorros = [
+        {'usuario_id': 1, 'usuario_email': 'a@x.com', 'monto': 100.0, 'fecha': '2024-01-01', 'validado': False},
+        {'usuario_id': 1, 'usuario_email': 'a@x.com', 'monto': 50.0, 'fecha': None, 'validado': False},
+        {'usuario_id': 2, 'usuario_email': 'b@x.com', 'monto': -1.0, 'fecha': '2024-01-02', 'validado': False},
+    ]
+
+    creados, errores, deltas = insertar_ahorros(cursor, ahorros, tamano_lote=10)
+
+    assert creados == 2
+    assert errores == ["Error creando ahorro para b@x.com: Check constraint"]
+    assert deltas == {1: (0, 150.0, 0, 0)}
+
+
+class CursorAhorrosImportados(CursorAhorros):
+    """Simula el índice único de ahorros.clave_fila"""
+
+    def __init__(self, claves):
+        super().__init__()
+        self.claves = set(claves)
+        self.resultado = []
+
+    def execute(self, consulta, parametros):
+        if consulta.startswith('SELECT clave_fila'):
+            self.resultado = [(c,) for c in parametros if c in self.claves]
+        else:
+            super().execute(consulta, parametros)
+
+    def fetchall(self):
+        return self.resultado
+
+
+def test_ahorros_ya_importados_se_omiten():
+    ahorros = [
+        {'usuario_id': 1, 'usuario_email': 'a@x.com', 'monto': 100.0, 'fecha': '2024-01-01',
+         'validado': False, 'fila': fila, 'clave_fila': clave_fila(1, 100.0, '2024-01-01', fila, 'a' * 64)}
+        for fila in (2, 3)
+    ]
+    cursor = CursorAhorrosImportados({clave_fila(1, '100.00', '2024-01-01', 2, 'b' * 64)})
+
+    creados, errores, deltas = insertar_ahorros(cursor, ahorros, importacion_id=7)
+
+    assert creados == 1
+    assert errores == ["Fila 2: el ahorro de a@x.com ya fue importado"]
+    assert cursor.filas == [(1, 100.0, '2024-01-01', False, 7, ahorros[1]['clave_fila'])]
+    assert deltas == {1: (0, 100.0, 0, 0)}
+
+
+def test_ahorros_sin_fecha_de_otro_archivo_no_se_omiten():
+    # La misma fila sin fecha en la nómina de dos meses distintos
+    cursor = CursorAhorrosImportados(set())
+    for hash_archivo in ('a' * 64, 'b' * 64):
+        ahorros = [{'usuario_id': 1, 'usuario_email': 'a@x.com', 'monto': 100.0, 'fecha': None,
+                    'validado': False, 'fila': 2, 'clave_fila': clave_fila(1, 100.0, None, 2, hash_archivo)}]
+        creados, errores, _ = insertar_ahorros(cursor, ahorros)
+        cursor.claves.update(fila[-1] for fila in cursor.filas)
+
+        assert creados == 1
+        assert errores == []
+    assert len(cursor.filas) == 2
+
+
+class CursorPagos:
+    """Simula prestamos (id -> [usuario_id, monto, saldo]) y pagos_prestamos"""
+
+    def __init__(self, prestamos):
+        self.prestamos = prestamos
+        self.pagos = []
+        self.pagados = []
+        self.resultado = []
+
+    def executemany(self, consulta, filas):
+        self.pagos.extend(filas)
+
+    def execute(self, consulta, parametros):
+        if consulta.strip().startswith('UPDATE prestamos p'):
+            for i in range(0, len(parametros), 3):
+                prestamo_id, pagado, ultima = parametros[i:i + 3]
+                self.prestamos[prestamo_id][2] -= pagado
+                self.prestamos[prestamo_id].append(ultima)
+        elif consulta.strip().startswith('SELECT id, usuario_id, monto'):
+            self.resultado = [(i, u, m) for i, (u, m, saldo, *_) in self.prestamos.items()
+                              if i in parametros and saldo <= 0]
+        elif consulta.startswith("UPDATE prestamos SET estado = 'pagado'"):
+            self.pagados.extend(parametros)
+
+    def fetchall(self):
+        return self.resultado
+
+
+def _pago(prestamo_id, monto, fecha, fila):
+    return {'prestamo_id': prestamo_id, 'monto': monto, 'fecha': fecha, 'fila': fila}
+
+
+def test_pagos_por_lotes_marcan_pagados_en_un_update():
+    cursor = CursorPagos({1: [10, 500, 300], 2: [20, 800, 800]})
+    pagos = [
+        _pago(1, 100, '2024-01-31', 2),
+        _pago(2, 50, None, 3),
+        _pago(1, 200, '2024-02-29', 4),
+    ]
+
+    creados, errores, pagados, deltas = insertar_pagos(cursor, pagos, tamano_lote=2)
+
+    assert (creados, errores, pagados) == (3, [], 1)
+    # Préstamo 1: saldo en cero y último pago el del archivo; préstamo 2: pago con NOW()
+    assert cursor.prestamos == {1: [10, 500, 0, '2024-02-29'], 2: [20, 800, 750, None]}
+    assert cursor.pagados == [1]
+    assert deltas == {10: (0, 0, -500.0, -1)}
+
+
+def test_vista_previa_clasifica_como_la_carga_sin_escribir():
+    cursor = CursorFalso(emails={'existe@x.com'})
+    invalida = dict(_usuario('fecha@x.com', '5'), fecha_nacimiento='1990-13-01')
+    resultados = [
+        (2, _usuario('nuevo1@x.com', '1'), None),
+        (3, _usuario('existe@x.com', '2'), None),
+        (4, _usuario('nuevo1@x.com', '3'), None),
+        (5, None, ('datos_incompletos', 'Datos básicos incompletos')),
+        (6, invalida, None),
+    ]
+
+    entradas = list(clasificar_usuarios(cursor, resultados, tamano_lote=2))
+
+    assert [(e['fila'], e['resultado'], e['categoria']) for e in entradas] == [
+        (2, 'insertar', 'nuevo'),
+        (3, 'omitir', 'existente'),
+        (4, 'omitir', 'duplicado_archivo'),
+        (5, 'error', 'datos_incompletos'),
+        (6, 'omitir', 'fecha_invalida'),
+    ]
+    assert not any(c.startswith('INSERT') for c in cursor.consultas)
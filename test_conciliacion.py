@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+"""
+Pruebas del cruce del extracto bancario con ahorros y pagos: conciliadas,
+ambiguas y sin conciliar, con la ventana de días
+"""
+
+from datetime import date
+from decimal import Decimal
+
+from conciliacion import ahorros_conciliados, centavos, conciliar
+
+
+def _movimiento(fila, referencia, monto, fecha):
+    return fila, {'referencia': referencia, 'monto': Decimal(monto), 'fecha': fecha, 'descripcion': ''}, None
+
+
+def test_conciliar_por_referencia_monto_y_ventana():
+    indice = {
+        ('111', centavos('500')): [(date(2024, 1, 15), 'ahorro', 1, 10)],
+        ('a@x.com', centavos('500')): [(date(2024, 1, 15), 'ahorro', 1, 10)],
+        ('222', centavos('300')): [(date(2024, 1, 31), 'pago', 7, 20), (date(2024, 2, 1), 'ahorro', 2, 20)],
+    }
+    resultados = [
+        _movimiento(2, 'a@x.com', '500.00', date(2024, 1, 17)),   # ahorro 1 por email
+        _movimiento(3, '111', '500', date(2024, 1, 15)),          # ahorro 1 ya conciliado
+        _movimiento(4, '222', '300', date(2024, 2, 1)),           # pago 7 y ahorro 2
+        _movimiento(5, '222', '300', date(2024, 3, 1)),           # fuera de la ventana
+        (6, None, ('monto_invalido', 'El monto debe ser un número mayor a 0')),
+    ]
+
+    entradas = list(conciliar(resultados, indice, ventana=3))
+
+    assert [(e['fila'], e['resultado'], e['categoria']) for e in entradas] == [
+        (2, 'conciliado', 'ahorro_pendiente'),
+        (3, 'sin_conciliar', 'sin_candidatos'),
+        (4, 'ambiguo', 'varios_candidatos'),
+        (5, 'sin_conciliar', 'sin_candidatos'),
+        (6, 'error', 'monto_invalido'),
+    ]
+    assert ahorros_conciliados(entradas) == [1]
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Pruebas de la exportación en streaming: un fragmento por bloque de filas,
+encabezado CSV, filtros y gzip al vuelo
+"""
+
+import gzip
+from datetime import date, datetime
+from decimal import Decimal
+
+from exportaciones import codificar, generar_exportacion
+
+
+class CursorExportacion:
+    """Cursor sin buffer simulado que entrega las filas con fetchmany"""
+
+    column_names = ('id', 'monto', 'fecha')
+
+    def __init__(self, filas):
+        self.filas = list(filas)
+        self.consultas = []
+
+    def execute(self, consulta, parametros=None):
+        self.consultas.append((consulta, parametros))
+
+    def fetchmany(self, tamano):
+        bloque, self.filas = self.filas[:tamano], self.filas[tamano:]
+        return bloque
+
+    def close(self):
+        self.cerrado = True
+
+
+class ConexionExportacion:
+    """Conexión del pool simulada; registra si se descartó"""
+
+    def __init__(self, filas):
+        self.cursor_exportacion = CursorExportacion(filas)
+        self.descartada = False
+
+    def cursor(self, buffered=True):
+        assert not buffered
+        return self.cursor_exportacion
+
+    def descartar(self):
+        self.descartada = True
+
+
+def test_exportacion_por_bloques_con_gzip():
+    filas = [(i, Decimal('10.50'), datetime(2024, 1, 1, 9)) for i in range(5)]
+    conn = ConexionExportacion(filas)
+    fragmentos = list(generar_exportacion(conn, 'ahorros', 'csv', tamano=2,
+                                          desde=date(2024, 1, 1), usuario_id=10))
+    cursor = conn.cursor_exportacion
+
+    # Encabezado + 3 bloques (2, 2 y 1 filas)
+    assert len(fragmentos) == 4
+    assert fragmentos[0] == 'id,monto,fecha\r\n'
+    assert fragmentos[3] == '4,10.50,2024-01-01 09:00:00\r\n'
+
+    consulta, parametros = cursor.consultas[1]
+    assert 'a.fecha >= %s' in consulta and 'a.usuario_id = %s' in consulta
+    assert parametros == (date(2024, 1, 1), 10)
+    assert cursor.consultas[-1][0] == "SET SESSION net_write_timeout = DEFAULT"
+    assert cursor.cerrado and not conn.descartada
+
+    ndjson = list(generar_exportacion(ConexionExportacion(filas), 'pagos', 'ndjson', tamano=2))
+    comprimido = b''.join(codificar(iter(ndjson), comprimir=True))
+    lineas = gzip.decompress(comprimido).decode('utf-8').splitlines()
+    assert len(lineas) == 5
+    assert lineas[0] == '{"id": 0, "monto": "10.50", "fecha": "2024-01-01 09:00:00"}'
+
+
+def test_descarga_interrumpida_descarta_la_conexion():
+    conn = ConexionExportacion([(i, Decimal('1'), date(2024, 1, 1)) for i in range(5)])
+    fragmentos = generar_exportacion(conn, 'ahorros', 'csv', tamano=2)
+    next(fragmentos)
+    next(fragmentos)
+    fragmentos.close()  # el cliente cortó la descarga
+
+    assert conn.descartada
+    assert len(conn.cursor_exportacion.consultas) == 2
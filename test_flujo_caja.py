@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Pruebas del flujo de caja mensual: acumulados cargados con una consulta
+por tabla y actualizados en memoria con cada aprobación y cada pago
+"""
+
+from datetime import date, datetime
+from decimal import Decimal
+
+from flujo_caja import FlujoCaja
+
+
+class CursorFlujo:
+    def __init__(self):
+        self.consultas = []
+        self.consulta = None
+
+    def execute(self, consulta, parametros=None):
+        self.consultas.append((consulta, parametros))
+        self.consulta = consulta
+
+    def fetchall(self):
+        if 'FROM cuotas_prestamo' in self.consulta:
+            return [{'mes': '2024-02', 'capital': Decimal('333.33'), 'interes': Decimal('10.00')}]
+        return [{'mes': '2024-01', 'pagos': Decimal('50.00')}]
+
+    def fetchone(self):
+        return {'total': Decimal('600.00')}
+
+
+def test_flujo_caja_incremental():
+    flujo = FlujoCaja(ttl=300)
+    cursor = CursorFlujo()
+    hoy = date(2024, 2, 10)
+
+    meses = flujo.obtener(cursor, '2024-01', '2024-03', hoy=hoy)
+    assert len(cursor.consultas) == 3
+    # Ahorros validados de agosto a enero, promediados en 6 meses
+    assert cursor.consultas[2][1] == ('2023-08-01', '2024-02-01')
+    assert meses[0] == {'mes': '2024-01', 'capital_esperado': 0.0, 'interes_esperado': 0.0, 'total_esperado': 0.0,
+                        'pagos_realizados': 50.0, 'ahorros_proyectados': None}
+    assert meses[1]['total_esperado'] == 343.33 and meses[1]['ahorros_proyectados'] == 100.0
+
+    flujo.sumar_cuotas([
+        {'fecha_vencimiento': date(2024, 2, 29), 'capital': Decimal('100.00'), 'interes': Decimal('5.00')},
+        {'fecha_vencimiento': date(2024, 3, 31), 'capital': Decimal('100.00'), 'interes': Decimal('5.00')},
+    ])
+    flujo.sumar_pago('2024-02-15T10:30', 20)
+    flujo.sumar_pago(datetime(2024, 3, 1, 9), 30.5)
+
+    meses = flujo.obtener(cursor, '2024-01', '2024-03', hoy=hoy)
+    assert len(cursor.consultas) == 3  # sin volver a consultar
+    assert [mes['total_esperado'] for mes in meses] == [0.0, 448.33, 105.0]
+    assert [mes['pagos_realizados'] for mes in meses] == [50.0, 20.0, 30.5]
+
+    flujo.invalidar()
+    flujo.obtener(cursor, '2024-01', '2024-01', hoy=hoy)
+    assert len(cursor.consultas) == 6
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+Pruebas del cálculo de mora: lo esperado a la fecha contra lo pagado para
+todos los préstamos a la vez, con días de atraso y tramos de antigüedad
+"""
+
+from datetime import date
+from decimal import Decimal
+
+from mora import TRAMOS, calcular_mora
+
+
+def test_mora_por_prestamo_y_tramo():
+    # Préstamos 1 a 4, con lo pagado por cada uno
+    prestamos = ((1, 2, 3, 4), (10, 20, 30, 40),
+                 (Decimal('0.00'), Decimal('343.33'), Decimal('1000.00'), Decimal('0.00')))
+    # Cuotas vencidas (préstamo, vencimiento, cuota acumulada), desordenadas;
+    # el préstamo 4 no tiene cuotas vencidas y la del 9 no es de un préstamo aprobado
+    cuotas = ((2, 1, 3, 2, 1, 9),
+              (date(2024, 2, 1), date(2024, 1, 1), date(2024, 1, 1), date(2024, 1, 1), date(2024, 2, 1), date(2024, 1, 1)),
+              (Decimal('686.66'), Decimal('343.33'), Decimal('343.33'), Decimal('343.33'), Decimal('686.66'), Decimal('5')))
+
+    mora = calcular_mora(prestamos, cuotas, date(2024, 3, 15))
+
+    assert mora['esperado'].tolist() == [68666, 68666, 34333, 0]
+    assert mora['monto_atraso'].tolist() == [68666, 34333, 0, 0]
+    assert mora['cuotas_vencidas'].tolist() == [2, 1, 0, 0]
+    # Desde la primera cuota no cubierta: 1 de enero y 1 de febrero
+    assert mora['dias_atraso'].tolist() == [74, 43, 0, 0]
+    assert [TRAMOS[tramo] for tramo in mora['tramo']] == ['61-90', '31-60', 'al_dia', 'al_dia']
+
+
+def test_cuota_que_vence_en_la_fecha_de_corte_no_esta_en_mora():
+    prestamos = ((1,), (10,), (Decimal('343.33'),))
+    cuotas = ((1, 1), (date(2024, 2, 1), date(2024, 3, 1)), (Decimal('343.33'), Decimal('686.66')))
+
+    mora = calcular_mora(prestamos, cuotas, date(2024, 3, 1))
+
+    assert mora['esperado'].tolist() == [34333]
+    assert mora['monto_atraso'].tolist() == [0]
+    assert mora['cuotas_vencidas'].tolist() == [0]
+    assert [TRAMOS[tramo] for tramo in mora['tramo']] == ['al_dia']
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Pruebas de la página /prestamos: el número de consultas no debe crecer
+con la cantidad de préstamos del usuario
+"""
+
+from datetime import datetime
+from decimal import Decimal
+
+import app as app_module
+
+
+class CursorFalso:
+    def __init__(self, conexion):
+        self.conexion = conexion
+        self.consulta = None
+
+    def execute(self, consulta, parametros=None):
+        self.conexion.consultas.append(consulta)
+        self.consulta = consulta
+
+    def fetchall(self):
+        if 'FROM prestamos' in self.consulta:
+            return [dict(prestamo) for prestamo in self.conexion.prestamos]
+        if 'FROM pagos_prestamos' in self.consulta:
+            return [dict(pago) for pago in self.conexion.pagos]
+        if 'FROM cuotas_prestamo' in self.consulta:
+            return [{
+                'prestamo_id': prestamo['id'],
+                'cuota_total_mensual': Decimal('110.00'),
+                'total_intereses': Decimal('100.00'),
+                'total_a_pagar': Decimal('1100.00'),
+                'proximo_vencimiento': datetime(2024, 4, 1).date(),
+            } for prestamo in self.conexion.prestamos]
+        return []
+
+    def fetchone(self):
+        return None
+
+    def close(self):
+        pass
+
+
+class ConexionFalsa:
+    def __init__(self, num_prestamos):
+        self.consultas = []
+        self.prestamos = [{
+            'id': i,
+            'usuario_id': 1,
+            'monto': Decimal('1000.00'),
+            'tasa_interes': Decimal('12.00'),
+            'plazo_meses': 10,
+            'fecha_solicitud': datetime(2024, 1, 1),
+            'estado': 'aprobado',
+            'interes_mensual_fijo': Decimal('10.00'),
+            'cuota_capital_mensual': Decimal('100.00'),
+            'total_pagado': Decimal('200.00'),
+            'saldo_pendiente': Decimal('800.00'),
+            'ultimo_pago_fecha': datetime(2024, 3, 1),
+        } for i in range(1, num_prestamos + 1)]
+        self.pagos = [{
+            'id': i * 10 + mes,
+            'prestamo_id': i,
+            'monto': Decimal('100.00'),
+            'fecha': datetime(2024, mes, 1),
+        } for i in range(1, num_prestamos + 1) for mes in (3, 2)]
+
+    def cursor(self, dictionary=False):
+        return CursorFalso(self)
+
+    def close(self):
+        pass
+
+
+def _consultas_para(monkeypatch, num_prestamos):
+    conexion = ConexionFalsa(num_prestamos)
+    monkeypatch.setattr(app_module, 'get_db_connection', lambda: conexion)
+    cliente = app_module.app.test_client()
+    with cliente.session_transaction() as sesion:
+        sesion['user_id'] = 1
+        sesion['nombre'] = 'Prueba'
+    respuesta = cliente.get('/prestamos')
+    assert respuesta.status_code == 200
+    return conexion.consultas, respuesta.get_data(as_text=True)
+
+
+def test_consultas_constantes_con_mas_prestamos(monkeypatch):
+    consultas_uno, _ = _consultas_para(monkeypatch, 1)
+    consultas_treinta, html = _consultas_para(monkeypatch, 30)
+
+    assert len(consultas_uno) == len(consultas_treinta) == 3
+    # Cada préstamo aprobado muestra su saldo y sus pagos
+    assert html.count('800.0') >= 30
+    assert 'No hay pagos registrados para este préstamo.' not in html
+    # Cuota y vencimiento leídos del plan de cuotas guardado
+    assert html.count('Próximo vencimiento: 01/04/2024') == 30
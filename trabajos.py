@@ -0,0 +1,180 @@
+# Trabajos en segundo plano para las cargas masivas
+#
+# El request guarda el archivo subido en disco, registra un trabajo en la
+# tabla trabajos_carga y lo entrega a un pool de hilos del mismo proceso.
+# El hilo actualiza el progreso en la tabla (con su propia conexión, fuera
+# de la transacción de la carga) y /admin/jobs/<id> lo consulta, así que el
+# progreso es visible desde cualquier proceso del servidor.
+import json
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+CREAR_TABLA_TRABAJOS = '''
+CREATE TABLE IF NOT EXISTS trabajos_carga (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    tipo VARCHAR(30) NOT NULL,
+    usuario_id INT NOT NULL,
+    archivo VARCHAR(255) NOT NULL,
+    estado ENUM('pendiente', 'procesando', 'completado', 'error') NOT NULL DEFAULT 'pendiente',
+    total_bytes BIGINT NOT NULL DEFAULT 0,
+    bytes_leidos BIGINT NOT NULL DEFAULT 0,
+    filas_procesadas INT NOT NULL DEFAULT 0,
+    filas_rechazadas INT NOT NULL DEFAULT 0,
+    filas_creadas INT NOT NULL DEFAULT 0,
+    mensajes TEXT,
+    fecha_creacion DATETIME DEFAULT CURRENT_TIMESTAMP,
+    fecha_inicio DATETIME DEFAULT NULL,
+    fecha_fin DATETIME DEFAULT NULL,
+    fecha_actualizacion DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    FOREIGN KEY (usuario_id) REFERENCES usuarios(id),
+    INDEX idx_trabajos_estado (estado)
+)
+'''
+
+# Directorio donde se guardan los archivos mientras se procesan
+DIRECTORIO_CARGAS = os.getenv('CARGAS_DIR', os.path.join(tempfile.gettempdir(), 'sparfonds_cargas'))
+
+# Hilos que procesan cargas a la vez en cada proceso del servidor
+ejecutor = ThreadPoolExecutor(max_workers=int(os.getenv('TRABAJOS_HILOS', '2')),
+                              thread_name_prefix='carga')
+
+# Un trabajo en proceso sin progreso durante este tiempo se da por perdido
+SEGUNDOS_SIN_PROGRESO = 600
+
+# Columnas que se pueden actualizar con actualizar_trabajo()
+COLUMNAS_PROGRESO = ('estado', 'bytes_leidos', 'filas_procesadas', 'filas_rechazadas',
+                     'filas_creadas', 'mensajes', 'resumen', 'fecha_inicio', 'fecha_fin')
+
+# Columnas agregadas por la migración 10: 'cargar' escribe en la base,
+# 'vista_previa' sólo clasifica las filas (ver vista_previa.py)
+COLUMNAS_MODO = {
+    'modo': "VARCHAR(20) NOT NULL DEFAULT 'cargar'",
+    'resumen': "TEXT",
+}
+
+# Columna agregada por la migración 14: trabajo 'cargar' que confirmó una
+# vista previa (NULL mientras no se confirme)
+COLUMNAS_CONFIRMACION = {
+    'confirmado_por': "INT DEFAULT NULL",
+}
+
+# Horas que se conservan los archivos subidos y los reportes de vista previa
+HORAS_ARCHIVOS = 24
+
+
+def limpiar_archivos_antiguos(horas=HORAS_ARCHIVOS):
+    """Elimina de DIRECTORIO_CARGAS los archivos de más de `horas` horas"""
+    limite = time.time() - horas * 3600
+    for nombre in os.listdir(DIRECTORIO_CARGAS):
+        ruta = os.path.join(DIRECTORIO_CARGAS, nombre)
+        try:
+            if os.path.getmtime(ruta) < limite:
+                os.remove(ruta)
+        except OSError:
+            pass
+
+
+def guardar_archivo(archivo):
+    """Guarda el archivo subido en DIRECTORIO_CARGAS y retorna (ruta, tamaño)"""
+    os.makedirs(DIRECTORIO_CARGAS, exist_ok=True)
+    limpiar_archivos_antiguos()
+    descriptor, ruta = tempfile.mkstemp(suffix='.csv', dir=DIRECTORIO_CARGAS)
+    os.close(descriptor)
+    archivo.save(ruta)
+    return ruta, os.path.getsize(ruta)
+
+
+def crear_trabajo(cursor, tipo, usuario_id, ruta, total_bytes, modo='cargar'):
+    cursor.execute('''
+        INSERT INTO trabajos_carga (tipo, modo, usuario_id, archivo, total_bytes)
+        VALUES (%s, %s, %s, %s, %s)
+    ''', (tipo, modo, usuario_id, ruta, total_bytes))
+    return cursor.lastrowid
+
+
+def actualizar_trabajo(cursor, trabajo_id, **campos):
+    """
+    Actualiza columnas de progreso; `mensajes` y `resumen` se guardan como
+    JSON. fecha_actualizacion se escribe siempre con el reloj de la
+    aplicación (el mismo de fecha_inicio y de esta_interrumpido), aunque no
+    cambie ningún otro valor, así cada llamada cuenta como señal de vida.
+    """
+    for columna in ('mensajes', 'resumen'):
+        if columna in campos:
+            campos[columna] = json.dumps(campos[columna], ensure_ascii=False)
+    columnas = [columna for columna in COLUMNAS_PROGRESO if columna in campos]
+    asignaciones = [f'{c} = %s' for c in columnas] + ['fecha_actualizacion = %s']
+    cursor.execute(
+        f"UPDATE trabajos_carga SET {', '.join(asignaciones)} WHERE id = %s",
+        tuple(campos[c] for c in columnas) + (datetime.now(), trabajo_id)
+    )
+
+
+def obtener_trabajo(cursor, trabajo_id):
+    """Lee un trabajo; requiere un cursor con dictionary=True"""
+    cursor.execute("SELECT * FROM trabajos_carga WHERE id = %s", (trabajo_id,))
+    return cursor.fetchone()
+
+
+def marcar_vista_previa_confirmada(cursor, vista_previa_id, trabajo_id):
+    """
+    Marca la vista previa como confirmada por `trabajo_id`, en la
+    transacción del llamador. El UPDATE condicional deja que sólo una
+    confirmación la consuma: retorna False si ya estaba confirmada o no
+    está completada.
+    """
+    cursor.execute('''
+        UPDATE trabajos_carga SET confirmado_por = %s
+        WHERE id = %s AND modo = 'vista_previa' AND estado = 'completado' AND confirmado_por IS NULL
+    ''', (trabajo_id, vista_previa_id))
+    return cursor.rowcount == 1
+
+
+def esta_interrumpido(trabajo, ahora=None):
+    """
+    Un trabajo en proceso que no reporta progreso en SEGUNDOS_SIN_PROGRESO
+    se perdió (por ejemplo, al reiniciar el proceso que lo ejecutaba).
+    fecha_actualizacion viene del reloj de la aplicación (ver
+    actualizar_trabajo), no del de MySQL.
+    """
+    if trabajo['estado'] != 'procesando' or not trabajo['fecha_actualizacion']:
+        return False
+    inactivo = ((ahora or datetime.now()) - trabajo['fecha_actualizacion']).total_seconds()
+    return inactivo > SEGUNDOS_SIN_PROGRESO
+
+
+def segundos_restantes(trabajo, ahora=None):
+    """Estimación lineal por bytes leídos; None si todavía no hay datos"""
+    if trabajo['estado'] != 'procesando' or not trabajo['fecha_inicio'] or not trabajo['bytes_leidos']:
+        return None
+    transcurrido = ((ahora or datetime.now()) - trabajo['fecha_inicio']).total_seconds()
+    pendientes = max(trabajo['total_bytes'] - trabajo['bytes_leidos'], 0)
+    return round(transcurrido * pendientes / trabajo['bytes_leidos'])
+
+
+def trabajo_a_json(trabajo):
+    """Formato de un trabajo para /admin/jobs/<id>"""
+    total = trabajo['total_bytes'] or 0
+    if esta_interrumpido(trabajo):
+        trabajo = dict(trabajo, estado='error', mensajes=json.dumps(
+            [{'categoria': 'danger', 'texto': 'La carga se interrumpió antes de terminar'}]))
+    if trabajo['estado'] in ('completado', 'error'):
+        porcentaje = 100
+    else:
+        porcentaje = round(100 * trabajo['bytes_leidos'] / total) if total else 0
+    return {
+        'id': trabajo['id'],
+        'tipo': trabajo['tipo'],
+        'modo': trabajo['modo'],
+        'estado': trabajo['estado'],
+        'filas_procesadas': trabajo['filas_procesadas'],
+        'filas_rechazadas': trabajo['filas_rechazadas'],
+        'filas_creadas': trabajo['filas_creadas'],
+        'porcentaje': porcentaje,
+        'eta_segundos': segundos_restantes(trabajo),
+        'mensajes': json.loads(trabajo['mensajes']) if trabajo['mensajes'] else [],
+        'resumen': json.loads(trabajo['resumen']) if trabajo['resumen'] else None,
+    }
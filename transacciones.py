@@ -0,0 +1,101 @@
+# Historial de transacciones (ahorros, préstamos y pagos) paginado por cursor
+#
+# Las tres fuentes se combinan con UNION ALL y se ordenan en MySQL por
+# (fecha, tipo, id) descendente. El cursor de la página siguiente es la
+# clave de la última fila mostrada, de modo que cada página cuesta lo mismo
+# sin importar cuántos movimientos tenga el usuario.
+import base64
+from datetime import datetime
+
+TAMANO_PAGINA = 50
+
+# tipo -> (consulta base, columna de fecha, columna de id)
+FUENTES = {
+    'ahorro': ('''
+        SELECT id, monto, fecha, 'ahorro' AS tipo, 'Depósito de ahorro' AS descripcion
+        FROM ahorros
+        WHERE usuario_id = %s''', 'fecha', 'id'),
+    'prestamo': ('''
+        SELECT id, monto, fecha_solicitud AS fecha, 'prestamo' AS tipo,
+               CONCAT('Préstamo a ', plazo_meses, ' meses') AS descripcion
+        FROM prestamos
+        WHERE usuario_id = %s''', 'fecha_solicitud', 'id'),
+    'pago': ('''
+        SELECT pp.id, pp.monto, pp.fecha, 'pago' AS tipo, 'Pago de préstamo' AS descripcion
+        FROM pagos_prestamos pp
+        JOIN prestamos p ON pp.prestamo_id = p.id
+        WHERE p.usuario_id = %s''', 'pp.fecha', 'pp.id'),
+}
+
+
+def codificar_cursor(transaccion):
+    """Convierte la clave (fecha, tipo, id) de una fila en un token para la URL"""
+    clave = f"{transaccion['fecha'].isoformat()}|{transaccion['tipo']}|{transaccion['id']}"
+    return base64.urlsafe_b64encode(clave.encode()).decode()
+
+
+def decodificar_cursor(token):
+    """Inverso de codificar_cursor; lanza ValueError si el token no es válido"""
+    try:
+        fecha, tipo, id_fila = base64.urlsafe_b64decode(token.encode()).decode().split('|')
+        if tipo not in FUENTES:
+            raise ValueError(tipo)
+        return datetime.fromisoformat(fecha), tipo, int(id_fila)
+    except Exception:
+        raise ValueError("Cursor de paginación inválido")
+
+
+def _condicion_despues_de(tipo, columna_fecha, columna_id, despues_de):
+    """
+    Condición para las filas de una fuente que van después del cursor en el
+    orden (fecha, tipo, id) DESC. Como el tipo es constante en cada fuente,
+    la comparación se reduce a fecha e id y puede usar los índices.
+    """
+    fecha, tipo_cursor, id_cursor = despues_de
+    if tipo < tipo_cursor:
+        return f" AND {columna_fecha} <= %s", (fecha,)
+    if tipo > tipo_cursor:
+        return f" AND {columna_fecha} < %s", (fecha,)
+    return (f" AND ({columna_fecha} < %s OR ({columna_fecha} = %s AND {columna_id} < %s))",
+            (fecha, fecha, id_cursor))
+
+
+def obtener_pagina_transacciones(cursor, usuario_id, limite=TAMANO_PAGINA, despues_de=None):
+    """
+    Retorna (transacciones, siguiente_cursor) con hasta `limite` movimientos
+    del usuario, del más reciente al más antiguo. siguiente_cursor es None
+    cuando no hay más páginas. Requiere un cursor con dictionary=True.
+    """
+    partes = []
+    parametros = []
+    for tipo, (consulta, columna_fecha, columna_id) in FUENTES.items():
+        condicion, extra = ('', ())
+        if despues_de:
+            condicion, extra = _condicion_despues_de(tipo, columna_fecha, columna_id, despues_de)
+        # Cada fuente aporta como máximo limite + 1 filas
+        partes.append(f"({consulta}{condicion} ORDER BY {columna_fecha} DESC, {columna_id} DESC LIMIT %s)")
+        parametros.extend((usuario_id,) + extra + (limite + 1,))
+
+    cursor.execute(
+        " UNION ALL ".join(partes) + " ORDER BY fecha DESC, tipo DESC, id DESC LIMIT %s",
+        tuple(parametros) + (limite + 1,)
+    )
+    transacciones = cursor.fetchall()
+
+    siguiente = None
+    if len(transacciones) > limite:
+        transacciones = transacciones[:limite]
+        siguiente = codificar_cursor(transacciones[-1])
+    return transacciones, siguiente
+
+
+def transaccion_a_json(transaccion):
+    """Formato de una transacción para las respuestas JSON"""
+    return {
+        'id': transaccion['id'],
+        'tipo': transaccion['tipo'],
+        'descripcion': transaccion['descripcion'],
+        'monto': float(transaccion['monto']),
+        'fecha': transaccion['fecha'].strftime('%Y-%m-%d %H:%M:%S'),
+        'fecha_texto': transaccion['fecha'].strftime('%d/%m/%Y %H:%M'),
+    }
@@ -0,0 +1,174 @@
+# Vista previa (simulación) de las cargas masivas
+#
+# Recorre una sola vez los resultados de la validación del CSV, consulta la
+# base por lotes (IN (...)) y clasifica cada fila como 'insertar', 'omitir'
+# o 'error' sin escribir nada. El detalle se guarda como NDJSON junto al
+# archivo subido y se pagina desde /admin/jobs/<id>/reporte; el resumen por
+# resultado y categoría queda en la fila del trabajo.
+import json
+import os
+from datetime import datetime
+
+from carga_masiva import TAMANO_LOTE, en_bloques, valores_existentes
+
+RESULTADOS = ('insertar', 'omitir', 'error')
+TAMANO_PAGINA_REPORTE = 100
+
+# Datos de cada registro que se muestran en el reporte
+CAMPOS_REPORTE = {
+    'usuarios': ('nombre', 'apellido', 'email', 'cedula', 'fecha_nacimiento'),
+    'ahorros': ('usuario_email', 'usuario_nombre', 'monto', 'fecha'),
+    'pagos': ('prestamo_id', 'cedula', 'monto', 'fecha', 'saldo_restante'),
+}
+
+
+def ruta_reporte(ruta_archivo):
+    return ruta_archivo + '.reporte.ndjson'
+
+
+def _entrada(fila_num, resultado, categoria, detalle=None, registro=None, tipo=None):
+    entrada = {'fila': fila_num, 'resultado': resultado, 'categoria': categoria}
+    if detalle:
+        entrada['detalle'] = detalle
+    if registro:
+        entrada['datos'] = {campo: registro.get(campo) for campo in CAMPOS_REPORTE[tipo]}
+    return entrada
+
+
+def _fecha_valida(texto):
+    try:
+        datetime.strptime(texto, '%Y-%m-%d')
+        return True
+    except ValueError:
+        return False
+
+
+def clasificar_usuarios(cursor, resultados, tamano_lote=TAMANO_LOTE):
+    """
+    Genera una entrada de reporte por fila de un CSV de usuarios. Las
+    filas válidas se omiten si el email o la cédula ya existen (en la base
+    o antes en el mismo archivo) o si la fecha de nacimiento no es una
+    fecha válida, que es lo que haría la carga real.
+    """
+    emails_archivo = set()
+    cedulas_archivo = set()
+    for lote in en_bloques(resultados, tamano_lote):
+        validos = [registro for _, registro, error in lote if not error]
+        emails = valores_existentes(cursor, 'usuarios', 'email', [u['email'] for u in validos])
+        cedulas = valores_existentes(cursor, 'usuarios', 'cedula', [u['cedula'] for u in validos])
+
+        for fila_num, usuario, error in lote:
+            if error:
+                yield _entrada(fila_num, 'error', error[0], error[1])
+                continue
+            email = usuario['email'].lower()
+            cedula = usuario['cedula'].lower()
+            if email in emails or cedula in cedulas:
+                yield _entrada(fila_num, 'omitir', 'existente',
+                               f"Usuario {usuario['email']} o cédula {usuario['cedula']} ya existe",
+                               usuario, 'usuarios')
+            elif email in emails_archivo or cedula in cedulas_archivo:
+                yield _entrada(fila_num, 'omitir', 'duplicado_archivo',
+                               f"Usuario {usuario['email']} o cédula {usuario['cedula']} repetido en el archivo",
+                               usuario, 'usuarios')
+            elif not _fecha_valida(usuario['fecha_nacimiento']):
+                yield _entrada(fila_num, 'omitir', 'fecha_invalida',
+                               "La fecha de nacimiento debe estar en formato YYYY-MM-DD",
+                               usuario, 'usuarios')
+            else:
+                yield _entrada(fila_num, 'insertar', 'nuevo', registro=usuario, tipo='usuarios')
+            emails_archivo.add(email)
+            cedulas_archivo.add(cedula)
+
+
+def clasificar_ahorros(cursor, resultados, tamano_lote=TAMANO_LOTE, importacion=None):
+    """
+    Genera una entrada de reporte por fila de un CSV de ahorros. Las filas
+    cuya clave ya está en ahorros.clave_fila se omiten, como en la carga
+    (ver importaciones.py). Si el archivo completo ya se importó
+    (`importacion`, la fila previa), se omiten todas las filas válidas.
+    """
+    for lote in en_bloques(resultados, tamano_lote):
+        if importacion:
+            importadas = set()
+        else:
+            claves = [registro['clave_fila'] for _, registro, error in lote if not error]
+            importadas = valores_existentes(cursor, 'ahorros', 'clave_fila', claves)
+
+        for fila_num, ahorro, error in lote:
+            if error:
+                yield _entrada(fila_num, 'error', error[0], error[1])
+            elif importacion:
+                yield _entrada(fila_num, 'omitir', 'ya_importado',
+                               f"El archivo ya fue importado (importación #{importacion['id']})",
+                               ahorro, 'ahorros')
+            elif ahorro['clave_fila'] in importadas:
+                yield _entrada(fila_num, 'omitir', 'ya_importado',
+                               f"El ahorro de {ahorro['usuario_email']} ya fue importado",
+                               ahorro, 'ahorros')
+            else:
+                yield _entrada(fila_num, 'insertar', 'nuevo', registro=ahorro, tipo='ahorros')
+
+
+def clasificar_pagos(resultados):
+    """
+    Genera una entrada de reporte por fila de un CSV de pagos de préstamos;
+    los pagos que dejan el préstamo sin saldo llevan la categoría
+    'liquida_prestamo'
+    """
+    for fila_num, pago, error in resultados:
+        if error:
+            yield _entrada(fila_num, 'error', error[0], error[1])
+        else:
+            categoria = 'liquida_prestamo' if pago['saldo_restante'] <= 0 else 'pago'
+            yield _entrada(fila_num, 'insertar', categoria, registro=pago, tipo='pagos')
+
+
+def escribir_reporte(ruta, entradas, al_escribir=None, cada=TAMANO_LOTE, resultados=RESULTADOS):
+    """
+    Escribe las entradas en `ruta` (una por línea) y retorna el resumen
+    {'insertar': n, 'omitir': n, 'error': n, 'categorias': {...}}, con una
+    clave por cada uno de `resultados`.
+    al_escribir(filas, resumen) se llama cada `cada` filas.
+    """
+    resumen = {resultado: 0 for resultado in resultados}
+    resumen['categorias'] = {}
+    filas = 0
+    with open(ruta, 'w', encoding='utf-8') as reporte:
+        for entrada in entradas:
+            reporte.write(json.dumps(entrada, ensure_ascii=False, default=str) + '\n')
+            resumen[entrada['resultado']] += 1
+            clave = f"{entrada['resultado']}:{entrada['categoria']}"
+            resumen['categorias'][clave] = resumen['categorias'].get(clave, 0) + 1
+            filas += 1
+            if al_escribir and filas % cada == 0:
+                al_escribir(filas, resumen)
+    return resumen
+
+
+def recorrer_reporte(ruta):
+    """Genera las entradas del reporte leyendo el archivo en streaming"""
+    with open(ruta, encoding='utf-8') as reporte:
+        for linea in reporte:
+            yield json.loads(linea)
+
+
+def leer_reporte(ruta, resultado=None, categoria=None, pagina=1, tamano=TAMANO_PAGINA_REPORTE):
+    """
+    Retorna (entradas, total) de la página pedida, filtrando por resultado
+    y categoría, sin cargar el archivo completo.
+    """
+    if not os.path.exists(ruta):
+        return None, 0
+    desde = (pagina - 1) * tamano
+    entradas = []
+    total = 0
+    for entrada in recorrer_reporte(ruta):
+        if resultado and entrada['resultado'] != resultado:
+            continue
+        if categoria and entrada['categoria'] != categoria:
+            continue
+        if desde <= total < desde + tamano:
+            entradas.append(entrada)
+        total += 1
+    return entradas, total